@@ -0,0 +1,227 @@
+"""
+异动热路径基准测试：接口解析 → 补充板块 → 维护 master_df → 编码推送，以及精选数据同步。
+
+在 backend 目录下运行：
+    python -m benchmarks.run                   # 默认规模：1万条异动、50万条概念成分
+    python -m benchmarks.run --scale large     # 10万条异动
+    python -m benchmarks.run --filter sorting  # 只运行名称包含 sorting 的用例
+    python -m benchmarks.run --save-baseline   # 把本次结果保存为基线
+
+每次的结果写入 benchmarks/results/latest.json；存在 benchmarks/baseline.json 时逐项比较中位数，
+变慢超过阈值（默认20%，且绝对差超过 --min-delta-ms）的用例标记为回退，并以退出码1结束。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import pandas as pd
+
+from benchmarks import synthetic
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SCALES = {
+    "small": {"events": 1_000, "concept_rows": 50_000, "picked": 50},
+    "default": {"events": 10_000, "concept_rows": 500_000, "picked": 200},
+    "large": {"events": 100_000, "concept_rows": 500_000, "picked": 2_000},
+}
+API_PAGE_SIZE = 1000  # 实时接口每次最多返回的条数
+
+
+class _Sink:
+    """代替 data_q，只保留最后一次推送的数据"""
+
+    def __init__(self):
+        self.last = None
+
+    def put(self, item, *args, **kwargs):
+        self.last = item
+
+
+def _setup_environment(tmp_dir, picked_rows):
+    """证券主表和精选快照指向临时目录，不访问网络也不读写真实的static目录"""
+    from security_master import get_security_master
+    from shared_snapshot import VersionedSnapshot
+    from services import pick_service
+    from services.picked_store import PICKED_COLUMNS
+
+    get_security_master(tmp_dir)
+    snapshot = VersionedSnapshot.create()
+    snapshot.publish({"columns": PICKED_COLUMNS, "values": picked_rows})
+    pick_service.set_shared_picked_data(snapshot)
+    return snapshot
+
+
+def build_cases(scale, tmp_dir):
+    """返回 ([(名称, 每次处理的行数, 被测函数)], 清理函数列表)；数据在这里一次性生成，不计入耗时"""
+    from fluctuation import parse_changes
+    from data_processor import apply_sorting, add_concept_data_to_changes
+    from worker_queue import merge_events, enrich_and_publish
+    from change_journal import ChangeJournal
+    from routes.websocket import encode_payload
+    from services import pick_service
+    from services.picked_store import PICKED_COLUMNS
+
+    n_events = scale["events"]
+    page_payload = synthetic.make_changes_payload(API_PAGE_SIZE)
+    full_payload = synthetic.make_changes_payload(n_events)
+    changes = synthetic.make_changes_frame(n_events)
+    new_events = synthetic.make_changes_frame(API_PAGE_SIZE, seed=synthetic.SEED + 1)
+    concept_df = synthetic.make_concepts(scale["concept_rows"])
+    uplimit_cache = synthetic.make_uplimit_cache(changes)
+    picked_rows = synthetic.make_picked(scale["picked"])
+    snapshot = _setup_environment(tmp_dir, picked_rows)
+
+    enriched = apply_sorting(changes.copy(), concept_df, uplimit_cache)
+    payload = {"columns": list(enriched.columns), "values": enriched.values.tolist()}
+
+    journal = ChangeJournal(os.path.join(tmp_dir, "journal"), "20250101")
+    journal.recover()
+    journal.append_changes(changes)
+    drifted = changes.copy()
+    drifted.loc[drifted.sample(frac=0.01, random_state=1).index, '四舍五入取整'] += 1
+
+    def sync_picked():
+        # API进程发布新版本，worker进程按版本变化重建DataFrame
+        snapshot.publish({"columns": PICKED_COLUMNS, "values": picked_rows})
+        return pick_service.get_shared_picked_df()
+
+    sink = _Sink()
+    cases = [
+        (f"parse_changes[{API_PAGE_SIZE}]", API_PAGE_SIZE, lambda: parse_changes(page_payload)),
+    ]
+    if n_events != API_PAGE_SIZE:
+        cases.append((f"parse_changes[{n_events}]", n_events, lambda: parse_changes(full_payload)))
+    cases += [
+        (f"add_concept_data_to_changes[{n_events}x{len(concept_df)}]", n_events,
+         lambda: add_concept_data_to_changes(changes.copy(), concept_df)),
+        (f"apply_sorting[{n_events}]", n_events, lambda: apply_sorting(changes.copy(), concept_df, uplimit_cache)),
+        (f"merge_events[{n_events}+{API_PAGE_SIZE}]", n_events, lambda: merge_events(changes, new_events)),
+        (f"journal_diff[{n_events}]", n_events, lambda: journal.append_changes(drifted)),
+        (f"enrich_and_publish[{n_events}]", n_events,
+         lambda: enrich_and_publish(changes.copy(), concept_df, uplimit_cache, sink)),
+        (f"ws_encode[{n_events}]", n_events, lambda: encode_payload(payload)),
+        (f"picked_sync[{len(picked_rows)}]", len(picked_rows), sync_picked),
+    ]
+    return cases, [journal.close, snapshot.close, snapshot.unlink]
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "repeat": repeat,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """返回 {用例: (基线中位数, 本次中位数, 比值, 是否回退)}，基线中没有的用例不比较"""
+    report = {}
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float('inf')
+        regressed = ratio > 1 + threshold and result["median_ms"] - base["median_ms"] > min_delta_ms
+        report[name] = (base["median_ms"], result["median_ms"], ratio, regressed)
+    return report
+
+
+def _write_json(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="异动热路径基准测试")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="default")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为 baseline.json")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.2, help="中位数变慢超过该比例视为回退")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="绝对差小于该值时不视为回退，过滤噪声")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    scale = SCALES[args.scale]
+    tmp_dir = tempfile.mkdtemp(prefix="eastmoneywatch-bench-")
+    cleanups = []
+    results = {}
+    try:
+        print(f"生成合成数据: {args.scale} {scale}")
+        cases, cleanups = build_cases(scale, tmp_dir)
+        for name, rows, fn in cases:
+            if args.filter and args.filter not in name:
+                continue
+            result = measure(fn, args.repeat)
+            result["rows_per_second"] = round(rows / (result["median_ms"] / 1000)) if result["median_ms"] else None
+            results[name] = result
+            print(f"  {name:<52} median {result['median_ms']:>10.2f}ms  p95 {result['p95_ms']:>10.2f}ms")
+    finally:
+        for cleanup in cleanups:
+            cleanup()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    run = {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "scale": args.scale,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "results": results,
+    }
+    _write_json(os.path.join(RESULTS_DIR, "latest.json"), run)
+    if args.save_baseline:
+        _write_json(args.baseline, run)
+        print(f"已保存基线: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基线，使用 --save-baseline 保存本次结果作为基线")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != args.scale:
+        print(f"基线规模为 {baseline.get('scale')}，与本次 {args.scale} 不同，不比较")
+        return 0
+
+    report = compare(results, baseline, args.threshold, args.min_delta_ms)
+    regressions = [name for name, (*_, regressed) in report.items() if regressed]
+    print(f"\n与基线比较（{baseline.get('created')}）:")
+    for name, (base, current, ratio, regressed) in report.items():
+        flag = "  <-- 回退" if regressed else ""
+        print(f"  {name:<52} {base:>10.2f}ms -> {current:>10.2f}ms  x{ratio:.2f}{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} 个用例变慢超过 {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""基准测试用的合成数据：规模可调，分布接近真实的异动、概念成分和精选数据，固定随机种子保证可重复"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from config import type_mapping
+
+
+SEED = 20250801
+
+
+def _rng(seed=SEED):
+    return np.random.default_rng(seed)
+
+
+def stock_codes(n_stocks):
+    """沪深主板、创业板、科创板代码混合"""
+    prefixes = np.array(['600', '601', '603', '000', '002', '300', '688'])
+    rng = _rng(1)
+    codes = {f"{prefix}{i:03d}" for prefix, i in zip(rng.choice(prefixes, n_stocks * 2), rng.integers(0, 1000, n_stocks * 2))}
+    return sorted(codes)[:n_stocks]
+
+
+def _minutes(rng, n):
+    """交易时间内的 HHMMSS，上午下午各半"""
+    morning = rng.integers(9 * 3600 + 30 * 60, 11 * 3600 + 30 * 60, n)
+    afternoon = rng.integers(13 * 3600, 15 * 3600, n)
+    seconds = np.where(rng.random(n) < 0.5, morning, afternoon)
+    return [f"{s // 3600:02d}{s % 3600 // 60:02d}{s % 60:02d}" for s in seconds]
+
+
+def make_changes_payload(n_events, n_stocks=5000, seed=SEED):
+    """与东方财富 getAllStockChanges 接口相同结构的JSONP原文"""
+    rng = _rng(seed)
+    codes = stock_codes(n_stocks)
+    type_codes = list(type_mapping.keys())
+    pct = np.round(rng.choice([-1, 1], n_events, p=[0.2, 0.8]) * rng.uniform(0.03, 0.2, n_events), 4)
+    allstock = [
+        {"tm": int(tm), "c": code, "m": int(code.startswith('6')), "n": f"股票{code}", "t": int(t),
+         "i": f"{p},{rng.uniform(5, 50):.2f},{rng.uniform(0, 0.05):.4f}"}
+        for tm, code, t, p in zip(_minutes(rng, n_events), rng.choice(codes, n_events), rng.choice(type_codes, n_events), pct)
+    ]
+    return "jQuery35108409427522251944_1753773534498(" + json.dumps({"data": {"allstock": allstock}}) + ");"
+
+
+def make_changes_frame(n_events, n_stocks=5000, seed=SEED):
+    """getChanges 输出格式的DataFrame（未补充板块信息），(类型, 股票代码) 唯一"""
+    rng = _rng(seed)
+    codes = np.array(stock_codes(n_stocks))
+    types = np.array(list(type_mapping.values()))
+    pairs = pd.DataFrame({'股票代码': rng.choice(codes, n_events * 2), '类型': rng.choice(types, n_events * 2)})
+    pairs = pairs.drop_duplicates().head(n_events).reset_index(drop=True)
+    n = len(pairs)
+    pct = rng.uniform(0.05, 0.2, n) * rng.choice([-1, 1], n, p=[0.2, 0.8])
+    times = [f"{t[:2]}:{t[2:4]}" for t in _minutes(rng, n)]
+    return pd.DataFrame({
+        '股票代码': pairs['股票代码'],
+        '时间': times,
+        '名称': '股票' + pairs['股票代码'],
+        '相关信息': [f"{p * 100:+.2f}%" for p in pct],
+        '类型': pairs['类型'],
+        '四舍五入取整': np.round(pct * 100).astype(int),
+        '上下午': ['上午' if t < '12' else '下午' for t in times],
+    })
+
+
+def make_concepts(n_rows=500_000, n_sectors=1000, n_stocks=5000, seed=SEED):
+    """概念成分表（板块代码、板块名称、股票代码），与 load_concept_frame 相同的分类列"""
+    rng = _rng(seed)
+    codes = stock_codes(n_stocks)
+    sector_codes = [f"BK{i:04d}" for i in range(n_sectors)]
+    # 热门板块成分股多，按Zipf分布分配
+    weights = 1.0 / np.arange(1, n_sectors + 1)
+    sectors = rng.choice(n_sectors, n_rows, p=weights / weights.sum())
+    df = pd.DataFrame({
+        '板块代码': pd.Categorical.from_codes(sectors, categories=sector_codes),
+        '板块名称': pd.Categorical.from_codes(sectors, categories=[f"概念{i}" for i in range(n_sectors)]),
+        '股票代码': pd.Categorical(rng.choice(codes, n_rows), categories=codes),
+    })
+    return df.drop_duplicates(ignore_index=True)
+
+
+def make_picked(n_picked=200, n_stocks=5000, seed=SEED):
+    """精选列表记录（PICKED_COLUMNS 格式）"""
+    from services.picked_store import PICKED_COLUMNS
+
+    rng = _rng(seed)
+    codes = rng.choice(stock_codes(n_stocks), n_picked, replace=False)
+    sectors = rng.integers(0, 50, n_picked)
+    rows = {
+        '股票代码': codes,
+        '股票名称': ['股票' + c for c in codes],
+        '板块代码': [f"BK{s:04d}" for s in sectors],
+        '板块名称': [f"概念{s}" for s in sectors],
+    }
+    return [[rows.get(col, [''] * n_picked)[i] for col in PICKED_COLUMNS] for i in range(n_picked)]
+
+
+def make_uplimit_cache(changes_df, ratio=0.1, seed=SEED):
+    """名称 -> 连板标识"""
+    rng = _rng(seed)
+    names = changes_df['名称'].drop_duplicates()
+    names = names.sample(frac=ratio, random_state=seed)
+    return dict(zip(names, [f"{d}板" for d in rng.integers(1, 6, len(names))]))
@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import zlib
+import queue
+import struct
+import threading
+import logging
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from memory_stats import estimate_bytes
+
+
+# 当天异动数据的持久化：追加写的二进制日志 + 定期压实的列式日文件
+#   journal/changes_20250801.000003.log   日志段，每条记录为 <长度:u32><CRC32:u32><JSON>
+#   journal/changes_20250801.parquet      压实后的日文件，元数据 journal_segment 记录压实时切换到的日志段
+# 恢复时读取日文件，再按顺序重放编号不小于 journal_segment 的日志段，遇到损坏或不完整的记录即停止。
+# 每条事件写入时分配当天递增的日志序号（_seq），日文件中保留各事件最后一次写入的序号，
+# worker的热重启快照记录写快照时的序号，恢复时只追加序号更大的事件。
+JOURNAL_DIRNAME = "journal"
+EVENT_COLUMNS = ['股票代码', '时间', '名称', '相关信息', '类型', '四舍五入取整', '上下午']
+KEY_COLUMNS = ['类型', '股票代码']
+SEQUENCE_COLUMN = '_seq'
+FLUSH_BATCH = 500           # 每次fsync最多写入的记录数
+_HEADER = struct.Struct('<II')
+_SEGMENT_META_KEY = b'journal_segment'
+_NO_SIGNATURE = (None, 0)
+
+
+def get_journal_dir(static_dir):
+    return os.path.join(static_dir, JOURNAL_DIRNAME)
+
+
+def get_day_file_path(journal_dir, date_str):
+    return os.path.join(journal_dir, f"changes_{date_str}.parquet")
+
+
+def _segment_path(journal_dir, date_str, segment):
+    return os.path.join(journal_dir, f"changes_{date_str}.{segment:06d}.log")
+
+
+def _list_segments(journal_dir, date_str):
+    """某一天的日志段编号，升序"""
+    pattern = re.compile(rf"^changes_{date_str}\.(\d+)\.log$")
+    try:
+        entries = os.listdir(journal_dir)
+    except OSError:
+        return []
+    return sorted(int(m.group(1)) for m in map(pattern.match, entries) if m)
+
+
+def has_journal(static_dir, date_str):
+    """当天是否已有持久化的实时数据（日文件或日志段）"""
+    journal_dir = get_journal_dir(static_dir)
+    return os.path.exists(get_day_file_path(journal_dir, date_str)) or bool(_list_segments(journal_dir, date_str))
+
+
+def normalize_events(df):
+    """只保留事件列并统一类型：文本列为str，四舍五入取整为int，保证签名和日文件的schema稳定"""
+    events = df.reindex(columns=EVENT_COLUMNS)
+    text_columns = [c for c in EVENT_COLUMNS if c != '四舍五入取整']
+    events[text_columns] = events[text_columns].fillna('').astype(str)
+    events['四舍五入取整'] = pd.to_numeric(events['四舍五入取整'], errors='coerce').fillna(0).astype('int64')
+    return events.reset_index(drop=True)
+
+
+def _with_sequences(df):
+    """normalize_events 之后保留日志序号列，没有序号的旧数据记为0"""
+    events = normalize_events(df)
+    sequences = df[SEQUENCE_COLUMN] if SEQUENCE_COLUMN in df.columns else pd.Series(0, index=df.index)
+    events[SEQUENCE_COLUMN] = pd.to_numeric(sequences, errors='coerce').fillna(0).astype('int64').to_numpy()
+    return events
+
+
+def encode_record(obj):
+    payload = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):
+    """
+    读取一个日志段，返回 (records, valid_bytes)。
+
+    进程被杀时最后一条记录可能只写了一半，读到长度不足或CRC不符的记录即停止，valid_bytes 为完好部分的长度。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records, offset = [], 0
+    while offset + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        try:
+            records.append(json.loads(payload))
+        except ValueError:
+            break
+        offset = start + length
+    return records, offset
+
+
+class ChangeJournal:
+    """
+    一个交易日的异动日志。
+
+    worker每个tick调用 append_changes()，只把相对上次写入新增或变化的事件放入队列，
+    由后台线程批量追加到日志段并fsync，轮询线程不做磁盘IO；compact() 同样在后台线程中
+    把当天全部事件写成Parquet日文件并切换到新的日志段，旧日志段随后删除。
+    """
+
+    def __init__(self, journal_dir, date_str):
+        self.journal_dir = journal_dir
+        self.date_str = date_str
+        self.day_file = get_day_file_path(journal_dir, date_str)
+        self._segment = 0
+        self._file = None
+        self._signatures = {}  # 类型|股票代码 -> (事件签名, 日志序号)
+        self.sequence = 0      # 最近一次分配的日志序号
+        self._uncompacted = 0
+        self._queue = queue.Queue()
+        self._writer = None
+
+    # --- 恢复 ---
+
+    def recover(self):
+        """读取日文件并重放日志段，返回当天的事件DataFrame；之后的写入进入一个新的日志段"""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        frames = []
+        start_segment = day_rows = 0
+        if os.path.exists(self.day_file):
+            try:
+                table = pq.read_table(self.day_file)
+                start_segment = int((table.schema.metadata or {}).get(_SEGMENT_META_KEY, b'0'))
+                frames.append(table.to_pandas())
+                day_rows = table.num_rows
+            except Exception as e:
+                logging.error(f"[change_journal] 读取日文件失败，仅从日志段恢复: {e}", exc_info=True)
+                start_segment = 0
+
+        segments = _list_segments(self.journal_dir, self.date_str)
+        records = []
+        for segment in segments:
+            path = _segment_path(self.journal_dir, self.date_str, segment)
+            if segment < start_segment:
+                # 已压实进日文件，删除时进程被中断留下的旧日志段
+                os.remove(path)
+                continue
+            segment_records, valid_bytes = read_records(path)
+            records.extend(segment_records)
+            if valid_bytes < os.path.getsize(path):
+                logging.warning(f"[change_journal] 日志段 {os.path.basename(path)} 末尾有不完整的记录，"
+                                f"已截断到 {valid_bytes} 字节")
+                os.truncate(path, valid_bytes)
+        if records:
+            frames.append(pd.DataFrame.from_records(records, columns=EVENT_COLUMNS + [SEQUENCE_COLUMN]))
+        self._uncompacted = len(records)
+
+        events = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EVENT_COLUMNS)
+        events = _with_sequences(events)
+        self.sequence = int(events[SEQUENCE_COLUMN].max()) if len(events) else 0
+        events = events.drop_duplicates(subset=KEY_COLUMNS, keep='last', ignore_index=True)
+        sequences = events.pop(SEQUENCE_COLUMN).tolist()
+        keys, signatures = self._row_signatures(events)
+        self._signatures = dict(zip(keys, zip(signatures, sequences)))
+        self._segment = max(segments + [start_segment - 1]) + 1
+        logging.info(f"[change_journal] {self.date_str} 已恢复 {len(events)} 条事件"
+                     f"（日文件 {day_rows} 条，重放日志 {len(records)} 条）")
+        return events
+
+    def events_after(self, events, sequence):
+        """recover() 返回的事件中日志序号大于 sequence 的部分，即写快照之后新增或变化的事件"""
+        return events[[self._signatures.get(key, _NO_SIGNATURE)[1] > sequence for key in self._keys(events)]]
+
+    # --- 写入（worker轮询线程调用） ---
+
+    @staticmethod
+    def _keys(events):
+        return (events['类型'] + '|' + events['股票代码']).tolist()
+
+    @classmethod
+    def _row_signatures(cls, events):
+        return cls._keys(events), pd.util.hash_pandas_object(events, index=False).tolist()
+
+    def append_changes(self, df):
+        """把df中新增或变化的事件交给后台线程写入，返回写入的条数"""
+        if df.empty:
+            return 0
+        events = normalize_events(df)
+        keys, signatures = self._row_signatures(events)
+        changed = [i for i, (key, sig) in enumerate(zip(keys, signatures))
+                   if self._signatures.get(key, _NO_SIGNATURE)[0] != sig]
+        if not changed:
+            return 0
+        records = events.iloc[changed].to_dict('records')
+        for i, record in zip(changed, records):
+            self.sequence += 1
+            record[SEQUENCE_COLUMN] = self.sequence
+            self._signatures[keys[i]] = (signatures[i], self.sequence)
+        self._ensure_writer()
+        self._queue.put(("records", records))
+        self._uncompacted += len(changed)
+        return len(changed)
+
+    @property
+    def uncompacted(self):
+        """上次压实之后写入日志的事件数"""
+        return self._uncompacted
+
+    @property
+    def tracked_events(self):
+        """签名索引中的事件数，即当天写入过日志的事件数"""
+        return len(self._signatures)
+
+    def index_bytes(self):
+        """签名索引估算的内存占用（字节）"""
+        return estimate_bytes(self._signatures)
+
+    def compact(self, df, partial=False):
+        """
+        在后台把当天全部事件写成日文件；df 应包含此前通过 append_changes 写入的全部事件。
+        partial 为True表示 df 只是其中一部分（worker按保留策略淘汰了较早的事件），写入前与日文件和日志段中的事件合并。
+        """
+        events = normalize_events(df)
+        events[SEQUENCE_COLUMN] = [self._signatures.get(key, _NO_SIGNATURE)[1] for key in self._keys(events)]
+        self._ensure_writer()
+        self._queue.put(("compact", (events, partial)))
+        self._uncompacted = 0
+
+    def close(self, timeout=10):
+        """写完队列中的数据后停止后台线程"""
+        if self._writer is None:
+            return
+        self._queue.put(("close", None))
+        self._writer.join(timeout)
+        self._writer = None
+
+    # --- 后台写入线程 ---
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name=f"journal-{self.date_str}", daemon=True)
+            self._writer.start()
+
+    def _open_segment(self):
+        if self._file is None:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._file = open(_segment_path(self.journal_dir, self.date_str, self._segment), 'ab')
+        return self._file
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_records(self, records):
+        f = self._open_segment()
+        for start in range(0, len(records), FLUSH_BATCH):
+            f.write(b''.join(encode_record(r) for r in records[start:start + FLUSH_BATCH]))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _merge_on_disk(self, events):
+        """已在磁盘上的事件（日文件和本次压实后删除的日志段）加上 events，同一股票同一类型以 events 为准"""
+        frames = []
+        if os.path.exists(self.day_file):
+            frames.append(pq.read_table(self.day_file).to_pandas())
+        records = []
+        for segment in _list_segments(self.journal_dir, self.date_str):
+            if segment < self._segment:
+                records.extend(read_records(_segment_path(self.journal_dir, self.date_str, segment))[0])
+        if records:
+            frames.append(pd.DataFrame.from_records(records, columns=EVENT_COLUMNS + [SEQUENCE_COLUMN]))
+        frames.append(events)
+        merged = _with_sequences(pd.concat(frames, ignore_index=True))
+        return merged.drop_duplicates(subset=KEY_COLUMNS, keep='last', ignore_index=True)
+
+    def _compact(self, events, partial=False):
+        # 先切换日志段：日文件写入成功后，之后的事件只需从新日志段重放
+        self._close_segment()
+        self._segment += 1
+        if partial:
+            events = self._merge_on_disk(events)
+        table = pa.Table.from_pandas(events, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}), _SEGMENT_META_KEY: str(self._segment).encode()
+        })
+        tmp_path = self.day_file + ".tmp"
+        pq.write_table(table, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.day_file)
+        for segment in _list_segments(self.journal_dir, self.date_str):
+            if segment < self._segment:
+                os.remove(_segment_path(self.journal_dir, self.date_str, segment))
+        logging.info(f"[change_journal] 已压实 {len(events)} 条事件到 {self.day_file}")
+
+    def _write_loop(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending = []
+            for kind, payload in items:
+                if kind == "records":
+                    pending.extend(payload)
+                    continue
+                try:
+                    if pending:
+                        self._write_records(pending)
+                        pending = []
+                    if kind == "compact":
+                        self._compact(*payload)
+                except Exception as e:
+                    logging.error(f"[change_journal] {kind} 失败: {e}", exc_info=True)
+                if kind == "close":
+                    self._close_segment()
+                    return
+            if pending:
+                try:
+                    self._write_records(pending)
+                except Exception as e:
+                    logging.error(f"[change_journal] 追加日志失败: {e}", exc_info=True)
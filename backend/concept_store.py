@@ -0,0 +1,253 @@
+import os
+import json
+import shutil
+import threading
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# 概念数据的列式存储目录结构：
+#   concept_store/CURRENT              当前代的目录名，如 gen-00000003
+#   concept_store/gen-00000003/meta.json
+#   concept_store/gen-00000003/{sector,name,stock}_idx.npy   分类编码，按 np.load(mmap_mode='r') 打开
+#   concept_store/gen-00000003/{sectors,names,stocks}.json   分类取值
+#   concept_store/gen-00000003/boards.json   各板块抓取时的摘要，供增量刷新判断板块是否变化
+#   concept_store/gen-00000003/diff.json     相对上一代的成员变化 (added/removed/renamed)，只有增量刷新时写入
+CONCEPT_STORE_DIRNAME = "concept_store"
+_CURRENT_FILE = "CURRENT"
+_KEEP_GENERATIONS = 2
+
+
+def get_concept_store_dir(static_dir):
+    return os.path.join(static_dir, CONCEPT_STORE_DIRNAME)
+
+
+def _codes_dtype(n_categories):
+    """与pandas分类编码一致的最小整数类型，保证 Categorical.from_codes 不会复制数组"""
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    if n_categories < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+def _generation_name(generation):
+    return f"gen-{generation:08d}"
+
+
+def _source_mtime(*paths):
+    return max(os.path.getmtime(p) for p in paths)
+
+
+def read_concept_sources(concepts_path, concept_stocks_path):
+    """读取并合并 concepts.csv 和 concept_stocks.csv"""
+    concepts_df = pd.read_csv(concepts_path, dtype={'板块代码': str, '板块名称': str})
+    concept_stocks_df = pd.read_csv(concept_stocks_path, dtype={'股票代码': str, '板块代码': str})
+    concept_df = pd.merge(concept_stocks_df, concepts_df, on='板块代码', how='left')
+    return concept_df[['板块代码', '板块名称', '股票代码']]
+
+
+def current_generation(store_dir):
+    """当前代编号，不存在时返回0"""
+    try:
+        with open(os.path.join(store_dir, _CURRENT_FILE), encoding='utf-8') as f:
+            return int(f.read().strip().split('-')[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def read_meta(store_dir, generation=None):
+    generation = generation or current_generation(store_dir)
+    if not generation:
+        return None
+    with open(os.path.join(store_dir, _generation_name(generation), "meta.json"), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_generation_json(store_dir, filename, generation=None, default=None):
+    """读取某一代目录中的附加JSON文件（boards.json、diff.json），不存在时返回default"""
+    generation = generation or current_generation(store_dir)
+    if not generation:
+        return default
+    try:
+        with open(os.path.join(store_dir, _generation_name(generation), filename), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_concept_store(concept_df, store_dir, source_mtime=None, extras=None):
+    """
+    将合并后的概念表写成新的一代列式存储，原子切换CURRENT后返回新的代编号。
+
+    extras 为 文件名 -> 可JSON序列化对象，与该代数据一起写入，如板块摘要和成员变化。
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    generation = current_generation(store_dir) + 1
+    final_dir = os.path.join(store_dir, _generation_name(generation))
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = {
+        'sector': concept_df['板块代码'].astype(str),
+        'name': concept_df['板块名称'],
+        'stock': concept_df['股票代码'].astype(str),
+    }
+    category_files = {'sector': "sectors.json", 'name': "names.json", 'stock': "stocks.json"}
+    for key, series in columns.items():
+        codes, categories = pd.factorize(series, use_na_sentinel=True)
+        np.save(os.path.join(tmp_dir, f"{key}_idx.npy"), codes.astype(_codes_dtype(len(categories))))
+        with open(os.path.join(tmp_dir, category_files[key]), 'w', encoding='utf-8') as f:
+            json.dump([str(c) for c in categories], f, ensure_ascii=False)
+
+    meta = {
+        "generation": generation,
+        "rows": int(len(concept_df)),
+        "source_mtime": source_mtime,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    for filename, obj in (extras or {}).items():
+        with open(os.path.join(tmp_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+
+    os.replace(tmp_dir, final_dir)
+    current_tmp = os.path.join(store_dir, _CURRENT_FILE + ".tmp")
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(_generation_name(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(store_dir, _CURRENT_FILE))
+    _remove_old_generations(store_dir, generation)
+
+    logging.info(f"[concept_store] 已写入第{generation}代概念数据，共{len(concept_df)}条: {final_dir}")
+    return generation
+
+
+def _remove_old_generations(store_dir, generation):
+    """只保留最近几代，旧代可能仍被其他进程映射，删除失败时忽略"""
+    for entry in os.listdir(store_dir):
+        if not entry.startswith("gen-") or entry.endswith(".tmp"):
+            continue
+        try:
+            gen = int(entry.split('-')[1])
+        except ValueError:
+            continue
+        if gen <= generation - _KEEP_GENERATIONS:
+            shutil.rmtree(os.path.join(store_dir, entry), ignore_errors=True)
+
+
+def build_concept_store(concepts_path, concept_stocks_path, store_dir, extras=None):
+    """从概念CSV源文件生成新的一代列式存储"""
+    concept_df = read_concept_sources(concepts_path, concept_stocks_path)
+    return write_concept_store(concept_df, store_dir, _source_mtime(concepts_path, concept_stocks_path), extras)
+
+
+def ensure_concept_store(concepts_path, concept_stocks_path, store_dir):
+    """列式存储不存在或比CSV源文件旧时重新生成，返回当前代编号"""
+    meta = None
+    try:
+        meta = read_meta(store_dir)
+    except (OSError, ValueError) as e:
+        logging.warning(f"[concept_store] 读取概念存储元数据失败，将重新生成: {e}")
+    if meta is not None:
+        if not os.path.exists(concepts_path) or not os.path.exists(concept_stocks_path):
+            return meta["generation"]
+        if (meta.get("source_mtime") or 0) >= _source_mtime(concepts_path, concept_stocks_path):
+            return meta["generation"]
+    logging.debug("[concept_store] 概念列式存储缺失或过期，从CSV重新生成")
+    return build_concept_store(concepts_path, concept_stocks_path, store_dir)
+
+
+def load_concept_frame(store_dir, generation=None):
+    """
+    以内存映射方式打开一代概念数据，返回 (generation, concept_df)。
+
+    三列均为分类类型，编码数组直接引用映射的文件，不复制数据，多个进程共享同一份页缓存。
+    """
+    generation = generation or current_generation(store_dir)
+    if not generation:
+        raise FileNotFoundError(f"概念列式存储不存在: {store_dir}")
+    gen_dir = os.path.join(store_dir, _generation_name(generation))
+
+    def categorical(key, category_file):
+        codes = np.load(os.path.join(gen_dir, f"{key}_idx.npy"), mmap_mode='r')
+        with open(os.path.join(gen_dir, category_file), encoding='utf-8') as f:
+            categories = json.load(f)
+        return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object), validate=False)
+
+    concept_df = pd.DataFrame({
+        '板块代码': categorical('sector', "sectors.json"),
+        '板块名称': categorical('name', "names.json"),
+        '股票代码': categorical('stock', "stocks.json"),
+    }, copy=False)
+    logging.debug(f"[concept_store] 已映射第{generation}代概念数据，共{len(concept_df)}条")
+    return generation, concept_df
+
+
+class ConceptGenerationFollower:
+    """
+    worker进程侧：跟随API进程通过共享快照发布的概念代编号。
+
+    发现新的一代时在后台线程中映射数据，不阻塞当前tick；加载完成后在下一次 poll() 时
+    一次性切换引用，调用方在两个tick之间拿到的始终是完整的一代数据。
+    """
+
+    def __init__(self, generation_snapshot, store_dir):
+        self.snapshot = generation_snapshot
+        self.store_dir = store_dir
+        self.generation = 0
+        self.concept_df = None
+        self._seen_version = 0
+        self._pending = None
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def load_initial(self):
+        """同步加载当前代，用于进程启动时"""
+        generation = self._published_generation() or current_generation(self.store_dir)
+        if generation:
+            self.generation, self.concept_df = load_concept_frame(self.store_dir, generation)
+        return self.concept_df
+
+    def _published_generation(self):
+        if self.snapshot is None:
+            return 0
+        version, info = self.snapshot.read()
+        self._seen_version = version
+        return info["generation"] if info else 0
+
+    def _load(self, generation):
+        try:
+            loaded = load_concept_frame(self.store_dir, generation)
+            with self._lock:
+                self._pending = loaded
+        except Exception as e:
+            logging.error(f"[concept_store] 加载第{generation}代概念数据失败: {e}", exc_info=True)
+        finally:
+            self._loading = False
+
+    def poll(self):
+        """在tick之间调用；有新一代已加载完成时完成切换并返回True"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            old_generation = self.generation
+            self.generation, self.concept_df = pending
+            logging.info(f"[concept_store] 概念数据已切换: 第{old_generation}代 -> 第{self.generation}代")
+            return True
+
+        if self.snapshot is None or self._loading or self.snapshot.version == self._seen_version:
+            return False
+        generation = self._published_generation()
+        if generation and generation != self.generation:
+            self._loading = True
+            threading.Thread(target=self._load, args=(generation,), daemon=True).start()
+        return False
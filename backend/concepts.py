@@ -1,21 +1,204 @@
-import time as t
-import pandas as pd
-import akshare as ak
 import os
-from typing import List
-import logging
+import json
 import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import akshare as ak
+
+from utils import TokenBucket
+from concept_store import (
+    build_concept_store, get_concept_store_dir, current_generation, load_concept_frame, read_generation_json
+)
+
+
+MAX_MARKET_CAP = 30000000000000  # 总市值超过该值的板块不收录
+MAX_BOARD_STOCKS = 99            # 成分股超过该数量的板块不收录
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 2.0               # 每秒请求成分股接口的平均次数
+FETCH_RETRIES = 3
+CAP_DRIFT_THRESHOLD = 0.05       # 总市值变化偏离全市场中位数超过该比例时视为成分股可能变化
+MAX_BOARD_AGE_DAYS = 7           # 增量刷新时超过该天数未重新获取的板块强制获取
+CRAWL_DIRNAME = "concept_crawl"
+
+
+def get_crawl_checkpoint_path(static_dir, date_str=None):
+    """当天爬取进度的检查点文件，每行一个已完成的板块"""
+    date_str = date_str or datetime.now().strftime("%Y%m%d")
+    return os.path.join(static_dir, CRAWL_DIRNAME, f"crawl_{date_str}.jsonl")
 
-def getConcepts(concepts_path=None, concept_stocks_path=None) -> None:
+
+def _load_checkpoint(path):
+    """读取检查点，返回 板块代码 -> 记录；末尾写了一半的行直接忽略"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            done[record['板块代码']] = record
+    return done
+
+
+def _select_boards(boards_df):
+    """过滤掉市值过大和“昨日”类板块，按总市值从小到大排列，附带用于增量判断的摘要列"""
+    boards_df = boards_df.sort_values(by='总市值', ascending=True)
+    cap = pd.to_numeric(boards_df['总市值'], errors='coerce').fillna(0)
+    mask = (cap <= MAX_MARKET_CAP) & ~boards_df['板块名称'].astype(str).str.contains('昨日', regex=False)
+    skipped = int((~mask).sum())
+    if skipped:
+        logging.debug(f"[getConcepts] 跳过 {skipped} 个市值过大或包含'昨日'的板块")
+    # 上涨+下跌家数不含平盘股票，只是成分股数量的下限
+    movers = sum(pd.to_numeric(boards_df.get(col, 0), errors='coerce').fillna(0) for col in ('上涨家数', '下跌家数'))
+    return pd.DataFrame({
+        '板块代码': boards_df['板块代码'].astype(str),
+        '板块名称': boards_df['板块名称'].astype(str),
+        '总市值': cap,
+        '涨跌家数': movers,
+    }).loc[mask]
+
+
+def _plan_incremental(boards, prev_boards, prev_members, today):
+    """
+    与上一代的板块摘要比较，返回可直接沿用的板块记录 板块代码 -> 记录。
+
+    以下板块需要重新获取：新出现的板块、涨跌家数超过上次的成分股数量（一定有新增成员）、
+    总市值变化率偏离全部板块中位数过多（有成员进出）、以及距上次获取超过 MAX_BOARD_AGE_DAYS 天。
+    """
+    known = boards[boards['板块代码'].isin(prev_boards.keys())]
+    prev_cap = known['板块代码'].map(lambda c: prev_boards[c].get('cap') or 0)
+    prev_count = known['板块代码'].map(lambda c: prev_boards[c].get('count', 0))
+    fetched = pd.to_datetime(known['板块代码'].map(lambda c: prev_boards[c].get('fetched')), format="%Y%m%d", errors='coerce')
+
+    ratio = known['总市值'] / prev_cap.where(prev_cap > 0)
+    median = ratio.median()
+    drifted = (ratio / median - 1).abs() > CAP_DRIFT_THRESHOLD if median and median > 0 else ratio.isna()
+    grown = known['涨跌家数'] > prev_count
+    stale = ((pd.Timestamp(today) - fetched).dt.days > MAX_BOARD_AGE_DAYS) | fetched.isna()
+    changed = drifted | ratio.isna() | grown | stale
+
+    reuse = {}
+    for code, name in zip(known.loc[~changed, '板块代码'], known.loc[~changed, '板块名称']):
+        prev = prev_boards[code]
+        if prev.get('skipped'):
+            reuse[code] = {'板块代码': code, '板块名称': name, 'skipped': True, 'count': prev.get('count', 0)}
+        elif code in prev_members:
+            reuse[code] = {'板块代码': code, '板块名称': name, 'stocks': prev_members[code]}
+        else:
+            continue
+        reuse[code].update(cap=prev.get('cap'), fetched=prev.get('fetched'))
+
+    logging.info(
+        f"[getConcepts] 增量刷新: 新板块 {len(boards) - len(known)} 个, 涨跌家数增加 {int(grown.sum())} 个, "
+        f"市值偏离 {int(drifted.sum())} 个, 过期 {int(stale.sum())} 个, 沿用 {len(reuse)} 个"
+    )
+    return reuse
+
+
+def _previous_generation(store_dir):
+    """读取上一代的板块摘要、板块代码 -> 成分股列表和板块名称，不存在时返回 (0, None, None, None)"""
+    generation = current_generation(store_dir)
+    if not generation:
+        return 0, None, None, None
+    prev_boards = read_generation_json(store_dir, "boards.json", generation)
+    _, prev_df = load_concept_frame(store_dir, generation)
+    prev_members = {
+        str(code): [str(s) for s in stocks]
+        for code, stocks in prev_df.groupby('板块代码', observed=True)['股票代码'].agg(list).items()
+    }
+    prev_names = dict(zip(prev_df['板块代码'].astype(str), prev_df['板块名称'].astype(str)))
+    return generation, prev_boards, prev_members, prev_names
+
+
+def _membership_diff(prev_members, prev_names, df_concepts, df_concept_stocks, from_generation):
+    """计算相对上一代的 (板块代码, 板块名称, 股票代码) 增删，以及代码不变、名称改变的板块 (板块代码, 新名称)"""
+    new_pairs = df_concept_stocks.merge(df_concepts, on='板块代码', how='left')
+    counts = [len(stocks) for stocks in prev_members.values()]
+    prev_pairs = pd.DataFrame({
+        '板块代码': np.repeat(list(prev_members.keys()), counts).astype(object),
+        '股票代码': [code for stocks in prev_members.values() for code in stocks],
+    })
+    prev_pairs['板块名称'] = prev_pairs['板块代码'].map(prev_names)
+    merged = new_pairs[['板块代码', '板块名称', '股票代码']].merge(
+        prev_pairs[['板块代码', '板块名称', '股票代码']], on=['板块代码', '股票代码'], how='outer',
+        suffixes=('', '_prev'), indicator=True,
+    )
+    added = merged.loc[merged['_merge'] == 'left_only', ['板块代码', '板块名称', '股票代码']]
+    removed = merged.loc[merged['_merge'] == 'right_only', ['板块代码', '板块名称_prev', '股票代码']]
+    renamed = [[code, name] for code, name in zip(df_concepts['板块代码'].astype(str), df_concepts['板块名称'].astype(str))
+               if code in prev_names and prev_names[code] != name]
+    return {
+        "from_generation": from_generation,
+        "added": added.astype(str).values.tolist(),
+        "removed": removed.astype(str).values.tolist(),
+        "renamed": renamed,
+    }
+
+
+def _fetch_board(bucket, board_code):
+    """限速获取单个板块的成分股代码，失败时退避重试"""
+    for attempt in range(1, FETCH_RETRIES + 1):
+        bucket.acquire()
+        try:
+            cons_df = ak.stock_board_concept_cons_em(symbol=board_code)
+            return cons_df['代码'].astype(str).tolist()
+        except Exception as e:
+            if attempt == FETCH_RETRIES:
+                raise
+            logging.debug(f"[getConcepts] 获取板块 {board_code} 失败，第{attempt}次重试: {e}")
+            time.sleep(2 ** attempt)
+
+
+def _write_csv(df, path):
+    """先写临时文件再替换，读取方不会看到写了一半的CSV"""
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    logging.debug(f"[getConcepts] 已保存到: {path}, 文件大小: {os.path.getsize(path)} bytes")
+
+
+def _build_frames(boards, done):
+    """由检查点记录拼出 concepts / concept_stocks 两张表"""
+    kept = [done[code] for code in boards['板块代码'] if code in done and not done[code].get('skipped')]
+    df_concepts = pd.DataFrame(
+        {'板块代码': [r['板块代码'] for r in kept], '板块名称': [r['板块名称'] for r in kept]}
+    ).drop_duplicates()
+    counts = [len(r['stocks']) for r in kept]
+    df_concept_stocks = pd.DataFrame({
+        '板块代码': np.repeat([r['板块代码'] for r in kept], counts).astype(object),
+        '股票代码': [code for r in kept for code in r['stocks']],
+    }).drop_duplicates()
+    return df_concepts, df_concept_stocks
+
+
+def getConcepts(concepts_path=None, concept_stocks_path=None, progress_callback=None,
+                max_workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, incremental=False) -> None:
     """
     Fetch concept stock data and save to a CSV file.
 
-    This function retrieves stock concepts and their constituent stocks from akshare,
-    filters them by market cap, and saves the results to the appropriate static directory.
-    
+    Boards are fetched concurrently by a bounded thread pool under a token-bucket rate limit.
+    Every finished board is appended to a daily checkpoint file, so an interrupted run resumes
+    from where it stopped instead of starting over.
+
+    In incremental mode, boards whose summary (market cap, constituent count) hasn't changed since
+    the last stored generation are reused without refetching. The new generation records the
+    membership diff (and renamed boards) against the previous one; full runs don't load the
+    previous generation and record no diff.
+
     Args:
         concepts_path: Path to save concepts.csv. If None, will use default location.
         concept_stocks_path: Path to save concept_stocks.csv. If None, will use default location.
+        progress_callback: Called as progress_callback(dict) with done/total/failed/eta_seconds.
+        max_workers: Number of concurrent board requests.
+        rate: Average board requests per second.
+        incremental: Refetch only boards that are new or look changed.
     """
     logging.debug("[getConcepts] 开始获取概念股数据")
 
@@ -26,82 +209,112 @@ def getConcepts(concepts_path=None, concept_stocks_path=None) -> None:
         os.makedirs(static_dir, exist_ok=True)
         concepts_path = os.path.join(static_dir, "concepts.csv") if not concepts_path else concepts_path
         concept_stocks_path = os.path.join(static_dir, "concept_stocks.csv") if not concept_stocks_path else concept_stocks_path
-    
+    static_dir = os.path.dirname(concepts_path)
+
     logging.debug(f"[getConcepts] 概念数据将保存到: {concepts_path}")
     logging.debug(f"[getConcepts] 概念成分股数据将保存到: {concept_stocks_path}")
 
-    concepts: List[List[str]] = [['板块代码', '板块名称']]
-    concept_stocks: List[List[str]] = [['板块代码', '股票代码']]
-    logging.debug("[getConcepts] 开始获取板块概念数据")
-    stock_board_concept_name_em_df = ak.stock_board_concept_name_em()
-    logging.debug(f"[getConcepts] 获取到 {len(stock_board_concept_name_em_df)} 个板块概念")
+    store_dir = get_concept_store_dir(static_dir)
+    today = datetime.now().strftime("%Y%m%d")
+    boards = _select_boards(ak.stock_board_concept_name_em())
+    # 全量刷新不沿用上一代，也不记录成员变化，加载方会整体重建索引
+    prev_generation, prev_boards, prev_members, prev_names = (
+        _previous_generation(store_dir) if incremental else (0, None, None, None)
+    )
 
-    stock_board_concept_name_em_df.sort_values(by='总市值', ascending=True, inplace=True)
+    done = {}
+    if incremental:
+        if prev_boards is None:
+            logging.info("[getConcepts] 上一代没有板块摘要，本次执行全量刷新")
+        else:
+            done.update(_plan_incremental(boards, prev_boards, prev_members, today))
+    checkpoint_path = get_crawl_checkpoint_path(static_dir, today)
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    done.update(_load_checkpoint(checkpoint_path))
+    pending = [(code, name) for code, name in zip(boards['板块代码'], boards['板块名称']) if code not in done]
+    total = len(boards)
+    logging.info(f"[getConcepts] 共 {total} 个板块，已完成或沿用 {total - len(pending)} 个，本次需获取 {len(pending)} 个")
 
-    for idx, v in stock_board_concept_name_em_df.iterrows():
-        logging.debug(f"[getConcepts] 处理板块: {v['板块名称']} (市值: {v['总市值']})")
+    started = time.monotonic()
+    finished_this_run = 0
+    failed = []
+    lock = threading.Lock()
 
-        if int(v['总市值']) > 30000000000000 or '昨日' in v['板块名称']:
-            logging.debug(f"[getConcepts] 跳过板块: {v['板块名称']} (市值过大或包含'昨日')")
-            continue
+    def report():
+        completed = total - len(pending) + finished_this_run
+        elapsed = time.monotonic() - started
+        remaining = len(pending) - finished_this_run - len(failed)
+        eta = elapsed / finished_this_run * remaining if finished_this_run else None
+        if progress_callback is not None:
+            progress_callback({
+                "done": completed,
+                "total": total,
+                "failed": len(failed),
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            })
 
-        stock_board_concept_spot_em_df = ak.stock_board_concept_cons_em(symbol=v['板块代码'])
-        if len(stock_board_concept_spot_em_df)>99:
-            continue
-        logging.debug(f"[getConcepts] 板块 {v['板块名称']} 包含 {len(stock_board_concept_spot_em_df)} 只股票")
-
-        # 只存板块代码和板块名称
-        concepts.append([v['板块代码'], v['板块名称']])
-        for _, v2 in stock_board_concept_spot_em_df.iterrows():
-            concept_stocks.append([v['板块代码'], v2['代码']])
-        logging.debug(f"[getConcepts] 当前concepts记录数: {len(concepts)}，concept_stocks记录数: {len(concept_stocks)}")
-        if len(concepts) % 20 == 0:
-            logging.debug("[getConcepts] 暂停15秒避免请求过于频繁")
-            t.sleep(15)
-
-    logging.debug(f"[getConcepts] 数据获取完成，concepts总记录数: {len(concepts)}，concept_stocks总记录数: {len(concept_stocks)}")
-    df_concepts = pd.DataFrame(concepts, columns=['板块代码', '板块名称']).drop_duplicates()
-    df_concept_stocks = pd.DataFrame(concept_stocks, columns=['板块代码', '股票代码']).drop_duplicates()
-    
-    # Save files and verify they were written
-    df_concepts.to_csv(concepts_path, index=False)
-    
-    # Ensure the file is properly closed and flushed
-    if os.path.exists(concepts_path):
-        # Get file size before closing
-        concepts_size = os.path.getsize(concepts_path)
-        logging.debug(f"[getConcepts] 概念数据已保存到: {concepts_path}")
-        logging.debug(f"[getConcepts] 文件大小: {concepts_size} bytes")
-    else:
-        concepts_size = 0
-        logging.error("[getConcepts] 未能成功保存概念数据文件!")
-        
-    # Flush and close the file
-    if 'df_concepts' in locals():
-        del df_concepts
-    if 'df_concept_stocks' in locals():
-        del df_concept_stocks
-        
-    # Force garbage collection to ensure files are closed
-    import gc
-    gc.collect()
-    
-    # Add a small delay to ensure file handles are released
-    time.sleep(1)
-    
-    df_concept_stocks.to_csv(concept_stocks_path, index=False)
-    
-    if os.path.exists(concept_stocks_path):
-        stocks_size = os.path.getsize(concept_stocks_path)
-        logging.debug(f"[getConcepts] 概念成分股数据已保存到: {concept_stocks_path}")
-        logging.debug(f"[getConcepts] 文件大小: {stocks_size} bytes")
-    else:
-        stocks_size = 0
-        logging.error("[getConcepts] 未能成功保存概念成分股数据文件!")
-        
-    # Final verification
-    logging.debug(f"[getConcepts] 验证文件: concepts_size={concepts_size}, stocks_size={stocks_size}")
-    if concepts_size > 0 and stocks_size > 0:
-        logging.debug("[getConcepts] 文件写入验证成功")
-    else:
-        logging.error("[getConcepts] 文件写入验证失败")
\ No newline at end of file
+    report()
+    bucket = TokenBucket(rate, capacity=max_workers)
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="concept-crawl") as pool:
+        futures = {pool.submit(_fetch_board, bucket, code): (code, name) for code, name in pending}
+        for future in as_completed(futures):
+            code, name = futures[future]
+            try:
+                stocks = future.result()
+            except Exception as e:
+                logging.warning(f"[getConcepts] 板块 {name}({code}) 获取失败: {e}")
+                with lock:
+                    failed.append(code)
+                report()
+                continue
+
+            record = {'板块代码': code, '板块名称': name, 'stocks': stocks, 'fetched': today}
+            if len(stocks) > MAX_BOARD_STOCKS:
+                record = {'板块代码': code, '板块名称': name, 'skipped': True, 'count': len(stocks), 'fetched': today}
+            checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            done[code] = record
+            finished_this_run += 1
+            logging.debug(f"[getConcepts] 板块 {name} 包含 {len(stocks)} 只股票")
+            report()
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} 个板块获取失败，已完成的板块保存在检查点中，重新运行将从断点继续")
+
+    df_concepts, df_concept_stocks = _build_frames(boards, done)
+    logging.debug(f"[getConcepts] 数据获取完成，concepts总记录数: {len(df_concepts)}，concept_stocks总记录数: {len(df_concept_stocks)}")
+    if df_concepts.empty or df_concept_stocks.empty:
+        logging.error("[getConcepts] 概念数据为空，保留原有文件")
+        return
+
+    caps = dict(zip(boards['板块代码'], boards['总市值']))
+    board_summary = {
+        code: {
+            'name': r['板块名称'],
+            'cap': float(caps[code]) if r.get('fetched') == today else r.get('cap'),
+            'count': r.get('count', len(r.get('stocks', ()))),
+            'fetched': r.get('fetched', today),
+            'skipped': bool(r.get('skipped')),
+        }
+        for code, r in done.items() if code in caps
+    }
+    extras = {"boards.json": board_summary}
+    if prev_members is not None:
+        diff = _membership_diff(prev_members, prev_names, df_concepts, df_concept_stocks, prev_generation)
+        extras["diff.json"] = diff
+        logging.info(f"[getConcepts] 相对第{prev_generation}代: 新增 {len(diff['added'])} 条, 移除 {len(diff['removed'])} 条, "
+                     f"改名 {len(diff['renamed'])} 个板块")
+
+    _write_csv(df_concepts, concepts_path)
+    _write_csv(df_concept_stocks, concept_stocks_path)
+    # 源数据更新后重新生成列式存储
+    build_concept_store(concepts_path, concept_stocks_path, store_dir, extras)
+
+    # 本轮已完整结束，清理检查点
+    for entry in os.listdir(os.path.dirname(checkpoint_path)):
+        if entry.startswith("crawl_") and entry.endswith(".jsonl"):
+            os.remove(os.path.join(os.path.dirname(checkpoint_path), entry))
+    logging.info(f"[getConcepts] 概念数据更新完成，耗时 {time.monotonic() - started:.1f} 秒")
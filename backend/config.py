@@ -4,6 +4,9 @@ import logging
 import logging.handlers
 from multiprocessing import Queue
 
+from log_control import apply_levels, install_filters
+from log_stream import log_ring_handler
+
 
 # 类型映射字典
 type_mapping = {
@@ -31,17 +34,26 @@ type_mapping = {
     # '8216': '60日大幅下跌'
 }
 
+# 数据新鲜度SLO：异动从交易所时间（接口的tm）到通过WebSocket发出的延迟超过该秒数时记录告警
+FRESHNESS_SLO_SECONDS = float(os.environ.get("EASTMONEYWATCH_FRESHNESS_SLO", "15"))
+
+# worker内存中最多保留的当天事件数，0为不限制。超出时按时间淘汰最早的事件，实时推送中不再包含；
+# 被淘汰的事件已写入当天的异动日志，压实日文件和换日写入历史分区时从磁盘合并回来，历史查询和导出不受影响。
+EVENT_RETENTION_ROWS = int(os.environ.get("EASTMONEYWATCH_EVENT_RETENTION", "50000"))
+
 
 def setup_logging(level=logging.INFO):
-    """配置日志记录"""
-    # 1. 配置主进程日志
+    """配置日志记录；level 可以是级别，也可以是 log_control.parse_levels 支持的按模块配置"""
+    # 1. 配置主进程日志：输出到stdout，同时写入 /ws/logs 使用的环形缓冲区
+    stdout_handler = install_filters(logging.StreamHandler(sys.stdout), log_ring_handler)
     logging.basicConfig(
-        level=level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.StreamHandler(sys.stdout)
+            stdout_handler,
+            log_ring_handler
         ]
     )
+    apply_levels(level)
 
     # 2. 创建用于进程间通信的日志队列
     log_queue = Queue()
@@ -54,3 +66,22 @@ def setup_logging(level=logging.INFO):
     logging.debug("[logging] 日志系统已配置完成。")
     
     return log_queue, queue_listener
+
+
+def setup_child_logging(q: Queue, level):
+    """在子进程中配置logging，将日志记录发送到队列。"""
+    if q is None:
+        # Fallback for safety, though it shouldn't happen in normal operation
+        logging.basicConfig(level=logging.DEBUG)
+        logging.warning("Log queue not provided to child process.")
+        return
+
+    # 创建一个handler，它将日志写入队列；在放入队列前限速和采样，被丢弃的记录不经过pickle
+    queue_handler = install_filters(logging.handlers.QueueHandler(q))
+
+    # 设置根logger和各模块的level，低于level的日志在调用处直接返回
+    logger = logging.getLogger()
+    apply_levels(level)
+
+    # 清除所有现有的handlers，只使用QueueHandler
+    logger.handlers = [queue_handler]
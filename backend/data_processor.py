@@ -1,7 +1,15 @@
 import pandas as pd
+import weakref
 from services.pick_service import get_shared_picked_df
 import logging
 
+logger = logging.getLogger(__name__)
+
+# id(concept_df) -> 每只股票第一个板块的DataFrame。概念数据和picked_df在换代/版本变化时整体替换、不会原地修改，
+# 按对象缓存即可；原DataFrame被回收时对应的缓存随之删除
+_first_concept_cache = {}
+
+
 def apply_sorting(df,concept_df, uplimit_cache=None):
     """统一的排序函数：添加概念板块信息并按板块排序（picked_df最前，rising concepts次之，其他concept_df最后）
 
@@ -17,21 +25,22 @@ def apply_sorting(df,concept_df, uplimit_cache=None):
 
     try:
         if concept_df is None or concept_df.empty:
-            logging.debug("[apply_sorting] concept_df缓存为空，这不应该发生")
+            logger.debug("[apply_sorting] concept_df缓存为空，这不应该发生")
             return df
 
         #  为股票异动数据添加概念板块信息（使用过滤后的concept_df）
         df = add_concept_data_to_changes(df, concept_df)
         with_picked_df = add_concept_data_to_changes(df, picked_df)
-        logging.debug(f"[apply_sorting] 添加picked_df概念信息后数据量: {len(df)}")
+        logger.debug("[apply_sorting] 添加picked_df概念信息后数据量: %d", len(df))
 
         if len(with_picked_df)>0:
             df = pd.concat([with_picked_df, df], ignore_index=True)
         
         # 按时间+股票代码去重，保留第一次出现的（即picked优先）
         df = df.drop_duplicates(subset=['股票代码','时间'], keep='first').reset_index(drop=True)
-        logging.debug(f"[apply_sorting] 去重后df列: {list(df.columns)}")
-        logging.debug(f"[apply_sorting] 去重后df前3行数据:\n{df.head(3)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[apply_sorting] 去重后df列: %s", list(df.columns))
+            logger.debug("[apply_sorting] 去重后df前3行数据:\n%s", df.head(3))
 
         # 4. 添加上下午字段和uplimit信息
         if '时间' in df.columns:
@@ -45,7 +54,7 @@ def apply_sorting(df,concept_df, uplimit_cache=None):
         sector_name_col = None
 
         # 添加调试日志
-        logging.debug(f"[apply_sorting] 当前df的所有列: {list(df.columns)}")
+        logger.debug("[apply_sorting] 当前df的所有列: %s", list(df.columns))
 
         # 寻找正确的板块代码和名称列
         for col in ['板块代码', '板块代码_x', '板块代码_y']:
@@ -59,43 +68,45 @@ def apply_sorting(df,concept_df, uplimit_cache=None):
                 break
 
         # 添加调试日志
-        logging.debug(f"[apply_sorting] 找到的板块代码列: {sector_code_col}")
-        logging.debug(f"[apply_sorting] 找到的板块名称列: {sector_name_col}")
+        logger.debug("[apply_sorting] 找到的板块代码列: %s", sector_code_col)
+        logger.debug("[apply_sorting] 找到的板块名称列: %s", sector_name_col)
 
         # 构建最终列名列表，去掉板块代码列以减少数据传输量
         final_columns = ['股票代码', '时间', '名称', '相关信息', '类型', '四舍五入取整', '上下午', '标识']
         # 添加板块名称和板块代码
         if sector_name_col:
             final_columns.insert(1, sector_name_col)
-            logging.debug(f"[apply_sorting] 已将板块名称列添加到final_columns: {sector_name_col}")
+            logger.debug("[apply_sorting] 已将板块名称列添加到final_columns: %s", sector_name_col)
         else:
-            logging.debug(f"[apply_sorting] 未找到板块名称列，不添加到final_columns")
+            logger.debug("[apply_sorting] 未找到板块名称列，不添加到final_columns")
             
         if sector_code_col:
             final_columns.insert(2, sector_code_col)
-            logging.debug(f"[apply_sorting] 已将板块代码列添加到final_columns: {sector_code_col}")
+            logger.debug("[apply_sorting] 已将板块代码列添加到final_columns: %s", sector_code_col)
         else:
-            logging.debug(f"[apply_sorting] 未找到板块代码列，不添加到final_columns")
+            logger.debug("[apply_sorting] 未找到板块代码列，不添加到final_columns")
 
         available_columns = [col for col in final_columns if col in df.columns]
-        logging.debug(f"[apply_sorting] available_columns: {available_columns}")
-        result_df = df[available_columns].copy()
-        logging.debug(f"[apply_sorting] result_df前3行数据:\n{result_df.head(3)}")
+        logger.debug("[apply_sorting] available_columns: %s", available_columns)
+        # 按列选取已经生成新的DataFrame，不再另外copy
+        result_df = df[available_columns]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[apply_sorting] result_df前3行数据:\n%s", result_df.head(3))
 
         # 如果使用了带后缀的列名，重命名为标准名称
-        if sector_name_col and sector_name_col != '板块名称':
-            result_df = result_df.rename(columns={sector_name_col: '板块名称'})
-            
-        if sector_code_col and sector_code_col != '板块代码':
-            result_df = result_df.rename(columns={sector_code_col: '板块代码'})
+        renames = {col: name for col, name in ((sector_name_col, '板块名称'), (sector_code_col, '板块代码'))
+                   if col and col != name}
+        if renames:
+            result_df.rename(columns=renames, inplace=True)
 
-        logging.debug(f"[apply_sorting] 处理完成，返回{len(result_df)}条记录给前端，列: {list(result_df.columns)}")
-        logging.debug(f"[apply_sorting] 最终返回数据前3行:\n{result_df.head(3)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[apply_sorting] 处理完成，返回%d条记录给前端，列: %s", len(result_df), list(result_df.columns))
+            logger.debug("[apply_sorting] 最终返回数据前3行:\n%s", result_df.head(3))
 
         return result_df
 
     except Exception as e:
-        logging.debug(f"[apply_sorting] 排序时出错: {e}")
+        logger.debug("[apply_sorting] 排序时出错: %s", e)
         return df
 
 
@@ -105,46 +116,68 @@ def add_concept_data_to_changes(df, concept_df):
 
         # 检查合并所需的列
         available_columns = ['股票代码'] + [col for col in ['板块名称', '板块代码'] if col in concept_df.columns]
-        logging.debug(f"[add_concept_data_to_changes] concept_df列: {list(concept_df.columns)}")
-        logging.debug(f"[add_concept_data_to_changes] concept_df前3行数据:\n{concept_df.head(3)}")
-        logging.debug(f"[add_concept_data_to_changes] available_columns: {available_columns}")
-
-        # 合并概念信息到股票异动数据
-        first_concept_df = concept_df.drop_duplicates(subset=['股票代码'], keep='first').copy()
-        logging.debug(f"[add_concept_data_to_changes] first_concept_df前3行数据:\n{first_concept_df.head(3)}")
-        df['股票代码'] = df['股票代码'].astype(str)
-        first_concept_df['股票代码'] = first_concept_df['股票代码'].astype(str)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[add_concept_data_to_changes] concept_df列: %s", list(concept_df.columns))
+            logger.debug("[add_concept_data_to_changes] concept_df前3行数据:\n%s", concept_df.head(3))
+            logger.debug("[add_concept_data_to_changes] available_columns: %s", available_columns)
 
         # 只合并概念相关的列，排除股票代码避免重复
         merge_columns = [col for col in available_columns if col != '股票代码']
-        logging.debug(f"[add_concept_data_to_changes] merge_columns: {merge_columns}")
+        logger.debug("[add_concept_data_to_changes] merge_columns: %s", merge_columns)
+
+        # 合并概念信息到股票异动数据
+        first_concept_df = _first_concepts(concept_df, merge_columns)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[add_concept_data_to_changes] first_concept_df前3行数据:\n%s", first_concept_df.head(3))
+        df['股票代码'] = df['股票代码'].astype(str)
 
         if merge_columns:
             # 检查是否有重复列名，如果有则先删除df中的同名列
             overlapping_cols = [col for col in merge_columns if col in df.columns]
             if overlapping_cols:
-                logging.debug(f"[add_concept_data_to_changes] 发现重复列，将删除df中的: {overlapping_cols}")
+                logger.debug("[add_concept_data_to_changes] 发现重复列，将删除df中的: %s", overlapping_cols)
                 df = df.drop(columns=overlapping_cols)
 
             # 执行合并
-            df = pd.merge(df, first_concept_df[['股票代码'] + merge_columns], on='股票代码', how='left')
-            logging.debug(f"[add_concept_data_to_changes] 合并后df前3行数据:\n{df.head(3)}")
+            df = pd.merge(df, first_concept_df, on='股票代码', how='left')
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[add_concept_data_to_changes] 合并后df前3行数据:\n%s", df.head(3))
 
         # 删除板块名称为空的行（按行删除，不是按列删除）
         if '板块名称' in df.columns:
             before_count = len(df)
             df = df.dropna(subset=['板块名称'], axis=0, inplace=False)
             after_count = len(df)
-            logging.debug(f"[add_concept_data_to_changes] 删除板块名称为空的行: {before_count} -> {after_count}")
+            logger.debug("[add_concept_data_to_changes] 删除板块名称为空的行: %d -> %d", before_count, after_count)
 
-        logging.debug(f"[add_concept_data_to_changes] 合并完成，最终列: {list(df.columns)}")
-        logging.debug(f"[add_concept_data_to_changes] 股票代码列非空数量: {df['股票代码'].notna().sum()}/{len(df)}")
-        logging.debug(f"[add_concept_data_to_changes] 合并后df前3行数据:\n{df.head(3)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[add_concept_data_to_changes] 合并完成，最终列: %s", list(df.columns))
+            logger.debug("[add_concept_data_to_changes] 股票代码列非空数量: %d/%d", df['股票代码'].notna().sum(), len(df))
+            logger.debug("[add_concept_data_to_changes] 合并后df前3行数据:\n%s", df.head(3))
 
         return df
 
     except Exception as e:
-        logging.debug(f"[add_concept_data_to_changes] 添加概念板块信息时出错: {e}")
-        import traceback
-        logging.debug(f"[add_concept_data_to_changes] 详细错误信息: {traceback.format_exc()}")
-        return df
\ No newline at end of file
+        logger.debug("[add_concept_data_to_changes] 添加概念板块信息时出错: %s", e, exc_info=True)
+        return df
+
+def _first_concepts(concept_df, merge_columns):
+    """
+    每只股票的第一个板块（股票代码转为str，只含 merge_columns），同一个concept_df只计算一次。
+    概念数据有几十万行，每个tick都去重并复制一遍是推送路径上最大的一块临时内存。
+    """
+    key = id(concept_df)
+    cached = _first_concept_cache.get(key)
+    if cached is not None and cached[0]() is concept_df and cached[1] == merge_columns:
+        return cached[2]
+
+    first_concept_df = concept_df.drop_duplicates(subset=['股票代码'], keep='first')[['股票代码'] + merge_columns]
+    first_concept_df = first_concept_df.assign(股票代码=first_concept_df['股票代码'].astype(str))
+    ref = weakref.ref(concept_df, lambda _, key=key: _first_concept_cache.pop(key, None))
+    _first_concept_cache[key] = (ref, list(merge_columns), first_concept_df)
+    return first_concept_df
+
+
+def first_concept_cache_bytes():
+    """缓存的每股第一板块DataFrame的内存占用（字节）"""
+    return sum(int(entry[2].memory_usage(index=True, deep=True).sum()) for entry in list(_first_concept_cache.values()))
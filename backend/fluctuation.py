@@ -4,7 +4,11 @@ import pandas as pd
 import requests
 from typing import Optional
 import logging
+import metrics
 from config import type_mapping
+from security_master import get_security_master
+
+logger = logging.getLogger(__name__)
 
 
 def filter_stock_data(df: pd.DataFrame) -> Optional[pd.DataFrame]:
@@ -44,7 +48,7 @@ HEADERS = {
 
 def parse_jsonp(jsonp_str):
     if not jsonp_str or not isinstance(jsonp_str, str):
-        logging.debug("错误：输入不是有效的字符串")
+        logger.debug("错误：输入不是有效的字符串")
         return None
     match = re.match(r'^[a-zA-Z0-9_]+\s*\(\s*(.*)\s*\)\s*;?\s*$', jsonp_str.strip(), re.DOTALL)
     if match:
@@ -55,21 +59,51 @@ def parse_jsonp(jsonp_str):
         return json.loads(jsonp_str)
 
 
+def fetch_changes_payload():
+    """请求东方财富的全部异动接口，返回JSONP原文"""
+    response = requests.get(
+        f'https://push2ex.eastmoney.com/getAllStockChanges?type=={','.join(type_mapping.keys())}&cb=jQuery35108409427522251944_1753773534498&ut=7eea3edcaed734bea9cbfc24409ed989&pageindex=0&pagesize=1000&dpt=wzchanges&_=1753773534514',
+        headers={**HEADERS, 'Referer': 'https://quote.eastmoney.com/changes/'},
+    )
+    return response.text
+
+
 def getChanges():
     """获取股票异动数据，不包含概念板块数据的拼接"""
+    return fetch_changes()[0]
+
+
+def fetch_changes():
+    """获取股票异动数据，返回 (DataFrame, 交易所时间)；交易所时间是接口原始的tm（HHMMSS整数），与DataFrame按索引对齐"""
     try:
-        response = requests.get(
-            f'https://push2ex.eastmoney.com/getAllStockChanges?type=={','.join(type_mapping.keys())}&cb=jQuery35108409427522251944_1753773534498&ut=7eea3edcaed734bea9cbfc24409ed989&pageindex=0&pagesize=1000&dpt=wzchanges&_=1753773534514',
-            headers={**HEADERS, 'Referer': 'https://quote.eastmoney.com/changes/'},
-        )
+        with metrics.stage("fetch", source="eastmoney"):
+            payload = fetch_changes_payload()
+        metrics.inc(metrics.BYTES_TOTAL, len(payload), stage="fetch", source="eastmoney")
+        with metrics.stage("parse", source="eastmoney"):
+            df, exchange_tm = parse_changes(payload, with_exchange_time=True)
+        metrics.inc(metrics.ROWS_TOTAL, len(df), stage="parse", source="eastmoney")
+        return df, exchange_tm
+    except Exception as e:
+        logger.error("[getChanges] 发生异常: %s", e, exc_info=True)
+        return pd.DataFrame(), None
 
+
+def parse_changes(payload, with_exchange_time=False):
+    """
+    解析异动接口的JSONP原文，返回与 getChanges 相同格式的DataFrame；与网络请求分开，便于基准测试。
+    with_exchange_time 为True时返回 (DataFrame, 交易所时间)，用于统计数据新鲜度。
+    """
+    def result(df, exchange_tm=None):
+        return (df, exchange_tm) if with_exchange_time else df
+
+    try:
         # 解析JSONP响应
-        data = parse_jsonp(response.text)
+        data = parse_jsonp(payload)
 
         # 检查数据是否存在且有效
         if not data or data['data'] is None:
-            logging.debug("[getChanges] 过滤后没有符合条件的数据")
-            return pd.DataFrame()
+            logger.debug("[getChanges] 过滤后没有符合条件的数据")
+            return result(pd.DataFrame())
 
         # 转换为DataFrame
         df = pd.DataFrame(data['data']['allstock'])
@@ -89,27 +123,20 @@ def getChanges():
         info_df = df['信息'].str.split(',', expand=True)
         if info_df.shape[1] >= 3:
             df['涨跌幅'] = pd.to_numeric(info_df[0], errors='coerce')
-
-            # 只对特定类型的涨停板使用固定涨跌幅，其他情况保留解析出的数据
-        def calculate_change_rate(row):
-            if row['类型'] == '封涨停板':
-                if row['代码'].startswith('8'):
-                    return 0.3
-                elif row['代码'].startswith('300') or row['代码'].startswith('688'):
-                    return 0.2
-                else:
-                    return 0.1
-            else:
-                # 对于非涨停板，使用解析出的涨跌幅数据
-                return row['涨跌幅'] if pd.notnull(row['涨跌幅']) else 0.0
-        
-        df['涨跌幅'] = df.apply(calculate_change_rate, axis=1)
+        if '涨跌幅' not in df.columns:
+            df['涨跌幅'] = 0.0
+
+        # 只对封涨停板使用证券主表中的涨停幅度，其他情况保留解析出的数据
+        df['涨跌幅'] = df['涨跌幅'].fillna(0.0)
+        is_limit_up = df['类型'].astype(str).map(type_mapping) == '封涨停板'
+        if is_limit_up.any():
+            df.loc[is_limit_up, '涨跌幅'] = get_security_master().limit_ratios(df.loc[is_limit_up, '股票代码'])
         df = df[(df['涨跌幅'] < 1) & ((df['涨跌幅'] >= 0.05) | (df['涨跌幅'] <= -0.05))]
         df = filter_stock_data(df)
         # 如果过滤后没有数据，返回空DataFrame
         if df is None or df.empty:
-            logging.debug("[getChanges] 过滤后没有符合条件的数据")
-            return pd.DataFrame()
+            logger.debug("[getChanges] 过滤后没有符合条件的数据")
+            return result(pd.DataFrame())
 
         # 转换为指定的输出格式
         def format_time(tm):
@@ -129,17 +156,16 @@ def getChanges():
         output_df['原始涨跌幅'] = df['涨跌幅']
 
         # 增加映射后的类型和相关信息，便于对比
-        logging.debug(f"[getChanges] 原始类型值: {df['类型'].unique().tolist()}")
         mapped_types = df['类型'].astype(str).map(type_mapping)
-        logging.debug(f"[getChanges] 映射后类型值: {mapped_types.unique().tolist()}")
-
-        # 检查未映射的类型
-        unmapped_types = df[~df['类型'].astype(str).isin(type_mapping.keys())]['类型'].unique()
-        if len(unmapped_types) > 0:
-            logging.debug(f"[getChanges] 发现未映射的类型: {unmapped_types.tolist()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[getChanges] 原始类型值: %s", df['类型'].unique().tolist())
+            logger.debug("[getChanges] 映射后类型值: %s", mapped_types.unique().tolist())
+            # 检查未映射的类型
+            unmapped_types = df[~df['类型'].astype(str).isin(type_mapping.keys())]['类型'].unique()
+            if len(unmapped_types) > 0:
+                logger.debug("[getChanges] 发现未映射的类型: %s", unmapped_types.tolist())
 
         output_df['类型'] = mapped_types.fillna('未知类型').infer_objects(copy=False)
-        logging.debug(f"[getChanges] 最终类型值: {output_df['类型'].unique().tolist()}")
 
         # 先加一列'四舍五入取整'，在加百分号前处理
         output_df['四舍五入取整'] = df['涨跌幅'].apply(lambda x: int(round(x * 100)) if pd.notnull(x) else None)
@@ -151,9 +177,8 @@ def getChanges():
         html_df = output_df[['股票代码', '时间', '名称', '相关信息', '类型', '四舍五入取整']].copy()
 
         # 确保股票代码不为空
-        logging.debug(f"[getChanges] 处理后包含股票代码的记录数: {html_df['股票代码'].notna().sum()}/{len(html_df)}")
         if html_df['股票代码'].isna().any():
-            logging.debug(f"[getChanges] 警告：发现股票代码为空的记录，将移除这些记录")
+            logger.debug("[getChanges] 警告：发现股票代码为空的记录，将移除这些记录")
             html_df = html_df.dropna(subset=['股票代码'])
 
         # 添加上下午字段
@@ -166,10 +191,11 @@ def getChanges():
         html_df = html_df.drop_duplicates(subset=['股票代码', '类型'], keep='last')
         html_df = html_df.drop_duplicates(subset=['股票代码', '时间'], keep='last')
 
-        return html_df
+        return result(html_df, pd.to_numeric(df.loc[html_df.index, '时间'], errors='coerce'))
     except Exception as e:
-        logging.error(f"[getChanges] 发生异常: {str(e)}", exc_info=True)
-        return pd.DataFrame()
+        metrics.inc(metrics.ERRORS_TOTAL, stage="parse", source="eastmoney")
+        logger.error("[parse_changes] 解析异动数据时发生异常: %s", e, exc_info=True)
+        return result(pd.DataFrame())
 
 
 
@@ -0,0 +1,126 @@
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import metrics
+from memory_stats import estimate_bytes
+from config import FRESHNESS_SLO_SECONDS
+
+
+# 数据新鲜度：异动的交易所时间（接口tm）到各环节的延迟。
+# worker在获取时识别首次出现的事件，记录 获取/推送 两个时间戳随数据帧一起交给API进程，
+# API进程在WebSocket发出后记录送达延迟并检查SLO。
+FRESHNESS_SECONDS = "eastmoneywatch_freshness_seconds"
+FRESHNESS_LAST_SECONDS = "eastmoneywatch_freshness_last_seconds"
+SLO_BREACHES_TOTAL = "eastmoneywatch_freshness_slo_breaches_total"
+metrics.METRIC_HELP.update({
+    FRESHNESS_SECONDS: "异动从交易所时间到 ingest/publish/delivered 各环节的延迟（秒）",
+    FRESHNESS_LAST_SECONDS: "最近一批送达的异动中最大的交易所时间到送达延迟（秒）",
+    SLO_BREACHES_TOTAL: "送达延迟超过 FRESHNESS_SLO_SECONDS 的异动数",
+})
+
+LAG_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+BREACH_LOG_INTERVAL = 60  # SLO告警日志的最小间隔（秒），其间的超限只计数
+
+CHINA_TZ = timezone(timedelta(hours=8))
+
+
+def exchange_epochs(exchange_tm, now=None):
+    """把当天的 HHMMSS 整数换算为 epoch 秒（北京时间），无法解析的为NaN"""
+    tm = np.asarray(exchange_tm, dtype='float64')
+    now = datetime.fromtimestamp(now if now is not None else time.time(), CHINA_TZ)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    return midnight + (tm // 10000) * 3600 + (tm // 100 % 100) * 60 + tm % 100
+
+
+class FreshnessTracker:
+    """
+    worker端：记录每个 (类型, 股票代码) 最近一次的交易所时间，找出每次获取中新出现的事件。
+    接口每次返回最近的一批异动，第一次获取（启动或换日后）只建立基准，不计入延迟，
+    否则重启后当天早先的事件都会被当成新事件。
+    """
+
+    def __init__(self, source="eastmoney"):
+        self.source = source
+        self._seen = {}
+        self._primed = False
+
+    def reset(self):
+        self._seen = {}
+        self._primed = False
+
+    @property
+    def tracked_events(self):
+        return len(self._seen)
+
+    def index_bytes(self):
+        return estimate_bytes(self._seen)
+
+    def observe_fetch(self, df, exchange_tm, ingested):
+        """返回新事件的交易所时间（epoch秒）列表，并记录 交易所时间 -> ingest 的延迟"""
+        if df.empty or exchange_tm is None:
+            return []
+        keys = zip(df['类型'].to_numpy(), df['股票代码'].to_numpy())
+        tms = exchange_tm.reindex(df.index).to_numpy()
+        fresh = []
+        for key, tm in zip(keys, tms):
+            if tm == tm and self._seen.get(key) != tm:
+                self._seen[key] = tm
+                fresh.append(tm)
+        if not self._primed:
+            self._primed = True
+            return []
+        event_times = exchange_epochs(fresh, ingested).tolist() if fresh else []
+        for event_time in event_times:
+            metrics.observe(FRESHNESS_SECONDS, max(ingested - event_time, 0.0), LAG_BUCKETS,
+                            source=self.source, stage="ingest")
+        return event_times
+
+
+def frame_meta(source, event_times, ingested):
+    """随数据帧交给API进程的新鲜度信息；没有新事件时返回None"""
+    if not event_times:
+        return None
+    return {"source": source, "event_times": event_times, "ingested": ingested}
+
+
+def record_publish(meta, published):
+    """worker推送数据帧时调用：记录 交易所时间 -> publish 的延迟"""
+    if not meta:
+        return
+    meta["published"] = published
+    for event_time in meta["event_times"]:
+        metrics.observe(FRESHNESS_SECONDS, max(published - event_time, 0.0), LAG_BUCKETS,
+                        source=meta["source"], stage="publish")
+
+
+_last_breach_log = 0.0
+_unlogged_breaches = 0
+
+
+def record_delivery(meta, delivered):
+    """API进程通过WebSocket发出数据帧后调用：记录送达延迟，超过SLO时计数并按间隔记录告警"""
+    global _last_breach_log, _unlogged_breaches
+    if not meta:
+        return
+    source = meta["source"]
+    lags = [max(delivered - event_time, 0.0) for event_time in meta["event_times"]]
+    for lag in lags:
+        metrics.observe(FRESHNESS_SECONDS, lag, LAG_BUCKETS, source=source, stage="delivered")
+    worst = max(lags)
+    metrics.set_gauge(FRESHNESS_LAST_SECONDS, round(worst, 3), source=source)
+
+    breaches = sum(lag > FRESHNESS_SLO_SECONDS for lag in lags)
+    if not breaches:
+        return
+    metrics.inc(SLO_BREACHES_TOTAL, breaches, source=source)
+    _unlogged_breaches += breaches
+    if delivered - _last_breach_log >= BREACH_LOG_INTERVAL:
+        queued = delivered - meta.get("published", delivered)
+        logging.warning(f"[freshness] {source} 送达延迟超过SLO {FRESHNESS_SLO_SECONDS}s: 本批最大 {worst:.1f}s，"
+                        f"其中获取前 {meta['ingested'] - min(meta['event_times']):.1f}s，推送后排队 {queued:.1f}s；"
+                        f"最近 {_unlogged_breaches} 条超限")
+        _last_breach_log = delivered
+        _unlogged_breaches = 0
@@ -0,0 +1,312 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# 按日期分区的历史异动列式存储：
+#   history/date=20250801/part-0.parquet   按 股票代码、时间 排序，每个行组带 min/max 统计
+#   history/date=20250801/stats.json       分区统计：行数、股票代码和时间的范围、出现的类型和板块
+# 查询时先按日期范围和 stats.json 剪掉不相关的分区，剩余分区交给 pyarrow.dataset 做列裁剪和谓词下推。
+HISTORY_DIRNAME = "history"
+HISTORY_COLUMNS = ['股票代码', '时间', '名称', '相关信息', '类型', '四舍五入取整', '上下午', '板块代码', '板块名称', '标识']
+ROW_GROUP_SIZE = 1024       # 行组越小，按股票过滤时能跳过的数据越多
+DEFAULT_QUERY_LIMIT = 5000
+LIVE_DAY_MAX_ROWS = 200000  # 当天数据在API进程内整天读入后再分批，超过该行数时拒绝导出
+_PARTITION_RE = re.compile(r"^date=(\d{8})$")
+_PART_FILE = "part-0.parquet"
+_STATS_FILE = "stats.json"
+
+
+def get_history_dir(static_dir):
+    return os.path.join(static_dir, HISTORY_DIRNAME)
+
+
+def _partition_dir(history_dir, date_str):
+    return os.path.join(history_dir, f"date={date_str}")
+
+
+def list_partitions(history_dir, start=None, end=None):
+    """日期范围内（含两端）已有的分区日期，升序"""
+    try:
+        entries = os.listdir(history_dir)
+    except OSError:
+        return []
+    dates = sorted(m.group(1) for m in map(_PARTITION_RE.match, entries) if m)
+    return [d for d in dates if (not start or d >= start) and (not end or d <= end)
+            and os.path.exists(os.path.join(history_dir, f"date={d}", _PART_FILE))]
+
+
+def has_partition(history_dir, date_str):
+    return os.path.exists(os.path.join(_partition_dir(history_dir, date_str), _PART_FILE))
+
+
+def read_partition_stats(history_dir, date_str):
+    try:
+        with open(os.path.join(_partition_dir(history_dir, date_str), _STATS_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _schema():
+    """分区文件的schema加上分区列date；显式给出schema，查询时不必逐个读取文件推断"""
+    fields = [(c, pa.int64() if c == '四舍五入取整' else pa.string()) for c in HISTORY_COLUMNS]
+    return pa.schema(fields + [('date', pa.string())])
+
+
+def _normalize(df):
+    frame = df.reindex(columns=HISTORY_COLUMNS)
+    text_columns = [c for c in HISTORY_COLUMNS if c != '四舍五入取整']
+    frame[text_columns] = frame[text_columns].fillna('').astype(str)
+    frame['四舍五入取整'] = pd.to_numeric(frame['四舍五入取整'], errors='coerce').fillna(0).astype('int64')
+    frame = frame.drop_duplicates(subset=['类型', '股票代码'], keep='last')
+    return frame.sort_values(['股票代码', '时间'], kind='stable', ignore_index=True)
+
+
+def _partition_stats(date_str, frame):
+    def value_range(column):
+        values = frame[column]
+        return [values.min(), values.max()] if len(values) else [None, None]
+    return {
+        "date": date_str,
+        "rows": int(len(frame)),
+        "股票代码": value_range('股票代码'),
+        "时间": value_range('时间'),
+        "类型": sorted(frame['类型'].unique().tolist()),
+        "板块代码": sorted(c for c in frame['板块代码'].unique().tolist() if c),
+    }
+
+
+def write_partition(history_dir, date_str, df):
+    """写入（覆盖）一天的分区，先写临时目录再整体替换，返回写入的行数"""
+    frame = _normalize(df)
+    final_dir = _partition_dir(history_dir, date_str)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), os.path.join(tmp_dir, _PART_FILE),
+                   row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+    with open(os.path.join(tmp_dir, _STATS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(_partition_stats(date_str, frame), f, ensure_ascii=False)
+
+    old_dir = final_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(final_dir):
+        os.replace(final_dir, old_dir)
+    os.replace(tmp_dir, final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logging.info(f"[history_store] 已写入 {date_str} 分区，共{len(frame)}条记录")
+    return len(frame)
+
+
+def attach_sectors(df, concept_df):
+    """没有板块信息的记录按概念数据补充第一个所属板块，与实时推送时的补充方式一致"""
+    if concept_df is None or concept_df.empty:
+        return df
+    df = df.copy()
+    for col in ('板块代码', '板块名称'):
+        if col not in df.columns:
+            df[col] = ''
+    missing = df['板块名称'].fillna('').astype(str) == ''
+    if not missing.any():
+        return df
+    first = concept_df.drop_duplicates(subset=['股票代码'], keep='first')
+    first = first.set_index(first['股票代码'].astype(str))
+    codes = df.loc[missing, '股票代码'].astype(str)
+    df.loc[missing, '板块代码'] = codes.map(first['板块代码'].astype(str)).fillna('').to_numpy()
+    df.loc[missing, '板块名称'] = codes.map(first['板块名称'].astype(str)).fillna('').to_numpy()
+    return df
+
+
+def read_day_sources(static_dir, date_str):
+    """
+    一天的全部异动记录：回补得到的 changes_YYYYMMDD.csv，加上当天实时写入的异动日志，
+    同一股票同一类型以实时数据为准。没有任何来源时返回None。
+    """
+    from change_journal import ChangeJournal, get_journal_dir, has_journal
+
+    frames = []
+    csv_path = os.path.join(static_dir, f"changes_{date_str}.csv")
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+        try:
+            frames.append(pd.read_csv(csv_path, dtype={'股票代码': str, '板块代码': str}))
+        except pd.errors.EmptyDataError:
+            pass
+    if has_journal(static_dir, date_str):
+        frames.append(ChangeJournal(get_journal_dir(static_dir), date_str).recover())
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def _source_dates(static_dir):
+    """static目录中有回补文件或异动日志的日期"""
+    from change_journal import get_journal_dir
+
+    pattern = re.compile(r"^changes_(\d{8})\.(csv|parquet|\d+\.log)$")
+    dates = set()
+    for directory in (static_dir, get_journal_dir(static_dir)):
+        try:
+            dates.update(m.group(1) for m in map(pattern.match, os.listdir(directory)) if m)
+        except OSError:
+            continue
+    return sorted(dates)
+
+
+def ingest_days(static_dir, dates=None, before=None, concept_df=None, overwrite=False):
+    """
+    把已结束交易日的数据写入历史分区，返回 日期 -> 行数。
+
+    dates 为空时处理static目录中所有有数据但还没有分区的日期；before 之后（含）的日期仍在更新，不写入；
+    concept_df 用于补充缺失的板块信息。
+    """
+    history_dir = get_history_dir(static_dir)
+    dates = _source_dates(static_dir) if dates is None else dates
+    results = {}
+    for date_str in dates:
+        if before and date_str >= before:
+            continue
+        if not overwrite and has_partition(history_dir, date_str):
+            continue
+        try:
+            df = read_day_sources(static_dir, date_str)
+            if df is None:
+                continue
+            results[date_str] = write_partition(history_dir, date_str, attach_sectors(df, concept_df))
+        except Exception as e:
+            logging.error(f"[history_store] 写入 {date_str} 分区失败: {e}", exc_info=True)
+    return results
+
+
+def _prune(history_dir, dates, stock=None, types=None, sector=None):
+    """按分区统计跳过不可能包含目标记录的分区"""
+    kept = []
+    for date_str in dates:
+        stats = read_partition_stats(history_dir, date_str)
+        if stats is None:
+            kept.append(date_str)
+            continue
+        low, high = stats.get("股票代码") or [None, None]
+        if stock and (low is None or not (low <= stock <= high)):
+            continue
+        if types and not set(types) & set(stats.get("类型", [])):
+            continue
+        if sector and sector.startswith("BK") and sector not in stats.get("板块代码", [sector]):
+            continue
+        kept.append(date_str)
+    return kept
+
+
+def _filter_expression(stock=None, types=None, sector=None):
+    conditions = []
+    if stock:
+        conditions.append(pc.field('股票代码') == stock)
+    if types:
+        conditions.append(pc.field('类型').isin(list(types)))
+    if sector:
+        conditions.append((pc.field('板块代码') == sector) | (pc.field('板块名称') == sector))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _open_dataset(history_dir, dates):
+    return ds.dataset(
+        [os.path.join(_partition_dir(history_dir, d), _PART_FILE) for d in dates],
+        schema=_schema(),
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive'),
+        partition_base_dir=history_dir,
+    )
+
+
+def select_columns(columns=None):
+    """请求的列中有效的部分，HISTORY_COLUMNS 之外的列名被忽略；日期列 date 总在最前"""
+    return ['date'] + [c for c in (columns or HISTORY_COLUMNS) if c in HISTORY_COLUMNS]
+
+
+def output_schema(columns=None):
+    """导出数据的schema：分区列date加上选中的列"""
+    schema = _schema()
+    return pa.schema([schema.field(name) for name in select_columns(columns)])
+
+
+def scan_batches(history_dir, start=None, end=None, stock=None, sector=None, types=None, columns=None,
+                 batch_size=ROW_GROUP_SIZE):
+    """
+    按日期顺序逐批读取历史分区，返回RecordBatch迭代器。
+
+    每次只解码一个批次，内存占用与导出的总行数无关，供导出接口流式输出。
+    """
+    dates = _prune(history_dir, list_partitions(history_dir, start, end), stock, types, sector)
+    expression = _filter_expression(stock, types, sector)
+    names = select_columns(columns)
+    for date_str in dates:
+        scanner = _open_dataset(history_dir, [date_str]).scanner(
+            columns=names, filter=expression, batch_size=batch_size, use_threads=False
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield batch
+
+
+def live_day_batches(static_dir, date_str, concept_df=None, columns=None, batch_size=ROW_GROUP_SIZE,
+                     max_rows=LIVE_DAY_MAX_ROWS):
+    """
+    尚未写入历史分区的当天数据（回补文件加异动日志），按与历史分区相同的schema分批返回。
+
+    同一股票同一类型要在回补文件和异动日志之间去重，当天数据只能整天读入；读取在调用时立即完成，
+    超过 max_rows 行时抛出 ValueError，返回的迭代器每次只把一个批次转换为Arrow。
+    """
+    df = read_day_sources(static_dir, date_str)
+    if df is None:
+        return iter(())
+    if max_rows and len(df) > max_rows:
+        raise ValueError(f"{date_str} 当天数据有{len(df)}条，超过导出上限{max_rows}条，请在写入历史分区后再导出")
+    frame = _normalize(attach_sectors(df, concept_df))
+    frame.insert(0, 'date', date_str)
+    schema = output_schema(columns)
+    frame = frame[schema.names]
+    return (pa.RecordBatch.from_pandas(frame.iloc[i:i + batch_size], schema=schema, preserve_index=False)
+            for i in range(0, len(frame), batch_size))
+
+
+def query_history(history_dir, start=None, end=None, stock=None, sector=None, types=None, columns=None,
+                  limit=DEFAULT_QUERY_LIMIT):
+    """
+    查询历史异动，返回 (DataFrame, 统计信息)。
+
+    sector 可以是板块代码或板块名称；types 为类型列表；columns 为需要返回的列，日期列 date 总是返回。
+    结果按日期、时间排序，最多 limit 条。
+    """
+    started = time.perf_counter()
+    dates = list_partitions(history_dir, start, end)
+    candidates = _prune(history_dir, dates, stock, types, sector)
+    info = {"partitions": len(dates), "scanned": len(candidates)}
+    names = select_columns(columns)
+    if not candidates:
+        info["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return pd.DataFrame(columns=names), info
+
+    table = _open_dataset(history_dir, candidates).to_table(
+        columns=names, filter=_filter_expression(stock, types, sector)
+    )
+    df = table.to_pandas()
+    if '时间' in df.columns:
+        df = df.sort_values(['date', '时间'], kind='stable', ignore_index=True)
+    info["matched"] = len(df)
+    if limit and len(df) > limit:
+        df = df.iloc[:limit]
+    info["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return df, info
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+
+
+# 日志级别配置："INFO" 或 "INFO,worker_queue=DEBUG,fluctuation=WARNING"，
+# 第一项（不带模块名）是根级别，其余按 logger 名称（模块的 __name__）单独设置。
+LOG_LEVEL_ENV = "EASTMONEYWATCH_LOG_LEVEL"
+DEFAULT_LOG_LEVEL = "INFO"
+
+# 热循环中的日志按调用位置限速：每个位置平均每秒 RATE_LIMIT 条，最多突发 RATE_BURST 条，
+# 被丢弃的条数附在该位置下一条输出的日志后面；WARNING 及以上的记录不限速。
+RATE_LIMIT = 1.0
+RATE_BURST = 20
+
+# 采样：logger.debug(..., extra={SAMPLE_EVERY: 30}) 表示该调用位置每30条只输出1条
+SAMPLE_EVERY = "log_every"
+
+# 记录上保存的过滤结果：多个handler共用同一组过滤器、子进程已过滤过的记录在主进程中沿用该结果，不重复计数
+_FILTERED = "_emw_filtered"
+_configured_loggers = set()
+
+
+def _to_level(value):
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"无效的日志级别: {value}")
+    return level
+
+
+def parse_levels(spec):
+    """把字符串、整数或字典形式的配置统一为 {logger名称: 级别}，根logger的名称为空字符串（字典中也可以写作 root）"""
+    if spec is None:
+        spec = DEFAULT_LOG_LEVEL
+    if isinstance(spec, int):
+        return {"": spec}
+    if isinstance(spec, dict):
+        return {("" if name in (None, "root") else name): _to_level(level) for name, level in spec.items()}
+    levels = {}
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        levels[name.strip()] = _to_level(level)
+    return levels
+
+
+def levels_from_env():
+    return parse_levels(os.environ.get(LOG_LEVEL_ENV, DEFAULT_LOG_LEVEL))
+
+
+def apply_levels(spec):
+    """
+    在当前进程中设置日志级别；没有给出根级别时使用 DEFAULT_LOG_LEVEL，
+    之前单独设置过、这次没有出现的模块恢复为跟随根级别。
+    低于生效级别的日志在调用处直接返回，不创建记录也不格式化消息。
+    """
+    levels = parse_levels(spec)
+    root_level = levels.get("", _to_level(DEFAULT_LOG_LEVEL))
+    logging.getLogger().setLevel(root_level)
+    for name in _configured_loggers - set(levels):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _configured_loggers.clear()
+    for name, level in levels.items():
+        if name:
+            logging.getLogger(name).setLevel(level)
+            _configured_loggers.add(name)
+    return levels
+
+
+def current_levels():
+    """当前进程的配置，级别以名称表示，根级别的键为 root"""
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name in sorted(_configured_loggers):
+        levels[name] = logging.getLevelName(logging.getLogger(name).level)
+    return levels
+
+
+class RateLimitFilter(logging.Filter):
+    """按调用位置（logger、文件、行号）的令牌桶限速，超出的记录丢弃并计数；WARNING 及以上的记录总是保留"""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # 调用位置 -> [令牌数, 上次更新时间, 已丢弃条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        decided = getattr(record, _FILTERED, None)
+        if decided is not None:
+            return decided
+        if record.levelno >= logging.WARNING:
+            setattr(record, _FILTERED, True)
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                setattr(record, _FILTERED, False)
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.msg}（此前 {dropped} 条相同位置的日志因限速被丢弃）"
+        setattr(record, _FILTERED, True)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """带 extra={SAMPLE_EVERY: n} 的记录，每个调用位置每n条只保留1条"""
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        decided = getattr(record, _FILTERED, None)
+        if decided is not None:
+            return decided
+        every = getattr(record, SAMPLE_EVERY, None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % every:
+            # 保留的记录由之后的限速过滤器记下结果
+            setattr(record, _FILTERED, False)
+            return False
+        return True
+
+
+def install_filters(*handlers):
+    """给handler加上采样和限速，多个handler共用同一组过滤器，返回第一个handler；采样在限速之前，被采样丢弃的记录不消耗令牌"""
+    filters = (SampleFilter(), RateLimitFilter())
+    for handler in handlers:
+        for log_filter in filters:
+            handler.addFilter(log_filter)
+    return handlers[0]
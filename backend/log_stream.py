@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+import itertools
+from collections import deque
+from datetime import datetime
+
+
+# /ws/logs 的数据源：主进程根logger上的一个handler，子进程的日志经 QueueListener 也会到这里。
+# 最近的记录保存在有界环形缓冲区中，新连接先收到历史，之后的记录通过各连接的asyncio队列分发。
+LOG_BUFFER_SIZE = 2000
+SUBSCRIBER_QUEUE_SIZE = 1000  # 单个连接积压超过该条数时丢弃新记录，不阻塞写日志的线程
+
+
+class LogSubscription:
+    """一个 /ws/logs 连接：按最低级别和模块名前缀过滤，记录由 LogRingHandler 投递到 queue"""
+
+    def __init__(self, loop, level=logging.DEBUG, modules=()):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.level = level
+        self.modules = tuple(m for m in modules if m)
+        self.dropped = 0
+
+    def matches(self, entry):
+        if entry["levelno"] < self.level:
+            return False
+        if not self.modules:
+            return True
+        name = entry["logger"]
+        return any(name == m or name.startswith(m + ".") for m in self.modules)
+
+    def _offer(self, entry):
+        # 在事件循环线程中执行
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class LogRingHandler(logging.Handler):
+    """保存最近 capacity 条日志并分发给订阅者；emit 可能来自任意线程"""
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE):
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            if record.exc_text:
+                message = f"{message}\n{record.exc_text}"
+            entry = {
+                "seq": 0,
+                "time": datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "level": record.levelname,
+                "levelno": record.levelno,
+                "logger": record.name,
+                "process": record.processName,
+                "message": message,
+            }
+            with self._lock:
+                entry["seq"] = next(self._seq)
+                self.buffer.append(entry)
+                subscribers = [s for s in self._subscribers if s.matches(entry)]
+            for subscription in subscribers:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._offer, entry)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    self.unsubscribe(subscription)
+        except Exception:
+            self.handleError(record)
+
+    def subscribe(self, subscription, history=200):
+        """注册订阅并返回符合过滤条件的最近 history 条记录；两者在同一把锁内完成，历史和实时记录之间不会遗漏"""
+        with self._lock:
+            self._subscribers.add(subscription)
+            recent = [entry for entry in self.buffer if subscription.matches(entry)]
+        return recent[-history:] if history > 0 else []
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+log_ring_handler = LogRingHandler()
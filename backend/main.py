@@ -1,6 +1,5 @@
 import os
 import sys
-import asyncio
 import threading
 import logging
 import logging.handlers
@@ -9,17 +8,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from uvicorn import Config, Server
-from collections import deque
-from datetime import datetime
 from multiprocessing import Queue
 
 from config import setup_logging
-from services.backend_service import initialize_backend_services
+from log_control import levels_from_env
+from services.backend_service import initialize_backend_services, shutdown_backend_services
 from routes.api import router as api_router
 from routes.websocket import router as websocket_router, set_buffer_queue
 
-# 1. 设置日志
-LOG_LEVEL = logging.DEBUG
+# 1. 设置日志：默认INFO，可用环境变量 EASTMONEYWATCH_LOG_LEVEL 按模块配置，运行时通过 /api/logging/levels 调整
+LOG_LEVEL = levels_from_env()
 log_queue, queue_listener = setup_logging(LOG_LEVEL)
 
 # 2. 创建用于在后端和websockets之间传输数据的缓冲区队列
@@ -27,8 +25,6 @@ buffer_queue = Queue(maxsize=200)
 
 # Global variables
 server_instance = None
-log_messages = deque(maxlen=1000)
-active_websockets = set()
 watch_process = None
 
 
@@ -80,6 +76,10 @@ async def startup_event():
 async def shutdown_event():
     """FastAPI 关机时的事件处理"""
     logging.debug("[sidecar] FastAPI 应用正在关闭...")
+    try:
+        shutdown_backend_services()
+    except Exception as e:
+        logging.error(f"[sidecar] 停止后台服务失败: {e}", exc_info=True)
     if queue_listener:
         queue_listener.stop()
         logging.debug("[sidecar] 日志队列监听器已停止。")
@@ -101,34 +101,12 @@ app.add_middleware(
 )
 
 
-async def broadcast_message(message: str):
-    """向所有连接的WebSocket客户端广播消息"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_message = f"[{timestamp}] {message}"
-    log_messages.append(formatted_message)
-
-    disconnected = set()
-    for websocket in active_websockets:
-        try:
-            await websocket.send_text(formatted_message)
-        except Exception:
-            disconnected.add(websocket)
-    active_websockets.difference_update(disconnected)
-
-
-def output_reader(pipe, name):
-    """从管道读取输出并打印 (现在由QueueListener处理，此函数可能不再需要)"""
-    for line in pipe:
-        message = f"[{name}] {line.strip()}"
-        logging.debug(message)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(broadcast_message(message))
-        loop.close()
-
-
 def kill_process():
     global server_instance
+    try:
+        shutdown_backend_services()
+    except Exception as e:
+        logging.error(f"[sidecar] 停止后台服务失败: {e}", exc_info=True)
     if server_instance is not None:
         server_instance.should_exit = True
     os._exit(0)
@@ -140,7 +118,7 @@ def start_api_server(**kwargs):
     try:
         if server_instance is None:
             logging.debug(f"[sidecar] 正在启动API服务器...")
-            config = Config(app, host="0.0.0.0", log_level="debug")
+            config = Config(app, host="0.0.0.0", log_level=logging.getLevelName(LOG_LEVEL.get("", logging.INFO)).lower())
             server_instance = Server(config)
             logging.debug(f"[sidecar] 服务器配置完成，开始运行")
             server_instance.run()
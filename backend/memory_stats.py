@@ -0,0 +1,174 @@
+import os
+import sys
+import logging
+import itertools
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+import metrics
+
+
+# 内存统计：worker每 MEMORY_INTERVAL 秒估算一次各组件（当天事件、涨停缓存、日志签名索引等）的占用，
+# 写入指标后随指标快照发布给API进程，/api/memory 和 /api/metrics 汇总两个进程的结果。
+# DataFrame 按 memory_usage(deep=True) 估算，多行共用的字符串对象会被重复计算，结果是上界。
+MEMORY_BYTES = "eastmoneywatch_memory_bytes"
+MEMORY_ROWS = "eastmoneywatch_memory_rows"
+PROCESS_MEMORY_BYTES = "eastmoneywatch_process_memory_bytes"
+TICK_PEAK_BYTES = "eastmoneywatch_tick_peak_bytes"
+EVICTED_ROWS_TOTAL = "eastmoneywatch_evicted_rows_total"
+metrics.METRIC_HELP.update({
+    MEMORY_BYTES: "各组件估算的内存占用（字节）",
+    MEMORY_ROWS: "各组件保存的行数/条目数",
+    PROCESS_MEMORY_BYTES: "进程常驻内存 rss 和历史峰值 peak_rss（字节）",
+    TICK_PEAK_BYTES: "统计间隔内单个tick的最大临时分配（字节），需设置 EASTMONEYWATCH_TRACE_MEMORY=1",
+    EVICTED_ROWS_TOTAL: "按保留策略从内存中淘汰的当天事件数",
+})
+
+MEMORY_INTERVAL = 30  # worker统计内存的间隔（秒）
+SAMPLE_ITEMS = 200    # 估算容器大小时抽样的元素数，其余按平均值外推
+TRACE_MEMORY_ENV = "EASTMONEYWATCH_TRACE_MEMORY"  # tracemalloc 会拖慢分配，默认关闭
+
+
+def frame_bytes(df):
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def estimate_bytes(obj, depth=3):
+    """
+    估算对象及其引用的对象占用的字节数：DataFrame/Series 用 memory_usage，
+    容器抽样 SAMPLE_ITEMS 个元素按平均值外推，普通对象展开 __dict__，最多展开 depth 层。
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        return frame_bytes(obj)
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    size = sys.getsizeof(obj)
+    if depth <= 0 or isinstance(obj, (str, bytes, int, float, bool)):
+        return size
+    if isinstance(obj, dict):
+        items = obj.items()
+        sample = [estimate_bytes(k, depth - 1) + estimate_bytes(v, depth - 1)
+                  for k, v in itertools.islice(items, SAMPLE_ITEMS)]
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = obj
+        sample = [estimate_bytes(v, depth - 1) for v in itertools.islice(items, SAMPLE_ITEMS)]
+    elif hasattr(obj, "__dict__"):
+        return size + estimate_bytes(vars(obj), depth)
+    else:
+        return size
+    if not sample:
+        return size
+    return size + int(sum(sample) / len(sample) * len(items))
+
+
+def _windows_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(Counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return {}
+    return {"rss": counters.WorkingSetSize, "peak_rss": counters.PeakWorkingSetSize}
+
+
+def process_memory():
+    """当前进程的常驻内存和历史峰值（字节），平台不支持的项不出现在结果中"""
+    if sys.platform == "win32":
+        try:
+            return _windows_memory()
+        except Exception:
+            return {}
+    result = {}
+    try:
+        with open("/proc/self/statm") as f:
+            result["rss"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上单位是KB，macOS 上是字节
+        result["peak_rss"] = peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        pass
+    return result
+
+
+def trace_enabled():
+    return os.environ.get(TRACE_MEMORY_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class TickPeakTracer:
+    """用 tracemalloc 记录每个tick的临时分配峰值（相对tick开始时），只保留统计间隔内的最大值"""
+
+    def __init__(self, enabled=None):
+        self.enabled = trace_enabled() if enabled is None else enabled
+        self.max_peak = 0
+        self._base = 0
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            logging.info("[memory] 已启用 tracemalloc，记录每个tick的分配峰值")
+
+    def begin(self):
+        if self.enabled:
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+
+    def end(self):
+        if self.enabled:
+            peak = tracemalloc.get_traced_memory()[1] - self._base
+            self.max_peak = max(self.max_peak, peak)
+
+    def take(self):
+        """返回统计间隔内的最大峰值并清零；未启用时返回None"""
+        if not self.enabled:
+            return None
+        peak, self.max_peak = self.max_peak, 0
+        return peak
+
+
+def record_usage(components, rows=None, tick_peak=None):
+    """把各组件的字节数、行数和进程内存写入指标，返回本次的统计结果"""
+    for component, size in components.items():
+        metrics.set_gauge(MEMORY_BYTES, int(size), component=component)
+    for component, count in (rows or {}).items():
+        metrics.set_gauge(MEMORY_ROWS, int(count), component=component)
+    process = process_memory()
+    for kind, size in process.items():
+        metrics.set_gauge(PROCESS_MEMORY_BYTES, int(size), kind=kind)
+    if tick_peak is not None:
+        metrics.set_gauge(TICK_PEAK_BYTES, int(tick_peak))
+    return {"components": dict(components), "rows": dict(rows or {}), "process": process, "tick_peak": tick_peak}
+
+
+def usage_from_snapshot(snap):
+    """从指标快照中取出 record_usage 写入的内容，用于汇总其他进程的内存统计"""
+    usage = {"components": {}, "rows": {}, "process": {}, "tick_peak": None, "evicted_rows": 0}
+    for name, labels, value in (snap or {}).get("gauges", []):
+        if name == MEMORY_BYTES:
+            usage["components"][labels.get("component")] = value
+        elif name == MEMORY_ROWS:
+            usage["rows"][labels.get("component")] = value
+        elif name == PROCESS_MEMORY_BYTES:
+            usage["process"][labels.get("kind")] = value
+        elif name == TICK_PEAK_BYTES:
+            usage["tick_peak"] = value
+    for name, labels, value in (snap or {}).get("counters", []):
+        if name == EVICTED_ROWS_TOTAL:
+            usage["evicted_rows"] += value
+    return usage
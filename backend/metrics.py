@@ -0,0 +1,163 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+# 指标名称。耗时直方图按 stage（fetch/parse/store/journal/enrich/serialize/ipc/encode/send）和 source 分标签，
+# 计数器记录各阶段处理的行数、字节数和错误数。
+STAGE_SECONDS = "eastmoneywatch_stage_seconds"
+ROWS_TOTAL = "eastmoneywatch_rows_total"
+BYTES_TOTAL = "eastmoneywatch_bytes_total"
+ERRORS_TOTAL = "eastmoneywatch_errors_total"
+
+METRIC_HELP = {
+    STAGE_SECONDS: "各处理阶段的耗时（秒）",
+    ROWS_TOTAL: "各处理阶段处理的行数",
+    BYTES_TOTAL: "各处理阶段收发的字节数",
+    ERRORS_TOTAL: "各处理阶段发生的错误数",
+}
+
+# 0.5ms ~ 10s，覆盖从单次编码到一次完整网络请求的耗时
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定分桶的直方图，observe 只做一次二分查找和两次加法"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    进程内的指标登记表。每个进程各有一份：worker进程定期把 snapshot() 发布到共享内存，
+    API进程读取后与自己的指标一起按 Prometheus 文本格式输出。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    @contextmanager
+    def stage(self, stage, **labels):
+        """记录一个处理阶段的耗时；阶段内抛出异常时计入错误数后继续抛出"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(ERRORS_TOTAL, stage=stage, **labels)
+            raise
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+    def snapshot(self):
+        """可JSON序列化的当前值，用于跨进程发布"""
+        with self._lock:
+            return {
+                "histograms": [[name, dict(labels), list(h.buckets), list(h.counts), h.sum, h.count]
+                               for (name, labels), h in self._histograms.items()],
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+REGISTRY = MetricsRegistry()
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+stage = REGISTRY.stage
+snapshot = REGISTRY.snapshot
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots):
+    """
+    把多个进程的快照渲染为 Prometheus 文本格式（0.0.4）。
+    snapshots: [(snapshot, {"process": "worker"}), ...]，附加的标签用于区分来源进程。
+    """
+    series = {}  # name -> (type, [lines])
+
+    def add(name, kind, line):
+        series.setdefault(name, (kind, []))[1].append(line)
+
+    for snap, extra in snapshots:
+        if not snap:
+            continue
+        for name, labels, buckets, counts, total, count in snap.get("histograms", []):
+            labels = {**labels, **extra}
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + [float("inf")], counts):
+                cumulative += bucket_count
+                add(name, "histogram",
+                    f"{name}_bucket{_format_labels({**labels, 'le': _format_value(float(bound))})} {cumulative}")
+            add(name, "histogram", f"{name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+            add(name, "histogram", f"{name}_count{_format_labels(labels)} {count}")
+        for name, labels, value in snap.get("counters", []):
+            add(name, "counter", f"{name}{_format_labels({**labels, **extra})} {_format_value(value)}")
+        for name, labels, value in snap.get("gauges", []):
+            add(name, "gauge", f"{name}{_format_labels({**labels, **extra})} {_format_value(value)}")
+
+    lines = []
+    for name in sorted(series):
+        kind, body = series[name]
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(body)
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -5,4 +6,19 @@ class StockData(BaseModel):
     股票代码: str = Field(..., description="股票代码")
     股票名称: str = Field("", description="股票名称")  # 设为可选，默认为空字符串
     板块代码: str = Field(..., description="板块代码")
-    板块名称: str = Field(..., description="板块名称")
\ No newline at end of file
+    板块名称: str = Field(..., description="板块名称")
+
+
+class PickedBatch(BaseModel):
+    stocks: List[StockData] = Field(default_factory=list, description="股票列表")
+    板块代码: Optional[str] = Field(None, description="板块代码，提供时加入该板块的全部成分股")
+
+
+class PickedDeleteBatch(BaseModel):
+    股票代码: List[str] = Field(default_factory=list, description="待删除的股票代码列表")
+    板块代码: Optional[str] = Field(None, description="按板块代码删除")
+    板块名称: Optional[str] = Field(None, description="按板块名称删除")
+
+
+class LogLevels(BaseModel):
+    levels: Dict[str, str] = Field(default_factory=dict, description="模块名 -> 日志级别，root 表示根级别")
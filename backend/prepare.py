@@ -2,104 +2,233 @@ import akshare as ak
 import pandas as pd
 import os
 import logging
-from utils import setup_static_directory, uplimit10jqka
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import setup_static_directory, uplimit10jqka, get_latest_trade_date, TokenBucket
 from config import type_mapping
-import time
+from security_master import get_security_master
 
 
-# 获取数据
-def prepareChanges(current_date:str):
-    static_dir = setup_static_directory()
-    all_df = []
-    for code, type_value in type_mapping.items():
-        logging.debug(f'[prepare] 正在请求类型: {type_value} (symbol={type_value})')
+BACKFILL_CACHE_DIRNAME = "backfill_cache"
+DEFAULT_RATE = 1.0          # 每秒请求异动接口的平均次数
+MARKET_CLOSE = "1500"       # 收盘后获取的当天数据才视为完整，可以作为缓存直接复用
+
+
+def get_backfill_cache_dir(static_dir, date_str):
+    return os.path.join(static_dir, BACKFILL_CACHE_DIRNAME, date_str)
+
+
+def _cache_path(cache_dir, name, complete=True):
+    """完整数据缓存为 name.csv；盘中获取的数据缓存为 name.partial.csv，只在接口失败时作为兜底"""
+    return os.path.join(cache_dir, f"{name}.csv" if complete else f"{name}.partial.csv")
+
+
+def _read_cache(cache_dir, name, allow_partial=False):
+    for complete in ((True, False) if allow_partial else (True,)):
+        path = _cache_path(cache_dir, name, complete)
+        if os.path.exists(path):
+            return pd.read_csv(path, dtype={'代码': str, 'code': str})
+    return None
+
+
+def _write_cache(cache_dir, name, df, complete):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, name, complete)
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    if complete:
+        partial = _cache_path(cache_dir, name, complete=False)
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _is_complete(date_str):
+    """akshare只返回最新交易日的异动数据，当天收盘后或更早的日期才是完整数据"""
+    now = datetime.now()
+    return date_str < now.strftime("%Y%m%d") or now.strftime("%H%M") >= MARKET_CLOSE
+
+
+def _fetch_type(bucket, type_value, date_str, cache_dir, can_fetch):
+    """获取单个类型的异动数据，优先使用 (日期, 类型) 缓存"""
+    cached = _read_cache(cache_dir, type_value)
+    if cached is not None:
+        logging.debug(f'[prepare] {date_str} {type_value} 使用缓存，共{len(cached)}条')
+        return cached
+    if not can_fetch:
+        logging.debug(f'[prepare] {date_str} {type_value} 没有缓存，接口只提供最新交易日数据，跳过')
+        return _read_cache(cache_dir, type_value, allow_partial=True)
+
+    bucket.acquire()
+    logging.debug(f'[prepare] 正在请求类型: {type_value} (symbol={type_value})')
+    try:
         df = ak.stock_changes_em(symbol=type_value)
-        if df is None or df.empty:
-            logging.warning(f'[prepare] 获取类型 {type_value} 数据为空，跳过处理')
-            continue
-        logging.debug(df.columns)
-        df['类型'] = type_value  # 使用type_value而不是df['板块']
-        df = df.drop(['板块'], axis=1)  # 添加axis=1参数
-        df = df[~df['名称'].str.contains('ST')]
-        all_df.append(df)
-        logging.debug('[prepare] 等待5秒...')
-        time.sleep(5)
+    except Exception as e:
+        logging.warning(f'[prepare] 请求类型 {type_value} 失败: {e}')
+        return _read_cache(cache_dir, type_value, allow_partial=True)
+    if df is None:
+        return None
+    df = df.copy()
+    df['代码'] = df['代码'].astype(str)
+    _write_cache(cache_dir, type_value, df, _is_complete(date_str))
+    return df
+
+
+def _fetch_uplimit(date_str, cache_dir):
+    """同花顺涨停池接口支持历史日期，同样按日期缓存"""
+    cached = _read_cache(cache_dir, "uplimit")
+    if cached is not None:
+        return cached
+    try:
+        uplimit_df = uplimit10jqka(date_str)
+    except Exception as e:
+        logging.warning(f'[prepare] 获取 {date_str} 涨停数据失败: {e}')
+        return _read_cache(cache_dir, "uplimit", allow_partial=True)
+    if not uplimit_df.empty:
+        uplimit_df = uplimit_df[['code', 'high_days']].astype({'code': str})
+        _write_cache(cache_dir, "uplimit", uplimit_df, _is_complete(date_str))
+    return uplimit_df
+
+
+def fetch_changes(date_str, static_dir, rate=DEFAULT_RATE, can_fetch=True, bucket=None):
+    """在限速下并发获取全部类型的异动数据并合并，返回原始DataFrame（含'类型'列）；bucket 为多个日期共用的限速器"""
+    cache_dir = get_backfill_cache_dir(static_dir, date_str)
+    bucket = bucket or TokenBucket(rate, capacity=1)
+    all_df = []
+    with ThreadPoolExecutor(max_workers=len(type_mapping), thread_name_prefix="prepare") as pool:
+        futures = {
+            pool.submit(_fetch_type, bucket, type_value, date_str, cache_dir, can_fetch): type_value
+            for type_value in type_mapping.values()
+        }
+        for future in as_completed(futures):
+            type_value = futures[future]
+            df = future.result()
+            if df is None or df.empty:
+                logging.warning(f'[prepare] 获取类型 {type_value} 数据为空，跳过处理')
+                continue
+            df = df.drop(columns=['板块'], errors='ignore')
+            df['类型'] = type_value  # 使用type_value而不是df['板块']
+            all_df.append(df)
     if not all_df:
-        logging.warning('[prepare] 所有类型数据均为空，生成空的输出文件')
-        output_df = pd.DataFrame()
-        save_path = os.path.join(static_dir, f"changes_{current_date}.csv")
-        output_df.to_csv(save_path, index=False, encoding='utf-8-sig')
-        logging.debug(f'[prepare] 已保存空文件到: {save_path}')
-        return
+        return pd.DataFrame()
+    df = pd.concat(all_df, ignore_index=True)
+    return df[~df['名称'].astype(str).str.contains('ST')]
+
 
+def build_changes_frame(df, uplimit_df):
+    """将合并后的原始异动数据转换为 changes_YYYYMMDD.csv 的格式"""
     # 确保时间列是字符串类型
+    df = df.copy()
     df['时间'] = df['时间'].astype(str)
-    logging.debug(f'[prepare] 转换后时间列数据类型: {df["时间"].dtype}')
 
     # 拆分相关信息
-    info_df = df['相关信息'].str.split(',', expand=True)
+    info_df = df['相关信息'].astype(str).str.split(',', expand=True)
     if info_df.shape[1] >= 3:
         df['涨跌幅'] = pd.to_numeric(info_df[0], errors='coerce')
-    
-    # 只对特定类型的涨停板使用固定涨跌幅，其他情况保留解析出的数据
-    def calculate_change_rate(row):
-        if row['类型'] == '封涨停板':
-            if row['代码'].startswith('8'):
-                return 0.3
-            elif row['代码'].startswith('300') or row['代码'].startswith('688'):
-                return 0.2
-            else:
-                return 0.1
-        else:
-            # 对于非涨停板，使用解析出的涨跌幅数据
-            return row['涨跌幅'] if pd.notnull(row['涨跌幅']) else 0.0
-    
-    df['涨跌幅'] = df.apply(calculate_change_rate, axis=1)
+    if '涨跌幅' not in df.columns:
+        df['涨跌幅'] = 0.0
+
+    # 只对封涨停板使用证券主表中的涨停幅度，其他情况保留解析出的数据
+    df['涨跌幅'] = df['涨跌幅'].fillna(0.0)
+    is_limit_up = df['类型'] == '封涨停板'
+    if is_limit_up.any():
+        df.loc[is_limit_up, '涨跌幅'] = get_security_master().limit_ratios(df.loc[is_limit_up, '代码'])
     df = df[(df['涨跌幅'] < 0.31) & ((df['涨跌幅'] >= 0.05) | (df['涨跌幅'] <= -0.05))]
-   
+
     # 构造输出DataFrame
     output_df = pd.DataFrame()
     output_df['股票代码'] = df['代码']  # 添加股票代码列
     output_df['时间'] = df['时间'].str[:5]  # 只保留HH:MM
     output_df['名称'] = df['名称']
-    output_df['相关信息'] = df['涨跌幅'].apply(lambda x: f"%+.2f" % (x * 100) + "%" if pd.notnull(x) else 'NaN')
-
+    output_df['相关信息'] = (df['涨跌幅'] * 100).map("{:+.2f}%".format)
     output_df['类型'] = df['类型']
     logging.debug(f'[prepare] 类型分布: {output_df["类型"].value_counts().to_dict()}')
 
-    output_df['四舍五入取整'] = df['涨跌幅'].apply(lambda x: int(round(x * 100)) if pd.notnull(x) else None)
-
-    def am_pm_col(tm):
-        try:
-            hour = int(tm[:2])
-            return '上午' if hour < 12 else '下午'
-        except:
-            return '未知'
-    output_df['上下午'] = output_df['时间'].apply(am_pm_col)
-    output_df['时间排序'] = output_df['时间'].apply(lambda tm: int(tm[:2])*60 + int(tm[3:5]) if isinstance(tm, str) and len(tm) == 5 else 0)
+    output_df['四舍五入取整'] = (df['涨跌幅'] * 100).round().astype(int)
+    hour = pd.to_numeric(output_df['时间'].str[:2], errors='coerce')
+    minute = pd.to_numeric(output_df['时间'].str[3:5], errors='coerce')
+    output_df['上下午'] = hour.map(lambda h: '未知' if pd.isna(h) else ('上午' if h < 12 else '下午'))
+    output_df['时间排序'] = (hour * 60 + minute).fillna(0).astype(int)
 
     # 去重，按名称+类型、名称+时间
     output_df = output_df.drop_duplicates(subset=['股票代码', '类型'], keep='last')
     output_df = output_df.drop_duplicates(subset=['股票代码', '时间'], keep='last')
-    # 按时间排序
-    # 保存到CSV，使用与queue一致的路径和命名规则
-    uplimit_df = uplimit10jqka(current_date)
-
-    # 创建股票代码到high_days的映射
-    code_to_high_days_map = dict(zip(uplimit_df['code'].astype(str), uplimit_df['high_days']))
-
-    # 为output_df添加high_days列
-    output_df['标识'] = output_df['股票代码'].map(code_to_high_days_map)
-
-    # 处理未找到high_days的股票，填充空值
-    missing_high_days_count = output_df['标识'].isna().sum()
-    if missing_high_days_count > 0:
-        logging.debug(f'[prepare] 有{missing_high_days_count}只股票未找到对应high_days，填充空值')
-        output_df['标识'] = output_df['标识'].fillna('').infer_objects(copy=False)
- 
+
+    # 为output_df添加high_days列，未找到的填充空值
+    if uplimit_df is not None and not uplimit_df.empty:
+        code_to_high_days_map = dict(zip(uplimit_df['code'].astype(str), uplimit_df['high_days']))
+        output_df['标识'] = output_df['股票代码'].map(code_to_high_days_map).fillna('')
+    else:
+        output_df['标识'] = ''
+    return output_df
+
+
+# 获取数据
+def prepareChanges(current_date: str, rate=DEFAULT_RATE, latest_trade_date=None, bucket=None):
+    """回补一个交易日的异动数据，保存为 changes_YYYYMMDD.csv，返回记录数"""
+    static_dir = setup_static_directory()
     save_path = os.path.join(static_dir, f"changes_{current_date}.csv")
-    output_df.to_csv(save_path, index=False, encoding='utf-8-sig')
+    can_fetch = current_date == (latest_trade_date or get_latest_trade_date())
+    df = fetch_changes(current_date, static_dir, rate, can_fetch, bucket)
+    if df.empty:
+        if not can_fetch or os.path.exists(save_path):
+            logging.warning(f'[prepare] {current_date} 没有可用数据，不生成或覆盖 {save_path}')
+            return 0
+        logging.warning(f'[prepare] {current_date} 所有类型数据均为空，生成空的输出文件')
+        pd.DataFrame().to_csv(save_path, index=False, encoding='utf-8-sig')
+        return 0
+
+    uplimit_df = _fetch_uplimit(current_date, get_backfill_cache_dir(static_dir, current_date))
+    output_df = build_changes_frame(df, uplimit_df)
+
+    tmp_path = save_path + ".tmp"
+    output_df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, save_path)
     logging.debug(f'[prepare] 已保存到: {save_path}, 共{len(output_df)}条记录')
+    return len(output_df)
+
+
+def backfill_dates(start_date: str, end_date: str):
+    """日期区间内的工作日列表（YYYYMMDD）"""
+    return [d.strftime("%Y%m%d") for d in pd.bdate_range(start_date, end_date)]
+
+
+def _prepare_one(date_str, rate, latest_trade_date, bucket=None):
+    try:
+        return date_str, prepareChanges(date_str, rate, latest_trade_date, bucket), None
+    except Exception as e:
+        logging.error(f'[prepare] 回补 {date_str} 失败: {e}', exc_info=True)
+        return date_str, 0, str(e)
+
+
+def backfillChanges(dates, max_workers=2, rate=DEFAULT_RATE, progress_callback=None):
+    """
+    并发回补多个交易日，返回 日期 -> 记录数；失败的日期不在结果中。
 
+    回补的耗时主要在等待接口，各日期在线程中获取和处理，共用同一个限速器，总请求速率不超过 rate；
+    调用方本身通常是任务子进程（daemon进程不能再创建子进程），所以不用进程池。
+    (日期, 类型) 的结果缓存在 static/backfill_cache 中，重复回补不会再次请求接口。
+    """
+    dates = list(dict.fromkeys(dates))
+    latest_trade_date = get_latest_trade_date()
+    bucket = TokenBucket(rate, capacity=1)
+    results, errors = {}, {}
+    if len(dates) <= 1 or max_workers <= 1:
+        outcomes = (_prepare_one(d, rate, latest_trade_date, bucket) for d in dates)
+        for index, (date_str, count, error) in enumerate(outcomes, 1):
+            (errors if error else results)[date_str] = error or count
+            if progress_callback is not None:
+                progress_callback({"done": index, "total": len(dates), "failed": len(errors)})
+        return results
 
-# prepareChanges(get_latest_trade_date())
\ No newline at end of file
+    workers = min(max_workers, len(dates))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        futures = [pool.submit(_prepare_one, d, rate, latest_trade_date, bucket) for d in dates]
+        for index, future in enumerate(as_completed(futures), 1):
+            date_str, count, error = future.result()
+            (errors if error else results)[date_str] = error or count
+            if progress_callback is not None:
+                progress_callback({"done": index, "total": len(dates), "failed": len(errors)})
+    if errors:
+        logging.warning(f'[prepare] {len(errors)} 个交易日回补失败: {errors}')
+    return results
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import cProfile
+import logging
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+
+
+# 按需性能分析：sample 为采样（后台线程定时读取各线程的调用栈，输出火焰图用的折叠栈文本），
+# 开销低，可以在实盘时使用；cprofile 为确定性分析（输出pstats），只覆盖启动它的线程，开销较大。
+PROFILE_DIRNAME = "profiles"
+PROFILE_MODES = {"sample": "folded.txt", "cprofile": "pstats"}
+PROFILE_TARGETS = ("worker", "api")
+MAX_PROFILE_SECONDS = 120
+SAMPLE_INTERVAL = 0.01  # 采样间隔（秒），100Hz
+MAX_PROFILE_FILES = 50  # profiles 目录中最多保留的结果文件数，超出时删除最早的
+
+_active_lock = threading.Lock()  # 每个进程同一时间只运行一个分析
+
+
+def get_profile_dir(static_dir):
+    return os.path.join(static_dir, PROFILE_DIRNAME)
+
+
+def profile_path(static_dir, target, mode):
+    """新的结果文件路径；同一秒内的多次请求靠随机后缀区分，同时清理超出 MAX_PROFILE_FILES 的旧结果"""
+    profile_dir = get_profile_dir(static_dir)
+    prune_profiles(profile_dir, MAX_PROFILE_FILES - 1)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(profile_dir, f"{target}_{mode}_{stamp}_{uuid.uuid4().hex[:8]}.{PROFILE_MODES[mode]}")
+
+
+def prune_profiles(profile_dir, keep=MAX_PROFILE_FILES):
+    """按修改时间只保留最新的 keep 个结果文件，返回删除的文件数"""
+    suffixes = tuple("." + ext for ext in PROFILE_MODES.values())
+    try:
+        paths = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir) if name.endswith(suffixes)]
+    except OSError:
+        return 0
+    paths.sort(key=os.path.getmtime, reverse=True)
+    removed = 0
+    for path in paths[max(keep, 0):]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logging.info(f"[profiling] 已删除 {removed} 个旧的分析结果")
+    return removed
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """定时采集本进程所有线程（采样线程自身和 exclude 中的线程除外）的调用栈，按折叠栈计数"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, exclude=()):
+        self.interval = interval
+        self.exclude = set(exclude)
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        skip = self.exclude | {threading.get_ident()}
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(";", ","))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """折叠栈格式，每行 "线程;外层;...;内层 次数"，可直接交给 flamegraph.pl 或 speedscope"""
+        lines = [f"{stack} {count}\n" for stack, count in self.counts.most_common()]
+        _atomic_write(path, "".join(lines).encode("utf-8"))
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _dump_pstats(profiler, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    profiler.dump_stats(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def sample_for(duration, path, interval=SAMPLE_INTERVAL):
+    """阻塞采样 duration 秒后写入 path；已有分析在运行时返回False"""
+    if not _active_lock.acquire(blocking=False):
+        return False
+    try:
+        # 等待采样结束的调用线程本身不计入
+        sampler = StackSampler(interval, exclude=(threading.get_ident(),))
+        sampler.start()
+        time.sleep(duration)
+        sampler.stop()
+        sampler.write(path)
+        logging.info(f"[profiling] 采样 {duration}s 完成，{sampler.samples} 次采样: {path}")
+        return True
+    finally:
+        _active_lock.release()
+
+
+class TickProfiler:
+    """
+    worker主循环的按需分析：start() 之后由主循环每个tick调用 poll()，到期后写入结果。
+    cprofile 在主循环线程中启用；sample 在后台线程中采样，不依赖 poll()。
+    """
+
+    def __init__(self):
+        self._profiler = None
+        self._path = None
+        self._deadline = 0.0
+
+    @property
+    def active(self):
+        return self._profiler is not None or _active_lock.locked()
+
+    def start(self, mode, duration, path):
+        if self.active:
+            logging.warning("[profiling] 已有性能分析在运行，忽略新的请求")
+            return False
+        if mode == "sample":
+            threading.Thread(target=sample_for, args=(duration, path), name="profile-sample", daemon=True).start()
+            return True
+        self._profiler = cProfile.Profile()
+        self._path = path
+        self._deadline = time.monotonic() + duration
+        self._profiler.enable()
+        logging.info(f"[profiling] 已启用cProfile，{duration}s 后写入 {path}")
+        return True
+
+    def poll(self, force=False):
+        if self._profiler is None or (not force and time.monotonic() < self._deadline):
+            return
+        profiler, path = self._profiler, self._path
+        self._profiler = None
+        profiler.disable()
+        try:
+            _dump_pstats(profiler, path)
+            logging.info(f"[profiling] cProfile 结果已写入 {path}")
+        except Exception as e:
+            logging.error(f"[profiling] 写入cProfile结果失败: {e}", exc_info=True)
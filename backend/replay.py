@@ -0,0 +1,126 @@
+import os
+import time
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from history_store import get_history_dir, has_partition, read_day_sources, HISTORY_COLUMNS
+
+
+# 回放状态
+IDLE = "idle"
+RUNNING = "running"
+FINISHED = "finished"
+STOPPED = "stopped"
+FAILED = "failed"
+
+_LUNCH_START = 11 * 60 + 30
+_LUNCH_MINUTES = 90
+
+
+def _market_minute(hhmm):
+    """HH:MM 转为交易分钟序号，午休的90分钟不计入，回放时不会在午休空等"""
+    try:
+        minute = int(hhmm[:2]) * 60 + int(hhmm[3:5])
+    except (TypeError, ValueError):
+        return 0
+    return minute - _LUNCH_MINUTES if minute >= _LUNCH_START + _LUNCH_MINUTES else minute
+
+
+def load_day(static_dir, date_str):
+    """回放用的一天数据：优先读历史分区，没有分区时读回补文件和异动日志"""
+    history_dir = get_history_dir(static_dir)
+    if has_partition(history_dir, date_str):
+        df = pq.read_table(os.path.join(history_dir, f"date={date_str}", "part-0.parquet")).to_pandas()
+    else:
+        df = read_day_sources(static_dir, date_str)
+        if df is None:
+            raise FileNotFoundError(f"没有 {date_str} 的数据")
+    df = df.reindex(columns=list(dict.fromkeys(HISTORY_COLUMNS + list(df.columns))))
+    df['时间'] = df['时间'].fillna('').astype(str)
+    # 只按 时间 排序：异动日志中的记录没有 时间排序 列，按它排序会把这些记录都排到最前面，
+    # step() 用 searchsorted 查找时要求 _minute 单调不减
+    df['_minute'] = df['时间'].map(_market_minute)
+    return df.sort_values(['_minute', '时间'], kind='stable', ignore_index=True)
+
+
+class DayReplay:
+    """
+    按 N 倍速回放一天的异动：回放时钟从第一条事件的时间开始，每次 step() 返回时钟已经走过的新事件，
+    交给与实时数据相同的补充/推送路径。speed <= 0 时不等待，每一步推进一分钟，用于测量推送吞吐。
+    """
+
+    def __init__(self, static_dir, date_str, speed=1.0):
+        self.date_str = date_str
+        self.speed = float(speed)
+        self.events = load_day(static_dir, date_str)
+        self.uplimit_cache = self._uplimit_cache(self.events)
+        self.state = RUNNING
+        self.message = ''
+        self.emitted = 0
+        self.frames = 0
+        self.publish_seconds = 0.0
+        self.started = datetime.now().strftime("%H:%M:%S")
+        self._t0 = time.monotonic()
+        self._minutes = self.events['_minute'].to_numpy()
+        self._start_minute = int(self._minutes[0]) if len(self._minutes) else 0
+        self._clock = self._start_minute - 1
+
+    @staticmethod
+    def _uplimit_cache(events):
+        """当天记录中的涨停标识，回放时代替实时的涨停池"""
+        marks = events[['名称', '标识']].fillna('').astype(str)
+        marks = marks[marks['标识'] != '']
+        return dict(zip(marks['名称'], marks['标识']))
+
+    @property
+    def done(self):
+        return self.state != RUNNING
+
+    def step(self, now=None):
+        """推进回放时钟，返回新到达的事件（可能为空）"""
+        if self.done:
+            return self.events.iloc[0:0]
+        if self.speed > 0:
+            elapsed = (now if now is not None else time.monotonic()) - self._t0
+            clock = self._start_minute + int(elapsed * self.speed / 60)
+        else:
+            remaining = self._minutes[self.emitted:]
+            clock = int(remaining[0]) if len(remaining) else self._clock
+        end = int(self._minutes.searchsorted(clock, side='right'))
+        batch = self.events.iloc[self.emitted:end]
+        self.emitted = max(self.emitted, end)
+        self._clock = clock
+        if self.emitted >= len(self.events):
+            self.state = FINISHED
+        return batch.drop(columns=['_minute'])
+
+    def record_publish(self, seconds):
+        self.frames += 1
+        self.publish_seconds += seconds
+
+    def stop(self, state=STOPPED, message=''):
+        if not self.done:
+            self.state = state
+            self.message = message
+
+    def status(self):
+        elapsed = time.monotonic() - self._t0
+        minute = max(self._clock, self._start_minute)
+        if minute > _LUNCH_START:
+            minute += _LUNCH_MINUTES
+        return {
+            "state": self.state,
+            "date": self.date_str,
+            "speed": self.speed,
+            "clock": f"{minute // 60:02d}:{minute % 60:02d}",
+            "emitted": self.emitted,
+            "total": len(self.events),
+            "frames": self.frames,
+            "started": self.started,
+            "elapsed_seconds": round(elapsed, 2),
+            "frames_per_second": round(self.frames / elapsed, 2) if elapsed > 0 else 0,
+            "rows_per_second": round(self.emitted / elapsed, 1) if elapsed > 0 else 0,
+            "avg_publish_ms": round(self.publish_seconds / self.frames * 1000, 2) if self.frames else 0,
+            "message": self.message,
+        }
@@ -1,31 +1,55 @@
-from fastapi import APIRouter
-from models import StockData
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
+from models import StockData, PickedBatch, PickedDeleteBatch, LogLevels
 from services.backend_service import (
     start_get_concepts,
     queue_get_concepts,
     search_concepts,
+    get_concepts_progress,
+    list_jobs,
+    get_readiness,
+    start_backfill_changes,
+    get_job,
+    cancel_job,
     get_concept_sectors,
-    get_stock_sectors
+    get_stock_sectors,
+    get_sector_stocks,
+    query_history,
+    get_history_partitions,
+    export_changes,
+    start_replay,
+    stop_replay,
+    get_replay_status,
+    get_metrics,
+    get_memory,
+    profile_process,
+    get_log_levels,
+    set_log_levels
 )
 from services.pick_service import (
     get_picked_stocks,
     add_picked_stock,
     update_picked_stock,
-    delete_picked_stock
+    delete_picked_stock,
+    add_picked_stocks,
+    update_picked_stocks,
+    delete_picked_stocks
 )
 
 router = APIRouter()
 
 
 @router.post("/api/start_get_concepts")
-def api_start_get_concepts():
-    return start_get_concepts()
+def api_start_get_concepts(incremental: bool = False):
+    return start_get_concepts(incremental)
 
 
 @router.post("/api/queue_get_concepts")
-def api_queue_get_concepts():
-    """将getConcepts任务加入队列执行一次"""
-    return queue_get_concepts()
+def api_queue_get_concepts(incremental: bool = False):
+    """将getConcepts任务加入队列执行一次，incremental=true时只重新获取有变化的板块"""
+    return queue_get_concepts(incremental)
 
 
 @router.get("/api/picked")
@@ -44,6 +68,30 @@ def api_add_picked_stock(stock_data: StockData):
     return add_picked_stock(stock_data)
 
 
+@router.post("/api/picked/batch")
+def api_add_picked_stocks(batch: PickedBatch):
+    """批量添加股票到精选列表，可传入股票列表或板块代码"""
+    stocks = [stock.dict() for stock in batch.stocks]
+    if batch.板块代码:
+        members = get_sector_stocks(batch.板块代码)
+        if members["status"] != "success":
+            return members
+        stocks.extend(members["data"])
+    return add_picked_stocks(stocks)
+
+
+@router.put("/api/picked/batch")
+def api_update_picked_stocks(batch: PickedBatch):
+    """批量更新精选列表中的股票信息"""
+    return update_picked_stocks([stock.dict() for stock in batch.stocks])
+
+
+@router.post("/api/picked/batch/delete")
+def api_delete_picked_stocks(batch: PickedDeleteBatch):
+    """按股票代码列表、板块代码或板块名称批量删除精选股票"""
+    return delete_picked_stocks(batch.股票代码, batch.板块代码, batch.板块名称)
+
+
 @router.put("/api/picked/{stock_code}")
 def api_update_picked_stock(stock_code: str, stock_data: StockData):
     """更新精选列表中的股票信息"""
@@ -56,6 +104,12 @@ def api_delete_picked_stock(stock_code: str):
     return delete_picked_stock(stock_code)
 
 
+@router.get("/api/concepts/progress")
+def api_get_concepts_progress():
+    """获取概念数据爬取进度"""
+    return get_concepts_progress()
+
+
 @router.get("/api/concepts/search")
 def api_search_concepts(q: str = ""):
     """搜索concept_df中的股票"""
@@ -71,4 +125,149 @@ def api_get_concept_sectors():
 @router.get("/api/concepts/stock-sectors/{stock_code}")
 def api_get_stock_sectors(stock_code: str):
     """获取指定股票在concept_df中对应的所有板块"""
-    return get_stock_sectors(stock_code)
\ No newline at end of file
+    return get_stock_sectors(stock_code)
+
+
+@router.get("/api/concepts/sectors/{sector_code}/stocks")
+def api_get_sector_stocks(sector_code: str):
+    """获取指定板块的全部成分股"""
+    return get_sector_stocks(sector_code)
+
+
+@router.get("/api/ready")
+def api_get_readiness():
+    """获取启动各阶段的状态和耗时"""
+    return get_readiness()
+
+
+@router.post("/api/changes/backfill")
+def api_start_backfill_changes(start: str, end: str = None):
+    """回补 start~end（YYYYMMDD）之间的异动数据，非最新交易日只能使用已缓存的数据"""
+    return start_backfill_changes(start, end)
+
+
+@router.get("/api/jobs")
+def api_list_jobs():
+    """获取后台任务列表（运行中、排队中和历史）"""
+    return list_jobs()
+
+
+@router.get("/api/jobs/{job_id}")
+def api_get_job(job_id: str):
+    """获取后台任务状态和进度"""
+    return get_job(job_id)
+
+
+@router.post("/api/jobs/{job_id}/cancel")
+def api_cancel_job(job_id: str):
+    """取消排队中或运行中的后台任务"""
+    return cancel_job(job_id)
+
+
+@router.get("/api/history")
+def api_query_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    stock: Optional[str] = None,
+    sector: Optional[str] = None,
+    type: Optional[List[str]] = Query(None),
+    columns: Optional[str] = None,
+    limit: int = 5000,
+):
+    """查询历史异动：日期为YYYYMMDD，type可重复，columns为逗号分隔的列名"""
+    column_list = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    return query_history(start, end, stock, sector, type, column_list, limit)
+
+
+@router.get("/api/history/partitions")
+def api_get_history_partitions():
+    """获取历史分区列表"""
+    return get_history_partitions()
+
+
+def _export_response(result):
+    if result["status"] != "success":
+        return result
+    chunks, media_type, filename = result["data"]
+    # 同步生成器由Starlette在线程池中迭代，编码和读盘不阻塞事件循环
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/api/export/day/{date}")
+def api_export_day(date: str, format: str = "arrow", columns: Optional[str] = None):
+    """流式导出一天补充过板块信息的异动数据，format为arrow(IPC流)或parquet"""
+    column_list = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    return _export_response(export_changes(date, date, format, column_list))
+
+
+@router.get("/api/export/range")
+def api_export_range(
+    start: str,
+    end: str,
+    format: str = "arrow",
+    columns: Optional[str] = None,
+    stock: Optional[str] = None,
+    sector: Optional[str] = None,
+    type: Optional[List[str]] = Query(None),
+):
+    """流式导出日期区间内的异动数据，支持与 /api/history 相同的过滤条件"""
+    column_list = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    return _export_response(export_changes(start, end, format, column_list, stock, sector, type))
+
+
+@router.post("/api/replay/start")
+def api_start_replay(date: str, speed: float = 1.0):
+    """按倍速回放某一天的数据，经过与实时数据相同的补充和推送路径；speed<=0 为全速"""
+    return start_replay(date, speed)
+
+
+@router.post("/api/replay/stop")
+def api_stop_replay():
+    """停止回放，恢复推送实时数据"""
+    return stop_replay()
+
+
+@router.get("/api/replay/status")
+def api_get_replay_status():
+    """获取回放状态、进度和吞吐"""
+    return get_replay_status()
+
+
+@router.get("/api/metrics")
+def api_get_metrics():
+    """各阶段耗时直方图和行数/字节数/错误数计数器，Prometheus 文本格式，包含worker进程的指标"""
+    result = get_metrics()
+    return PlainTextResponse(result["data"], media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/api/memory")
+def api_get_memory():
+    """API进程和worker进程的内存统计：各组件（当天事件、概念数据、缓存等）的估算占用、进程常驻内存和峰值"""
+    return get_memory()
+
+
+@router.post("/api/admin/profile")
+def api_profile_process(target: str = "worker", mode: str = "sample", duration: float = 10.0):
+    """
+    对worker或API进程做限时性能分析并下载结果：mode=sample 为折叠栈文本（火焰图），
+    mode=cprofile 为pstats（仅worker）。请求会阻塞 duration 秒。
+    """
+    result = profile_process(target, mode, duration)
+    if result["status"] != "success":
+        return result
+    path = result["data"]
+    media_type = "text/plain; charset=utf-8" if mode == "sample" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+@router.get("/api/logging/levels")
+def api_get_log_levels():
+    """获取当前的日志级别配置"""
+    return get_log_levels()
+
+
+@router.put("/api/logging/levels")
+def api_set_log_levels(body: LogLevels):
+    """运行时调整日志级别，同时推送给worker进程，如 {"levels": {"root": "INFO", "worker_queue": "DEBUG"}}"""
+    return set_log_levels(body.levels)
@@ -2,10 +2,14 @@ import os
 import asyncio
 import json
 import math
-from fastapi import APIRouter, WebSocket, HTTPException
+import time
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.responses import FileResponse
 from services.backend_service import get_watch_status
 import logging
+import metrics
+from freshness import record_delivery
+from log_stream import log_ring_handler, LogSubscription
 
 router = APIRouter()
 
@@ -20,34 +24,39 @@ def set_buffer_queue(queue):
     buffer_queue = queue
 
 
+def clean_nan_values(obj):
+    """Recursively clean NaN and None values from data structure"""
+    if isinstance(obj, dict):
+        return {k: clean_nan_values(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_nan_values(item) for item in obj]
+    elif isinstance(obj, float):
+        # Check for NaN using multiple methods to be safe
+        try:
+            if math.isnan(obj) or obj != obj:
+                return 0  # Replace NaN with 0
+            else:
+                return obj
+        except (TypeError, ValueError):
+            # If we can't check for NaN, treat it as a potential NaN
+            return 0
+    elif obj is None:
+        return 0  # Replace None with 0 as well
+    else:
+        return obj
+
+
+def encode_payload(data):
+    """Handle NaN values by replacing them with 0 before JSON serialization"""
+    return json.dumps(clean_nan_values(data), ensure_ascii=False)
+
+
 @router.websocket("/ws/changes")
 async def websocket_changes(websocket: WebSocket):
     logging.debug(f"[ws/changes] New WebSocket connection from {websocket.client}")
     await websocket.accept()
     global buffer_queue
 
-    # Helper function to clean NaN values from data before JSON serialization
-    def clean_nan_values(obj):
-        """Recursively clean NaN and None values from data structure"""
-        if isinstance(obj, dict):
-            return {k: clean_nan_values(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [clean_nan_values(item) for item in obj]
-        elif isinstance(obj, float):
-            # Check for NaN using multiple methods to be safe
-            try:
-                if math.isnan(obj) or obj != obj:
-                    return 0  # Replace NaN with 0
-                else:
-                    return obj
-            except (TypeError, ValueError):
-                # If we can't check for NaN, treat it as a potential NaN
-                return 0
-        elif obj is None:
-            return 0  # Replace None with 0 as well
-        else:
-            return obj
-
     try:
         while True:
             # 优先从缓冲队列读取
@@ -55,14 +64,15 @@ async def websocket_changes(websocket: WebSocket):
                 if buffer_queue:
                     while not buffer_queue.empty():
                         data = buffer_queue.get_nowait()
-                        # Handle NaN values by replacing them with 0 or null before JSON serialization
-                        cleaned_data = clean_nan_values(data)
-                        await websocket.send_text(json.dumps(cleaned_data, ensure_ascii=False))
+                        freshness_meta = data.pop("freshness", None) if isinstance(data, dict) else None
+                        with metrics.stage("encode"):
+                            text = encode_payload(data)
+                        with metrics.stage("send"):
+                            await websocket.send_text(text)
+                        record_delivery(freshness_meta, time.time())
             except Exception as e:
-                error_msg = {"error": str(e)}
                 # Ensure error messages don't contain NaN values either
-                clean_error = clean_nan_values(error_msg)
-                await websocket.send_text(json.dumps(clean_error, ensure_ascii=False))
+                await websocket.send_text(encode_payload({"error": str(e)}))
             await asyncio.sleep(1)
 
     except Exception as e:
@@ -75,6 +85,58 @@ async def websocket_changes(websocket: WebSocket):
             logging.debug(f"[ws/changes] WebSocket already closed: {e}")
 
 
+@router.websocket("/ws/logs")
+async def websocket_logs(websocket: WebSocket, level: str = "INFO", module: str = "", history: int = 200):
+    """
+    实时日志：连接后先发送环形缓冲区中最近 history 条记录，之后推送新记录。
+    level 为最低级别，module 为逗号分隔的logger名称前缀（如 worker_queue,services），服务端过滤。
+    """
+    levelno = logging.getLevelName(level.upper())
+    await websocket.accept()
+    if not isinstance(levelno, int):
+        await websocket.send_text(json.dumps({"error": f"无效的日志级别: {level}"}, ensure_ascii=False))
+        await websocket.close()
+        return
+
+    subscription = LogSubscription(asyncio.get_running_loop(), levelno, module.split(","))
+    recent = log_ring_handler.subscribe(subscription, history)
+
+    async def watch_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    disconnect_task = asyncio.create_task(watch_disconnect())
+    try:
+        for entry in recent:
+            await websocket.send_text(json.dumps(entry, ensure_ascii=False))
+        while not disconnect_task.done():
+            get_task = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({get_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+            if get_task not in done:
+                get_task.cancel()
+                break
+            entries = [get_task.result()]
+            while not subscription.queue.empty():
+                entries.append(subscription.queue.get_nowait())
+            for entry in entries:
+                await websocket.send_text(json.dumps(entry, ensure_ascii=False))
+            if subscription.dropped:
+                await websocket.send_text(json.dumps({"dropped": subscription.dropped}, ensure_ascii=False))
+                subscription.dropped = 0
+    except Exception as e:
+        logging.debug(f"[ws/logs] WebSocket error: {e}")
+    finally:
+        log_ring_handler.unsubscribe(subscription)
+        disconnect_task.cancel()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+
+
 @router.get("/api/watch/status")
 async def api_get_watch_status():
     """Get the status of the fluctuation watch process"""
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import akshare as ak
+
+from utils import setup_static_directory
+
+
+def classify_code(code: str, name: str = ''):
+    """根据股票代码判断 (交易所, 板块, 涨停幅度)，仅在证券主表中查不到时使用"""
+    code = str(code)
+    if code.startswith(('688', '689')):
+        exchange, board, ratio = 'SH', '科创板', 0.2
+    elif code.startswith('900'):
+        exchange, board, ratio = 'SH', 'B股', 0.1
+    elif code.startswith('6'):
+        exchange, board, ratio = 'SH', '主板', 0.1
+    elif code.startswith(('300', '301')):
+        exchange, board, ratio = 'SZ', '创业板', 0.2
+    elif code.startswith('200'):
+        exchange, board, ratio = 'SZ', 'B股', 0.1
+    elif code.startswith(('8', '4', '92')):
+        exchange, board, ratio = 'BJ', '北交所', 0.3
+    else:
+        exchange, board, ratio = 'SZ', '主板', 0.1
+    if board == '主板' and 'ST' in name:
+        ratio = 0.05
+    return exchange, board, ratio
+
+
+class SecurityMaster:
+    """
+    本地证券主表：股票代码、名称、交易所、板块和涨停幅度。
+
+    持久化在 static/securities.db（WAL模式），每天全量刷新一次，并从异动数据中顺带更新名称。
+    内存中以 pandas.Index + numpy 数组保存，解析和搜索只做数组查找，不再调用网络接口或逐行判断代码前缀。
+    多个进程可以同时打开，其他进程提交的更新通过 PRAGMA data_version 感知后重新加载。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS securities ("
+            "code TEXT PRIMARY KEY, name TEXT, exchange TEXT, board TEXT, limit_ratio REAL, updated TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._data_version = None
+        self._reload()
+
+    def _reload(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT code, name, limit_ratio FROM securities ORDER BY code").fetchall()
+            self._index = pd.Index([row[0] for row in rows])
+            self._names = np.array([row[1] or '' for row in rows], dtype=object)
+            self._ratios = np.array([row[2] for row in rows], dtype=float)
+            self._name_map = dict(zip(self._index, self._names))
+            self._data_version = self._current_data_version()
+            logging.debug(f"[security_master] 加载证券主表 {len(rows)} 条")
+
+    def _current_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _reload_if_changed(self):
+        """其他进程提交了更新时重新加载内存数组"""
+        if self._current_data_version() != self._data_version:
+            self._reload()
+
+    def _upsert(self, rows):
+        today = datetime.now().strftime("%Y%m%d")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO securities (code, name, exchange, board, limit_ratio, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(code) DO UPDATE SET name=excluded.name, exchange=excluded.exchange, "
+                "board=excluded.board, limit_ratio=excluded.limit_ratio, updated=excluded.updated",
+                [(code, name, *classify_code(code, name), today) for code, name in rows],
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    # --- 查询 ---
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def names(self):
+        """股票代码 -> 名称"""
+        self._reload_if_changed()
+        return self._name_map
+
+    def name_of(self, code, default=''):
+        return self.names.get(code, default)
+
+    def limit_ratios(self, codes) -> np.ndarray:
+        """批量获取涨停幅度，主表中不存在的代码按代码规则推断"""
+        self._reload_if_changed()
+        codes = pd.Index(pd.Series(codes, dtype=object).astype(str))
+        positions = self._index.get_indexer(codes)
+        found = positions >= 0
+        ratios = np.empty(len(codes), dtype=float)
+        ratios[found] = self._ratios[positions[found]]
+        if not found.all():
+            missing = {code: classify_code(code)[2] for code in codes[~found].unique()}
+            ratios[~found] = [missing[code] for code in codes[~found]]
+        return ratios
+
+    def last_refresh(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_refresh'").fetchone()
+        return row[0] if row else None
+
+    def needs_refresh(self):
+        return self.last_refresh() != datetime.now().strftime("%Y%m%d")
+
+    # --- 更新 ---
+
+    def refresh(self):
+        """从akshare全量拉取A股代码和名称，写入主表"""
+        df = ak.stock_info_a_code_name()
+        rows = list(zip(df['code'].astype(str), df['name'].astype(str)))
+        with self._lock:
+            self._upsert(rows)
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('last_refresh', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (datetime.now().strftime("%Y%m%d"),),
+            )
+            self._reload()
+        logging.info(f"[security_master] 证券主表刷新完成，共{len(rows)}条")
+        return len(rows)
+
+    def observe_names(self, codes, names):
+        """用异动数据中出现的名称顺带更新主表，只写入新增或改名的代码"""
+        self._reload_if_changed()
+        changed = [
+            (code, name) for code, name in dict(zip(codes, names)).items()
+            if name and self._name_map.get(code) != name
+        ]
+        if not changed:
+            return 0
+        with self._lock:
+            self._upsert(changed)
+            self._reload()
+        logging.debug(f"[security_master] 从异动数据更新 {len(changed)} 条证券名称")
+        return len(changed)
+
+
+_master = None
+_master_lock = threading.Lock()
+
+
+def get_security_master(static_dir=None) -> SecurityMaster:
+    """获取当前进程的证券主表实例"""
+    global _master
+    with _master_lock:
+        if _master is None:
+            static_dir = static_dir or setup_static_directory()
+            _master = SecurityMaster(os.path.join(static_dir, "securities.db"))
+        return _master
+
+
+def refresh_security_master_if_stale():
+    """证券主表当天尚未刷新时进行全量刷新，供后台线程调用"""
+    try:
+        master = get_security_master()
+        if master.needs_refresh():
+            master.refresh()
+    except Exception as e:
+        logging.error(f"[security_master] 刷新证券主表失败: {e}", exc_info=True)
@@ -1,16 +1,31 @@
 import os
 import sys
+import time
+import threading
 import pandas as pd
 from multiprocessing import Process, Queue
 import logging
 import logging.handlers
-import akshare as ak
 
+import metrics
+import memory_stats
+from config import setup_child_logging, EVENT_RETENTION_ROWS
+from log_stream import log_ring_handler
+from log_control import apply_levels, current_levels, parse_levels
 from utils import get_resource_path, get_latest_trade_date, setup_static_directory
-from services.pick_service import load_picked_data, get_shared_picked_data
+from services.pick_service import load_picked_data, get_shared_picked_data, get_current_picked_df, force_sync_to_shared_memory, release_shared_picked_data
+from services.concept_index import ConceptIndex
+from history_store import get_history_dir, ingest_days, list_partitions, read_partition_stats, query_history as _query_history
+from concept_store import get_concept_store_dir, ensure_concept_store, load_concept_frame, current_generation, read_generation_json
+from security_master import get_security_master, refresh_security_master_if_stale
+from shared_snapshot import VersionedSnapshot
+from services.job_manager import job_manager
+from services.readiness import readiness
+from services.export_service import stream_export
+from profiling import PROFILE_MODES, PROFILE_TARGETS, MAX_PROFILE_SECONDS, profile_path, sample_for
 # Import target functions that will be run in subprocesses
 from concepts import getConcepts
-from prepare import prepareChanges
+from prepare import backfillChanges, backfill_dates
 from worker_queue import worker as changes_worker
 
 
@@ -33,64 +48,81 @@ def clean_nan_values(records):
     return cleaned_records
 
 
-# --- Child Process Logging Setup ---
+def run_get_concepts(q: Queue, level, progress_data=None, concepts_path=None, concept_stocks_path=None, incremental=False):
+    """子进程任务：配置日志并运行 getConcepts，进度发布到 progress_data 共享快照。"""
+    setup_child_logging(q, level)
+    last = {}
 
-def _setup_child_logging(q: Queue, level):
-    """在子进程中配置logging，将日志记录发送到队列。"""
-    if q is None:
-        # Fallback for safety, though it shouldn't happen in normal operation
-        logging.basicConfig(level=logging.DEBUG)
-        logging.warning("Log queue not provided to child process.")
-        return
-
-    # 创建一个handler，它将日志写入队列
-    queue_handler = logging.handlers.QueueHandler(q)
-    
-    # 获取根logger，并设置其level
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    
-    # 清除所有现有的handlers，只使用QueueHandler
-    logger.handlers = [queue_handler]
+    def publish(state, **progress):
+        last.update(progress, state=state)
+        if progress_data is not None:
+            progress_data.publish(last)
 
-
-def run_get_concepts(q: Queue, level, concepts_path=None, concept_stocks_path=None):
-    """子进程任务：配置日志并运行 getConcepts。"""
-    _setup_child_logging(q, level)
     try:
         logging.debug(f"Starting getConcepts task...{concepts_path}, {concept_stocks_path}")
-    
-        getConcepts(concepts_path, concept_stocks_path)
 
+        getConcepts(concepts_path, concept_stocks_path, progress_callback=lambda p: publish("running", **p),
+                    incremental=incremental)
+
+        publish("finished")
         logging.info("getConcepts task finished successfully.")
     except Exception as e:
+        publish("failed", error=str(e))
         logging.error(f"getConcepts task failed: {e}", exc_info=True)
+        sys.exit(1)
 
 
-def run_prepare_changes(q: Queue, date_str: str, level):
-    """子进程任务：配置日志并运行 prepareChanges。"""
-    _setup_child_logging(q, level)
+def run_prepare_changes(q: Queue, level, progress_data=None, date_str: str = None, dates=None):
+    """子进程任务：配置日志并回补一个或多个交易日的异动数据。"""
+    setup_child_logging(q, level)
+    dates = list(dates or [date_str])
     try:
-        logging.debug(f"Starting prepareChanges task for date: {date_str}...")
-        prepareChanges(date_str)
-        logging.info(f"prepareChanges for date {date_str} finished successfully.")
+        logging.debug(f"Starting prepareChanges task for dates: {dates}...")
+        results = backfillChanges(
+            dates,
+            progress_callback=progress_data.publish if progress_data is not None else None,
+        )
+        if len(results) < len(dates):
+            raise RuntimeError(f"{len(dates) - len(results)} 个交易日回补失败")
+        logging.info(f"prepareChanges for dates {dates} finished successfully: {results}")
     except Exception as e:
-        logging.error(f"prepareChanges for date {date_str} failed: {e}", exc_info=True)
+        logging.error(f"prepareChanges for dates {dates} failed: {e}", exc_info=True)
+        sys.exit(1)
 
 
 # --- Global Variables ---
 
 concept_df = None
-get_concepts_proc = None
+concept_index = None  # ConceptIndex，每次加载概念数据时重建
+concept_store_dir = None
+concept_generation = 0  # 当前已加载的概念数据代编号
+concept_generation_data = None  # VersionedSnapshot，向worker进程发布当前概念代编号
+replay_status_data = None  # VersionedSnapshot，worker进程发布回放状态
+worker_metrics_data = None  # VersionedSnapshot，worker进程发布指标快照
+_concept_reload_lock = threading.Lock()
 get_changes_proc = None
+control_queue: Queue = None  # 发送给worker进程的控制消息
 initialization_completed = False
 log_queue: Queue = None  # Will be set by initialize_backend_services
 log_level = logging.INFO # Default log level
 
 
+# (阶段名, 是否为就绪的必要条件)
+STARTUP_STAGES = [
+    ("picked", True),
+    ("security_master", True),
+    ("concepts", True),
+    ("worker", True),
+    ("concept_index", True),
+    ("changes_backfill", False),
+    ("concepts_refresh", False),
+    ("security_master_refresh", False),
+    ("history", False),
+]
+
+
 def _get_concept_file_paths():
     """获取概念文件路径的辅助函数"""
-    from utils import get_resource_path
     static_dir = get_resource_path("")
     if static_dir is None:
         # 如果 get_resource_path 返回 None，则回退到原来的逻辑
@@ -100,249 +132,373 @@ def _get_concept_file_paths():
     return static_dir, concepts_path, concept_stocks_path
 
 
-def initialize_backend_services(buffer_queue: Queue, lq: Queue, level):
+def _load_stock_names():
+    """收集 股票代码 -> 股票名称 映射用于构建搜索索引：以证券主表为准，精选列表中的名称作为补充"""
+    names = {}
+    picked = get_current_picked_df()
+    names.update((code, name) for code, name in zip(picked['股票代码'], picked['股票名称']) if name and name != code)
+    names.update(get_security_master().names)
+    return names
+
+
+def rebuild_concept_index():
+    """基于当前concept_df重建内存搜索索引"""
+    global concept_index
+    concept_index = ConceptIndex(concept_df, _load_stock_names())
+    return concept_index
+
+
+def _publish_concept_generation():
+    """将当前概念代编号发布到共享快照，worker在两个tick之间检查并切换"""
+    global concept_generation_data
+    if concept_generation_data is None:
+        concept_generation_data = VersionedSnapshot.create(capacity=4096)
+    concept_generation_data.publish({"generation": concept_generation})
+
+
+def reload_concept_data():
     """
-    初始化后端服务，启动必要的子进程。
-    这个函数现在接收一个专用的日志队列(lq)。
+    概念数据生成新的一代后重新加载：新数据的映射和索引构建都在调用线程中完成，
+    完成后再一次性替换全局引用，查询期间始终使用完整的旧一代或新一代数据。
     """
-    global concept_df, get_concepts_proc, get_changes_proc, initialization_completed, log_queue, log_level
-    log_queue = lq  # Store the log queue globally for other functions to use
-    log_level = level # Store the log level globally
+    global concept_df, concept_index, concept_generation
+    with _concept_reload_lock:
+        if concept_store_dir is None:
+            return False
+        generation = current_generation(concept_store_dir)
+        if not generation or generation == concept_generation:
+            logging.debug(f"[sidecar] 概念数据仍为第{concept_generation}代，无需重新加载")
+            return False
+        generation, new_df = load_concept_frame(concept_store_dir, generation)
+        if new_df.empty:
+            logging.warning(f"[sidecar] 第{generation}代概念数据为空，保留第{concept_generation}代")
+            return False
+        # 新一代记录了相对当前代的成员变化时只增量更新索引
+        diff = read_generation_json(concept_store_dir, "diff.json", generation)
+        if concept_index is not None and diff and diff.get("from_generation") == concept_generation:
+            new_index = concept_index.apply_diff(diff["added"], diff["removed"], _load_stock_names(),
+                                                 diff.get("renamed", ()))
+        else:
+            new_index = ConceptIndex(new_df, _load_stock_names())
+        old_generation = concept_generation
+        concept_df, concept_index, concept_generation = new_df, new_index, generation
+        _publish_concept_generation()
+        logging.info(f"[sidecar] 概念数据已热切换: 第{old_generation}代 -> 第{generation}代，共{len(new_df)}条")
+        return True
 
-    logging.debug("[sidecar] 开始初始化后端服务...")
+
+# --- Background Jobs ---
+# 概念爬取和异动回补都是重任务，由任务管理器排队执行，同一时间只运行一个且以低优先级运行
+
+JOB_GET_CONCEPTS = "get_concepts"
+JOB_PREPARE_CHANGES = "prepare_changes"
+
+
+def _reload_concepts_after_job(job):
+    """getConcepts任务成功后在后台热切换概念数据"""
+    _mark_concepts_loaded()
+
+
+def _ingest_history_after_job(job):
+    """回补任务成功后把已结束交易日的数据写入历史分区（覆盖已有分区）"""
+    static_dir = setup_static_directory()
+    dates = list(job.params.get("dates") or [job.params.get("date_str")])
+    ingest_days(static_dir, dates, before=get_latest_trade_date(), concept_df=concept_df, overwrite=True)
+
+
+job_manager.register(JOB_GET_CONCEPTS, run_get_concepts, heavy=True, on_success=_reload_concepts_after_job)
+job_manager.register(JOB_PREPARE_CHANGES, run_prepare_changes, heavy=True, on_success=_ingest_history_after_job)
+
+
+def _submit_get_concepts(incremental=False):
     static_dir, concepts_path, concept_stocks_path = _get_concept_file_paths()
-    if concepts_path is None or not os.path.exists(concepts_path):
-        try:
-            logging.debug("[sidecar] 缺少 concepts.csv，启动 getConcepts 子进程...")
-            
-            # Calculate paths directly instead of relying on get_resource_path in subprocess
-            os.makedirs(static_dir, exist_ok=True)
-            
-            logging.debug(f"[sidecar] 将使用路径: {concepts_path} 和 {concept_stocks_path}")
-            
-            get_concepts_proc = Process(target=run_get_concepts, args=(log_queue, log_level, concepts_path, concept_stocks_path), daemon=True)
-            get_concepts_proc.start()
-            
-            logging.debug("[sidecar] 等待 getConcepts 完成...")
-            get_concepts_proc.join()  # Wait for the process to complete
-            
-            if get_concepts_proc.exitcode == 0:
-                logging.debug("[sidecar] getConcepts 执行成功")
-                # No need to re-check with get_resource_path since we already know the path
-                if not os.path.exists(concepts_path):
-                    raise RuntimeError(f"getConcepts执行成功但文件不存在: {concepts_path}")
-            else:
-                logging.error(f"[sidecar] getConcepts 执行失败，退出码: {get_concepts_proc.exitcode}")
-                raise RuntimeError("getConcepts failed to execute.")
-        except Exception as e:
-            logging.error(f"[sidecar] 自动调用 getConcepts 失败: {e}", exc_info=True)
-            raise
-    else:
-        logging.debug("[sidecar] 检测到已存在 concepts.csv，跳过自动调用 getConcepts")
+    return job_manager.submit(
+        JOB_GET_CONCEPTS, concepts_path=concepts_path, concept_stocks_path=concept_stocks_path, incremental=incremental
+    )
 
-    try:
-        if concepts_path is None or not os.path.exists(concepts_path):
-            raise RuntimeError("concepts.csv 文件不存在，服务无法启动")
-        
-        dtype_dict = {'股票代码': str, '板块代码': str}
-        concepts_df_part1 = pd.read_csv(concepts_path, dtype={'板块代码': str, '板块名称': str})
-        concept_stocks_path = get_resource_path("concept_stocks.csv")
-        if concept_stocks_path is None or not os.path.exists(concept_stocks_path):
-            raise RuntimeError("concept_stocks.csv 文件不存在，服务无法启动")
-        
-        concept_stocks_df = pd.read_csv(concept_stocks_path, dtype=dtype_dict)
-        concept_df = pd.merge(concept_stocks_df, concepts_df_part1, on='板块代码', how='left')
-        concept_df = concept_df[['板块代码', '板块名称', '股票代码']]
-        logging.debug(f"[sidecar] Concepts data loaded and merged. Total records: {len(concept_df)}")
-        if concept_df.empty:
-            raise RuntimeError("Concepts data is empty after merge.")
-    except Exception as e:
-        logging.error(f"[sidecar] Error loading concepts data: {e}", exc_info=True)
-        raise
 
+def _run_stage(name, fn):
+    """执行一个启动阶段并记录状态和耗时，失败时不中断后续阶段"""
+    readiness.begin(name)
     try:
-        static_dir, _, _ = _get_concept_file_paths()
-        current_date = get_latest_trade_date()
-        changes_path = os.path.join(static_dir, f"changes_{current_date}.csv")
-
-        if not os.path.exists(changes_path):
-            logging.debug(f"[sidecar] 当天的changes文件不存在，开始运行 prepareChanges...")
-            prepare_proc = Process(target=run_prepare_changes, args=(log_queue, current_date, log_level), daemon=True)
-            prepare_proc.start()
-            logging.debug(f"[sidecar] 已启动 prepareChanges 子进程，PID: {prepare_proc.pid}")
-            prepare_proc.join() # Wait for completion
-            if prepare_proc.exitcode == 0:
-                logging.debug("[sidecar] prepareChanges 执行成功")
-            else:
-                logging.error(f"[sidecar] prepareChanges 执行失败，退出码: {prepare_proc.exitcode}")
-        else:
-            logging.debug(f"[sidecar] 检测到当天的changes文件已存在，跳过prepareChanges")
+        message = fn()
+        readiness.done(name, message or '')
+        return True
     except Exception as e:
-        logging.error(f"[sidecar] 检查或运行 prepareChanges 失败: {e}", exc_info=True)
-
-    # 加载picked数据并确保共享内存完全初始化
-    load_picked_data(static_dir)
-    
-    # 强制同步数据到共享内存并验证
-    from services.pick_service import force_sync_to_shared_memory, get_shared_picked_data, shared_picked_manager
-    
-    # 强制同步确保数据完整传递
-    record_count = force_sync_to_shared_memory()
-    logging.debug(f"[sidecar] 强制同步完成，共享内存中有 {record_count} 条记录")
-    
-    # 获取共享内存引用
+        logging.error(f"[sidecar] 启动阶段 {name} 失败: {e}", exc_info=True)
+        readiness.fail(name, str(e))
+        return False
+
+
+def _after_job(job, stage, then=None):
+    """在后台等待任务结束，记录阶段状态，成功时执行then"""
+    def wait():
+        job.wait()
+        if job.state != "succeeded":
+            readiness.fail(stage, f"{job.id}: {job.state} {job.message}")
+            return
+        try:
+            if then is not None:
+                then()
+            readiness.done(stage, job.id)
+        except Exception as e:
+            logging.error(f"[sidecar] 任务 {job.id} 的后续处理失败: {e}", exc_info=True)
+            readiness.fail(stage, str(e))
+    threading.Thread(target=wait, daemon=True).start()
+
+
+def _load_persisted_concepts(concepts_path, concept_stocks_path):
+    """映射已持久化的最新一代概念数据；尚无任何一代时返回None"""
+    global concept_df, concept_generation
+    if os.path.exists(concepts_path) and os.path.exists(concept_stocks_path):
+        ensure_concept_store(concepts_path, concept_stocks_path, concept_store_dir)
+    if not current_generation(concept_store_dir):
+        return None
+    concept_generation, concept_df = load_concept_frame(concept_store_dir)
+    _publish_concept_generation()
+    return f"第{concept_generation}代，共{len(concept_df)}条"
+
+
+def _mark_concepts_loaded():
+    if reload_concept_data() or concept_index is not None:
+        for stage in ("concepts", "concept_index"):
+            if readiness.state(stage) != "done":
+                readiness.done(stage, f"第{concept_generation}代")
+
+
+def _start_changes_worker(buffer_queue):
+    global get_changes_proc, replay_status_data, worker_metrics_data
+    if get_changes_proc is not None and get_changes_proc.is_alive():
+        return "worker_queue 子进程已在运行，跳过启动"
+    if replay_status_data is None:
+        replay_status_data = VersionedSnapshot.create(capacity=4096)
+        replay_status_data.publish({"state": "idle"})
+    if worker_metrics_data is None:
+        worker_metrics_data = VersionedSnapshot.create(capacity=256 * 1024)
+    # worker进程按名称挂载同一块共享内存
     shared_picked_data_ref = get_shared_picked_data()
-    shared_picked_manager_ref = shared_picked_manager
-    
-    # 验证共享内存状态
-    if shared_picked_data_ref is not None and 'records' in shared_picked_data_ref:
-        logging.debug(f"[sidecar] 共享内存验证成功，records数量: {len(shared_picked_data_ref['records'])}")
-        # 额外验证：尝试从共享内存构建DataFrame
-        from services.pick_service import get_shared_picked_df
-        test_picked_df = get_shared_picked_df()
-        logging.debug(f"[sidecar] 共享内存DataFrame测试: {len(test_picked_df)}行, 列={list(test_picked_df.columns)}")
-        if not test_picked_df.empty:
-            logging.debug(f"[sidecar] 共享内存DataFrame测试成功，示例数据:\n{test_picked_df.head(2)}")
+    get_changes_proc = Process(
+        target=changes_worker,
+        args=(log_queue, log_level, buffer_queue),
+        kwargs={
+            "interval": 2,
+            "concept_store_dir": concept_store_dir,
+            "batch_interval": 300,
+            "shared_picked_data": shared_picked_data_ref,
+            "concept_generation_data": concept_generation_data,
+            "control_q": control_queue,
+            "replay_status_data": replay_status_data,
+            "metrics_data": worker_metrics_data,
+        },
+        daemon=True,
+    )
+    get_changes_proc.start()
+    return f"PID: {get_changes_proc.pid}"
+
+
+def stop_changes_worker(timeout=10):
+    """通知worker写完异动日志和热重启快照后退出，超时仍未退出时终止进程"""
+    global get_changes_proc
+    proc = get_changes_proc
+    if proc is None or not proc.is_alive():
+        return
+    if control_queue is not None:
+        control_queue.put({"type": "shutdown"})
+        proc.join(timeout)
+    if proc.is_alive():
+        logging.warning(f"[sidecar] worker_queue 子进程未在{timeout}秒内退出，强制终止")
+        proc.terminate()
+        proc.join(5)
+    get_changes_proc = None
+
+
+def shutdown_backend_services():
+    """API进程退出前：停止worker和后台任务，删除本进程创建的共享内存（否则每次运行都在 /dev/shm 留下一块）"""
+    global concept_generation_data, replay_status_data, worker_metrics_data
+    stop_changes_worker()
+    job_manager.shutdown()
+    for snapshot in (concept_generation_data, replay_status_data, worker_metrics_data):
+        if snapshot is not None:
+            snapshot.release()
+    concept_generation_data = replay_status_data = worker_metrics_data = None
+    release_shared_picked_data()
+
+
+def initialize_backend_services(buffer_queue: Queue, lq: Queue, level):
+    """
+    分阶段初始化后端服务，不等待耗时任务：
+
+    1. 加载精选列表、证券主表和已持久化的最新一代概念数据；
+    2. 立即启动worker开始实时轮询，并把当天已有的changes文件交给worker；
+    3. 构建搜索索引；
+    4. 首次获取概念数据、回补当天异动和刷新证券主表作为后台任务运行，完成后合并进来。
+
+    各阶段的状态和耗时通过 /api/ready 查询。
+    """
+    global concept_store_dir, control_queue, initialization_completed, log_queue, log_level
+    log_queue = lq  # Store the log queue globally for other functions to use
+    log_level = level # Store the log level globally
+    job_manager.start(log_queue, log_level)
+    for name, required in STARTUP_STAGES:
+        readiness.add(name, required)
+
+    logging.debug("[sidecar] 开始初始化后端服务...")
+    static_dir, concepts_path, concept_stocks_path = _get_concept_file_paths()
+    os.makedirs(static_dir, exist_ok=True)
+    concept_store_dir = get_concept_store_dir(static_dir)
+    current_date = get_latest_trade_date()
+    changes_path = os.path.join(static_dir, f"changes_{current_date}.csv")
+    control_queue = Queue()
+
+    def load_picked():
+        load_picked_data(static_dir)
+        return f"{force_sync_to_shared_memory()} 条记录"
+
+    _run_stage("picked", load_picked)
+    _run_stage("security_master", lambda: f"{len(get_security_master(static_dir))} 条证券")
+
+    concepts_loaded = _run_stage("concepts", lambda: _load_persisted_concepts(concepts_path, concept_stocks_path) or "")
+    if concepts_loaded and concept_df is None:
+        # 首次运行，概念数据在后台获取，完成后热切换进来
+        logging.info("[sidecar] 尚无概念数据，后台启动 getConcepts 任务")
+        readiness.begin("concepts", "等待首次获取概念数据")
+        readiness.begin("concept_index", "等待首次获取概念数据")
+        readiness.begin("concepts_refresh")
+        job, _ = _submit_get_concepts()
+        _after_job(job, "concepts_refresh")
     else:
-        logging.error("[sidecar] 共享内存验证失败，worker进程可能无法访问picked数据")
-        # 如果验证失败，尝试重新初始化
-        logging.debug("[sidecar] 尝试重新初始化共享内存...")
-        record_count = force_sync_to_shared_memory()
-        shared_picked_data_ref = get_shared_picked_data()
-        if shared_picked_data_ref is not None and 'records' in shared_picked_data_ref:
-            logging.debug(f"[sidecar] 重新初始化成功，records数量: {len(shared_picked_data_ref['records'])}")
-        else:
-            logging.error("[sidecar] 重新初始化仍然失败")
+        readiness.skip("concepts_refresh", "已有持久化的概念数据")
+    if concept_generation_data is None:
+        _publish_concept_generation()
 
-    if get_changes_proc is None or not get_changes_proc.is_alive():
-        try:
-            current_changes_df = None
-            if os.path.exists(changes_path):
-                logging.debug(f"[sidecar] 读取当前changes文件传递给worker: {changes_path}")
-                current_changes_df = pd.read_csv(changes_path)
-                current_changes_df = current_changes_df.fillna('').infer_objects(copy=False)
-                current_changes_df['板块代码'] = 'BK'
-                current_changes_df['板块名称'] = '未知板块'
-                standard_columns = ['股票代码','板块代码', '板块名称', '板块代码', '时间', '名称', '相关信息', '类型', '四舍五入取整', '上下午','标识']
-                if not all(col in current_changes_df.columns for col in standard_columns):
-                    logging.warning(f"[backend_service] changes文件字段{current_changes_df.columns}不匹配，将使用空DataFrame。")
-                    current_changes_df = pd.DataFrame(columns=standard_columns)
-            
-            # 注意：worker_queue.worker也需要修改以接受log_queue作为第一个参数
-            get_changes_proc = Process(
-                target=changes_worker,
-                args=(
-                    log_queue,  # 1. Pass the log queue to the worker
-                    log_level,
-                    buffer_queue,
-                    2,
-                    concept_df.copy() if concept_df is not None else None,
-                    current_changes_df.copy() if current_changes_df is not None else None,
-                    300,
-                    shared_picked_data_ref  # 传递共享数据引用
-                ),
-                daemon=True
-            )
-            get_changes_proc.start()
-            logging.debug(f"[sidecar] 已启动 worker_queue 子进程, PID: {get_changes_proc.pid}")
-        except Exception as e:
-            logging.error(f"[sidecar] 启动 worker_queue 子进程失败: {e}", exc_info=True)
+    _run_stage("worker", lambda: _start_changes_worker(buffer_queue))
+
+    if os.path.exists(changes_path):
+        control_queue.put({"type": "merge_changes", "path": changes_path})
+        readiness.skip("changes_backfill", f"已存在 {os.path.basename(changes_path)}")
     else:
-        logging.debug("[sidecar] worker_queue 子进程已在运行，跳过启动")
+        logging.debug("[sidecar] 当天的changes文件不存在，后台运行 prepareChanges...")
+        readiness.begin("changes_backfill")
+        prepare_job, _ = job_manager.submit(JOB_PREPARE_CHANGES, date_str=current_date)
+        _after_job(prepare_job, "changes_backfill",
+                   then=lambda: control_queue.put({"type": "merge_changes", "path": changes_path}))
+
+    if concept_df is not None:
+        _run_stage("concept_index", lambda: f"{len(rebuild_concept_index())} 只股票")
+
+    # 证券主表每天全量刷新一次，在后台进行，不阻塞启动
+    def refresh_master():
+        readiness.begin("security_master_refresh")
+        refresh_security_master_if_stale()
+        readiness.done("security_master_refresh")
+    threading.Thread(target=refresh_master, daemon=True).start()
+
+    # 以前交易日的回补文件和异动日志写入历史分区，已有分区的日期跳过
+    def ingest_history():
+        readiness.begin("history")
+        results = ingest_days(static_dir, before=current_date, concept_df=concept_df)
+        readiness.done("history", f"新增 {len(results)} 个分区")
+    threading.Thread(target=ingest_history, daemon=True).start()
 
     initialization_completed = True
-    logging.debug("[sidecar] 后端服务初始化完成")
+    logging.debug(f"[sidecar] 后端服务初始化完成: {readiness.snapshot()}")
+
 
+def get_readiness():
+    """各启动阶段的状态和耗时"""
+    return {"status": "success", "data": readiness.snapshot()}
 
-def start_get_concepts():
-    """启动获取概念数据的子进程"""
-    global get_concepts_proc, log_queue, log_level
+
+def start_get_concepts(incremental=False):
+    """提交获取概念数据的任务，incremental为True时只重新获取有变化的板块"""
     if log_queue is None:
         return {"status": "error", "message": "服务尚未初始化"}
-    
-    if get_concepts_proc is not None and get_concepts_proc.is_alive():
-        return {"status": "already running", "pid": get_concepts_proc.pid}
 
-    # For manual start, use default paths
-    static_dir, concepts_path, concept_stocks_path = _get_concept_file_paths()
-    
-    get_concepts_proc = Process(target=run_get_concepts, args=(log_queue, log_level, concepts_path, concept_stocks_path), daemon=True)
-    get_concepts_proc.start()
-    logging.info(f"Started getConcepts process with PID: {get_concepts_proc.pid}")
-    return {"status": "started", "pid": get_concepts_proc.pid}
+    job, created = _submit_get_concepts(incremental)
+    if not created:
+        return {"status": f"already {job.state}", "job_id": job.id, "message": "getConcepts任务已在执行中"}
+    return {"status": "started", "job_id": job.id, "message": "getConcepts任务已启动"}
 
 
-def queue_get_concepts():
-    """将getConcepts任务放入队列执行一次"""
-    global log_queue, log_level
+def queue_get_concepts(incremental=False):
+    """将getConcepts任务放入队列执行一次，已有同类任务排队或运行时不会重复提交"""
     if log_queue is None:
         return {"status": "error", "message": "服务尚未初始化"}
-        
+
     try:
-        # For queued execution, use default paths
-        static_dir, concepts_path, concept_stocks_path = _get_concept_file_paths()
-        
-        proc = Process(target=run_get_concepts, args=(log_queue, log_level, concepts_path, concept_stocks_path), daemon=True)
-        proc.start()
-        logging.info(f"[queue_get_concepts] 已将getConcepts任务加入队列执行，PID: {proc.pid}")
-        return {"status": "queued", "pid": proc.pid, "message": "getConcepts任务已加入队列执行"}
+        job, created = _submit_get_concepts(incremental)
+        if not created:
+            logging.info(f"[queue_get_concepts] getConcepts任务已存在: {job.id} ({job.state})")
+            return {"status": f"already {job.state}", "job_id": job.id, "message": "getConcepts任务已在执行中"}
+        logging.info(f"[queue_get_concepts] 已将getConcepts任务加入队列: {job.id}")
+        return {"status": "queued", "job_id": job.id, "message": "getConcepts任务已加入队列执行"}
     except Exception as e:
-        logging.error(f"[queue_get_concepts] 执行getConcepts任务失败: {e}", exc_info=True)
+        logging.error(f"[queue_get_concepts] 提交getConcepts任务失败: {e}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
 
+def get_concepts_progress():
+    """获取最近一次概念数据爬取任务的进度：已完成/总板块数、失败数和预计剩余时间"""
+    job = job_manager.latest(JOB_GET_CONCEPTS)
+    if job is None:
+        return {"status": "success", "data": {"state": "idle"}}
+    info = job.to_dict()
+    return {"status": "success", "data": {**info["progress"], "state": info["state"], "job_id": job.id}}
+
+
+def start_backfill_changes(start_date, end_date=None):
+    """提交回补日期区间内异动数据的任务"""
+    if log_queue is None:
+        return {"status": "error", "message": "服务尚未初始化"}
+    try:
+        dates = backfill_dates(start_date, end_date or start_date)
+    except ValueError as e:
+        return {"status": "error", "message": f"日期格式错误: {e}"}
+    if not dates:
+        return {"status": "error", "message": "日期区间内没有交易日"}
+    job, created = job_manager.submit(JOB_PREPARE_CHANGES, dates=dates)
+    if not created:
+        return {"status": f"already {job.state}", "job_id": job.id, "message": "回补任务已在执行中"}
+    return {"status": "queued", "job_id": job.id, "message": f"已提交 {len(dates)} 个交易日的回补任务"}
+
+
+def list_jobs():
+    """运行中、排队中和最近结束的后台任务"""
+    return {"status": "success", "data": job_manager.list()}
+
+
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"任务 {job_id} 不存在"}
+    return {"status": "success", "data": job.to_dict()}
+
+
+def cancel_job(job_id):
+    if job_manager.get(job_id) is None:
+        return {"status": "error", "message": f"任务 {job_id} 不存在"}
+    if not job_manager.cancel(job_id):
+        return {"status": "error", "message": f"任务 {job_id} 已结束，无法取消"}
+    return {"status": "success", "message": f"任务 {job_id} 已取消"}
+
+
 def search_concepts(query):
-    """搜索concept_df中的股票，直接从文件读取以获取完整数据"""
+    """在内存索引中搜索股票，按相关度返回前50条"""
     try:
         if not query:
             return {"status": "success", "data": []}
-
-        concepts_path = get_resource_path("concepts.csv")
-        concept_stocks_path = get_resource_path("concept_stocks.csv")
-        if concepts_path is None or concept_stocks_path is None:
-            return {"status": "error", "message": "概念数据文件路径未找到"}
-        
-        if not os.path.exists(concepts_path) or not os.path.exists(concept_stocks_path):
-            return {"status": "error", "message": "概念数据文件不存在"}
-
-        concepts_df_part = pd.read_csv(concepts_path)
-        concept_stocks_df = pd.read_csv(concept_stocks_path, dtype={'板块代码': str, '股票代码': str})
-        original_concept_df = pd.merge(concept_stocks_df, concepts_df_part, on='板块代码', how='left')
-        original_concept_df.dropna(subset=['板块名称'], inplace=True)
+        if concept_index is None:
+            return {"status": "error", "message": "概念数据未加载"}
 
         logging.debug(f"[api/concepts/search] 查询: '{query}'")
-        exact_match_df = original_concept_df[original_concept_df['股票代码'].astype(str) == query]
+        records = concept_index.search(query, limit=50)
+        logging.debug(f"[api/concepts/search] 搜索到 {len(records)} 条记录")
 
-        if not exact_match_df.empty:
-            results = exact_match_df[['股票代码', '板块代码', '板块名称']]
-            logging.debug(f"[api/concepts/search] 精确匹配到 {len(results)} 条记录")
-        else:
-            filtered_df = original_concept_df[
-                original_concept_df['股票代码'].astype(str).str.contains(query, na=False)
-            ]
-            results = filtered_df[['股票代码', '板块代码', '板块名称']].head(50)
-            logging.debug(f"[api/concepts/search] 模糊搜索到 {len(results)} 条记录")
-
-        results = results.fillna('')
-        stock_name = "未知"
-        try:
-            if len(query) == 6:
-                prefix = 'sz' if not query.startswith(('6', '8')) else 'sh' if query.startswith('6') else 'bj'
-                symbol = prefix + query
-                stock_info_df = ak.stock_individual_info_em(symbol=query)
-                # Find the value where item is '股票简称'
-                name_series = stock_info_df[stock_info_df['item'] == '股票简称']['value']
-                if not name_series.empty:
-                    stock_name = name_series.iloc[0]
-                    logging.debug(f"[search_concepts] 获取到股票名称: {stock_name}")
-                results['股票名称'] = stock_name
-        except Exception as e:
-            logging.warning(f"[search_concepts] 获取股票名称失败: {e}")
-            results['股票名称'] = stock_name
+        # 名称以证券主表为准，索引构建后新增的名称也能显示
+        names = get_security_master().names
+        for record in records:
+            record['股票名称'] = names.get(record['股票代码'], record['股票名称'])
 
-
-        records = results.to_dict('records')
-        records = clean_nan_values(records)
         return {"status": "success", "data": records}
     except Exception as e:
         logging.error(f"[api/concepts/search] 搜索失败: {e}", exc_info=True)
@@ -350,15 +506,11 @@ def search_concepts(query):
 
 
 def get_concept_sectors():
-    """获取concept_df中的所有板块"""
-    global concept_df
-    if concept_df is None or concept_df.empty:
+    """获取全部板块"""
+    if concept_index is None or len(concept_index) == 0:
         return {"status": "error", "message": "概念数据未加载"}
     try:
-        sectors = concept_df[['板块代码', '板块名称']].drop_duplicates()
-        sectors = sectors.fillna('').infer_objects(copy=False)
-        records = sectors.to_dict('records')
-        records = clean_nan_values(records)
+        records = concept_index.sectors()
         logging.debug(f"[api/concepts/sectors] 获取板块列表，共{len(records)}个板块")
         return {"status": "success", "data": records}
     except Exception as e:
@@ -367,15 +519,11 @@ def get_concept_sectors():
 
 
 def get_stock_sectors(stock_code):
-    """获取指定股票在concept_df中对应的所有板块"""
-    global concept_df
-    if concept_df is None or concept_df.empty:
+    """获取指定股票对应的所有板块"""
+    if concept_index is None or len(concept_index) == 0:
         return {"status": "error", "message": "概念数据未加载"}
     try:
-        stock_sectors = concept_df[concept_df['股票代码'] == stock_code][['板块代码', '板块名称']].drop_duplicates()
-        stock_sectors = stock_sectors.fillna('').infer_objects(copy=False)
-        records = stock_sectors.to_dict('records')
-        records = clean_nan_values(records)
+        records = concept_index.sectors_of(stock_code)
         logging.debug(f"[api/concepts/stock-sectors] 获取股票{stock_code}的板块列表，共{len(records)}个板块")
         return {"status": "success", "data": records}
     except Exception as e:
@@ -383,6 +531,179 @@ def get_stock_sectors(stock_code):
         return {"status": "error", "message": str(e)}
 
 
+def get_sector_stocks(sector_code):
+    """获取指定板块的全部成分股"""
+    if concept_index is None or len(concept_index) == 0:
+        return {"status": "error", "message": "概念数据未加载"}
+    if not concept_index.has_sector(sector_code):
+        return {"status": "error", "message": f"板块 {sector_code} 不存在"}
+    try:
+        sector_name = concept_index.sector_name(sector_code)
+        names = get_security_master().names
+        records = [
+            {'股票代码': code, '股票名称': names.get(code, ''), '板块代码': sector_code, '板块名称': sector_name}
+            for code in concept_index.stocks_of(sector_code)
+        ]
+        logging.debug(f"[api/concepts/sector-stocks] 获取板块{sector_code}的成分股，共{len(records)}只")
+        return {"status": "success", "data": records}
+    except Exception as e:
+        logging.error(f"[api/concepts/sector-stocks] 获取板块成分股失败: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+def query_history(start=None, end=None, stock=None, sector=None, types=None, columns=None, limit=None):
+    """按日期范围、股票、板块和类型查询历史异动"""
+    try:
+        history_dir = get_history_dir(setup_static_directory())
+        df, info = _query_history(history_dir, start, end, stock, sector, types, columns, limit or 5000)
+        logging.debug(f"[api/history] 查询 {start}-{end} stock={stock} sector={sector} types={types}: {info}")
+        return {"status": "success", "data": clean_nan_values(df.to_dict('records')), "meta": info}
+    except Exception as e:
+        logging.error(f"[api/history] 查询历史数据失败: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+def get_history_partitions():
+    """历史分区列表及各分区统计"""
+    history_dir = get_history_dir(setup_static_directory())
+    partitions = [read_partition_stats(history_dir, d) or {"date": d} for d in list_partitions(history_dir)]
+    return {"status": "success", "data": partitions}
+
+
+def export_changes(start, end=None, fmt="arrow", columns=None, stock=None, sector=None, types=None):
+    """准备流式导出；成功时 data 为 (字节块生成器, Content-Type, 文件名)"""
+    try:
+        stream = stream_export(setup_static_directory(), start, end, fmt, columns, stock, sector, types,
+                               current_date=get_latest_trade_date(), concept_df=concept_df)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    logging.debug(f"[api/export] 导出 {start}-{end or start} format={fmt} columns={columns}")
+    return {"status": "success", "data": stream}
+
+
+def start_replay(date_str, speed=1.0):
+    """让worker按 speed 倍速回放某一天的数据，speed<=0 表示不等待、全速回放"""
+    if control_queue is None or get_changes_proc is None or not get_changes_proc.is_alive():
+        return {"status": "error", "message": "worker_queue 未运行"}
+    if not (len(date_str) == 8 and date_str.isdigit()):
+        return {"status": "error", "message": "日期格式应为YYYYMMDD"}
+    control_queue.put({"type": "replay_start", "date": date_str, "speed": speed})
+    return {"status": "success", "message": f"已请求以 {speed}x 回放 {date_str}"}
+
+
+def stop_replay():
+    if control_queue is None:
+        return {"status": "error", "message": "worker_queue 未运行"}
+    control_queue.put({"type": "replay_stop"})
+    return {"status": "success", "message": "已请求停止回放"}
+
+
+def get_replay_status():
+    """回放进度和推送吞吐，由worker发布"""
+    if replay_status_data is None:
+        return {"status": "success", "data": {"state": "idle"}}
+    _, status = replay_status_data.read()
+    return {"status": "success", "data": status or {"state": "idle"}}
+
+
+def _record_api_memory():
+    """统计API进程各组件的内存占用并写入指标"""
+    components = {
+        "concept_df": memory_stats.frame_bytes(concept_df),
+        "concept_index": memory_stats.estimate_bytes(concept_index),
+        "picked_df": memory_stats.frame_bytes(get_current_picked_df()),
+        "log_buffer": memory_stats.estimate_bytes(log_ring_handler.buffer),
+    }
+    rows = {
+        "concept_df": len(concept_df) if concept_df is not None else 0,
+        "log_buffer": len(log_ring_handler.buffer),
+    }
+    return memory_stats.record_usage(components, rows)
+
+
+def get_memory():
+    """
+    API进程和worker进程的内存统计：各组件估算的字节数和行数、进程常驻内存和峰值，
+    worker部分取自最近一次发布的指标快照（每 MEMORY_INTERVAL 秒统计一次）
+    """
+    data = {"retention_rows": EVENT_RETENTION_ROWS, "api": _record_api_memory(), "worker": None}
+    if worker_metrics_data is not None:
+        _, worker_snapshot = worker_metrics_data.read()
+        if worker_snapshot:
+            data["worker"] = memory_stats.usage_from_snapshot(worker_snapshot)
+    return {"status": "success", "data": data}
+
+
+def get_metrics():
+    """API进程和worker进程的指标，data 为 Prometheus 文本格式"""
+    metrics.set_gauge("eastmoneywatch_worker_up", int(get_changes_proc is not None and get_changes_proc.is_alive()))
+    try:
+        _record_api_memory()
+    except Exception as e:
+        logging.debug(f"[sidecar] 统计API进程内存失败: {e}")
+    snapshots = [(metrics.snapshot(), {"process": "api"})]
+    if worker_metrics_data is not None:
+        _, worker_snapshot = worker_metrics_data.read()
+        snapshots.append((worker_snapshot, {"process": "worker"}))
+    return {"status": "success", "data": metrics.render_prometheus(snapshots)}
+
+
+def profile_process(target, mode="sample", duration=10.0):
+    """对worker或API进程做一次限时性能分析，阻塞到结果写出；成功时 data 为结果文件路径"""
+    if target not in PROFILE_TARGETS:
+        return {"status": "error", "message": f"target 应为 {'/'.join(PROFILE_TARGETS)}"}
+    if mode not in PROFILE_MODES:
+        return {"status": "error", "message": f"mode 应为 {'/'.join(PROFILE_MODES)}"}
+    if not 0 < duration <= MAX_PROFILE_SECONDS:
+        return {"status": "error", "message": f"duration 应在 (0, {MAX_PROFILE_SECONDS}] 秒之间"}
+    path = profile_path(setup_static_directory(), target, mode)
+
+    if target == "api":
+        # API进程的请求分散在事件循环和线程池中，cProfile只能覆盖单个线程
+        if mode != "sample":
+            return {"status": "error", "message": "API进程只支持 sample 模式"}
+        if not sample_for(duration, path):
+            return {"status": "error", "message": "API进程已有性能分析在运行"}
+        return {"status": "success", "data": path}
+
+    if control_queue is None or get_changes_proc is None or not get_changes_proc.is_alive():
+        return {"status": "error", "message": "worker_queue 未运行"}
+    control_queue.put({"type": "profile", "mode": mode, "duration": duration, "path": path})
+    # worker在tick之间处理控制消息，到期后最多再等一个慢tick
+    deadline = time.monotonic() + duration + 30
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            logging.info(f"[sidecar] worker性能分析完成: {path}")
+            return {"status": "success", "data": path}
+        time.sleep(0.2)
+    return {"status": "error", "message": "worker未按时写出分析结果，可能已有性能分析在运行"}
+
+
+def get_log_levels():
+    """API进程当前的日志级别配置"""
+    return {"status": "success", "data": current_levels()}
+
+
+def set_log_levels(levels):
+    """
+    运行时调整日志级别，levels 为 {模块名: 级别}，root 表示根级别，未给出时保持不变；
+    没有列出的模块恢复为跟随根级别。立即应用到API进程并推送给worker，之后启动的任务进程也使用新配置。
+    """
+    global log_level
+    try:
+        parsed = parse_levels(levels)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    parsed.setdefault("", logging.getLogger().level)
+    apply_levels(parsed)
+    log_level = parsed
+    job_manager.set_log_level(parsed)
+    if control_queue is not None and get_changes_proc is not None and get_changes_proc.is_alive():
+        control_queue.put({"type": "log_levels", "levels": parsed})
+    logging.info(f"[sidecar] 日志级别已调整: {current_levels()}")
+    return {"status": "success", "data": current_levels()}
+
+
 def get_watch_status(watch_process):
     """Get the status of the fluctuation watch process"""
     if watch_process is None:
@@ -0,0 +1,199 @@
+import bisect
+import logging
+from utils import pinyin_initials_variants
+
+
+# 搜索结果排序等级，数值越小越靠前
+RANK_CODE_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_INITIALS_PREFIX = 3
+RANK_SECTOR_NAME = 4
+RANK_CODE_SUBSTRING = 5
+
+
+def _prefix_scan(sorted_keys, values, prefix, limit):
+    """在有序列表中查找以prefix开头的项，返回对应values"""
+    matched = []
+    i = bisect.bisect_left(sorted_keys, prefix)
+    while i < len(sorted_keys) and sorted_keys[i].startswith(prefix) and len(matched) < limit:
+        matched.append(values[i])
+        i += 1
+    return matched
+
+
+class ConceptIndex:
+    """
+    概念板块数据的内存索引，每次加载概念数据时构建一次。
+
+    包含 股票->板块、板块->股票 两个倒排索引和预先计算好的板块列表，查询耗时只与结果数量有关；
+    同时支持股票代码精确/前缀/子串、股票名称前缀、板块名称子串和拼音首字母搜索，
+    查询只访问内存中的有序数组和字典，不读取磁盘。
+    """
+
+    def __init__(self, concept_df, stock_names=None):
+        self.stock_names = dict(stock_names or {})
+        self._stock_sectors = {}   # 股票代码 -> [(板块代码, 板块名称)]
+        self._sector_names = {}    # 板块代码 -> 板块名称
+        self._sector_stocks = {}   # 板块代码 -> [股票代码]
+
+        if concept_df is not None and not concept_df.empty:
+            pairs = concept_df[['股票代码', '板块代码', '板块名称']].dropna(subset=['板块名称']).drop_duplicates()
+            for code, sector_code, sector_name in zip(
+                pairs['股票代码'].astype(str), pairs['板块代码'].astype(str), pairs['板块名称'].astype(str)
+            ):
+                self._stock_sectors.setdefault(code, []).append((sector_code, sector_name))
+                self._sector_stocks.setdefault(sector_code, []).append(code)
+                self._sector_names[sector_code] = sector_name
+
+        self._finish()
+        logging.debug(f"[concept_index] 索引构建完成: {len(self._stock_sectors)}只股票, {len(self._sector_names)}个板块, {len(self.stock_names)}个股票名称")
+
+    def _finish(self):
+        self._sector_records = [{'板块代码': sc, '板块名称': name} for sc, name in self._sector_names.items()]
+        self._build_search_keys()
+
+    def _build_search_keys(self):
+        self._codes = sorted(self._stock_sectors)
+        named = [(name, code) for code, name in self.stock_names.items() if code in self._stock_sectors and name]
+        named.sort()
+        self._name_keys = [name for name, _ in named]
+        self._name_codes = [code for _, code in named]
+        # 多音字的每个读音都建立首字母键，任一读音的首字母都能搜到
+        initials = sorted({(key, code) for name, code in named for key in pinyin_initials_variants(name)})
+        self._initial_keys = [key for key, _ in initials]
+        self._initial_codes = [code for _, code in initials]
+
+    def apply_diff(self, added=(), removed=(), stock_names=None, renamed=()):
+        """
+        基于成员变化 [(板块代码, 板块名称, 股票代码)] 和板块改名 [(板块代码, 新名称)] 生成新的索引。
+
+        只复制受影响的股票和板块条目，原索引保持不变，可以在切换前继续被并发查询。
+        """
+        new = object.__new__(ConceptIndex)
+        new.stock_names = dict(stock_names) if stock_names is not None else self.stock_names
+        new._stock_sectors = dict(self._stock_sectors)
+        new._sector_stocks = dict(self._sector_stocks)
+        new._sector_names = dict(self._sector_names)
+
+        removed_by_stock, removed_by_sector = {}, {}
+        for sector_code, _, code in removed:
+            removed_by_stock.setdefault(code, set()).add(sector_code)
+            removed_by_sector.setdefault(sector_code, set()).add(code)
+        for code, sector_codes in removed_by_stock.items():
+            pairs = [pair for pair in new._stock_sectors.get(code, ()) if pair[0] not in sector_codes]
+            if pairs:
+                new._stock_sectors[code] = pairs
+            else:
+                new._stock_sectors.pop(code, None)
+        for sector_code, codes in removed_by_sector.items():
+            members = [code for code in new._sector_stocks.get(sector_code, ()) if code not in codes]
+            if members:
+                new._sector_stocks[sector_code] = members
+            else:
+                new._sector_stocks.pop(sector_code, None)
+                new._sector_names.pop(sector_code, None)
+
+        copied = set()
+        for sector_code, sector_name, code in added:
+            for index, key in ((new._stock_sectors, ('s', code)), (new._sector_stocks, ('b', sector_code))):
+                # 第一次修改某个条目时复制列表，避免改动原索引共享的列表
+                if key not in copied:
+                    index[key[1]] = list(index.get(key[1], ()))
+                    copied.add(key)
+            new._stock_sectors[code].append((sector_code, sector_name))
+            new._sector_stocks[sector_code].append(code)
+            new._sector_names[sector_code] = sector_name
+
+        for sector_code, sector_name in renamed:
+            if sector_code not in new._sector_names:
+                continue
+            new._sector_names[sector_code] = sector_name
+            # 成分股的板块列表整体替换为新列表，不修改原索引共享的列表
+            for code in new._sector_stocks[sector_code]:
+                new._stock_sectors[code] = [(sc, sector_name if sc == sector_code else name)
+                                            for sc, name in new._stock_sectors[code]]
+
+        new._finish()
+        logging.debug(f"[concept_index] 增量更新完成: 新增{len(added)}条, 移除{len(removed)}条, 改名{len(renamed)}个板块, "
+                      f"共{len(new._stock_sectors)}只股票")
+        return new
+
+    def __len__(self):
+        return len(self._stock_sectors)
+
+    def sectors(self):
+        """全部板块列表"""
+        return self._sector_records
+
+    def sectors_of(self, stock_code):
+        """股票所属的全部板块"""
+        return [{'板块代码': sc, '板块名称': name} for sc, name in self._stock_sectors.get(stock_code, ())]
+
+    def stocks_of(self, sector_code):
+        """板块的全部成分股代码"""
+        return list(self._sector_stocks.get(sector_code, ()))
+
+    def has_sector(self, sector_code):
+        return sector_code in self._sector_names
+
+    def sector_name(self, sector_code, default=''):
+        return self._sector_names.get(sector_code, default)
+
+    def _record(self, code, sector_code, sector_name):
+        return {
+            '股票代码': code,
+            '板块代码': sector_code,
+            '板块名称': sector_name,
+            '股票名称': self.stock_names.get(code, ''),
+        }
+
+    def search(self, query, limit=50):
+        """按相关度返回最多limit条 股票-板块 记录"""
+        query = (query or '').strip()
+        if not query:
+            return []
+
+        # 精确匹配股票代码时返回该股票的全部板块
+        if query in self._stock_sectors:
+            return [self._record(query, *pair) for pair in self._stock_sectors[query]]
+
+        best = {}  # 股票代码 -> 排序等级
+        sector_hits = []
+
+        def collect(codes, rank):
+            for code in codes:
+                if code not in best or rank < best[code]:
+                    best[code] = rank
+
+        collect(_prefix_scan(self._codes, self._codes, query, limit), RANK_CODE_PREFIX)
+        collect(_prefix_scan(self._name_keys, self._name_codes, query, limit), RANK_NAME_PREFIX)
+        if query.isascii() and query.isalpha():
+            collect(_prefix_scan(self._initial_keys, self._initial_codes, query.lower(), limit), RANK_INITIALS_PREFIX)
+        if not query.isdigit():
+            # 板块名称子串匹配，字母不区分大小写（5G概念、AI芯片、ST板块等）
+            folded = query.lower()
+            sector_hits = [sc for sc, name in self._sector_names.items() if folded in name.lower()]
+        if query.isdigit() and len(best) < limit:
+            collect([code for code in self._codes if query in code and code not in best][:limit - len(best)],
+                    RANK_CODE_SUBSTRING)
+
+        ranked = sorted(best, key=lambda c: (best[c], c))
+        results = []
+
+        def emit(rows):
+            for row in rows:
+                results.append(row)
+                if len(results) >= limit:
+                    return True
+            return False
+
+        stocks_before = (self._record(c, *pair) for c in ranked if best[c] < RANK_SECTOR_NAME
+                         for pair in self._stock_sectors[c])
+        sector_members = (self._record(c, sc, self._sector_names[sc]) for sc in sector_hits
+                          for c in self._sector_stocks[sc])
+        stocks_after = (self._record(c, *pair) for c in ranked if best[c] > RANK_SECTOR_NAME
+                        for pair in self._stock_sectors[c])
+        for rows in (stocks_before, sector_members, stocks_after):
+            if emit(rows):
+                break
+        return results
@@ -0,0 +1,116 @@
+import logging
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from history_store import get_history_dir, has_partition, scan_batches, live_day_batches, output_schema
+
+
+# 导出格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+EXPORT_BATCH_SIZE = 4096
+
+
+class _ChunkSink:
+    """供pyarrow写入的最小文件对象：写入的字节暂存起来，由生成器在每个批次后取走"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _serialize(batches, schema, fmt):
+    """把RecordBatch迭代器编码为Arrow IPC流或Parquet文件，逐批产出字节块"""
+    sink = _ChunkSink()
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+
+        def write(batch):
+            writer.write_batch(batch, row_group_size=batch.num_rows)
+    rows = 0
+    try:
+        for batch in batches:
+            write(batch)
+            rows += batch.num_rows
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
+    logging.info(f"[export] 导出完成，共{rows}条记录")
+
+
+def _batches(static_dir, start, end, stock, sector, types, columns, live_batches):
+    yield from scan_batches(get_history_dir(static_dir), start, end, stock, sector, types, columns,
+                            batch_size=EXPORT_BATCH_SIZE)
+    # 当天数据还没有写入历史分区，从回补文件和异动日志读取；过滤条件在内存中应用
+    for batch in live_batches:
+        yield _filter_live(batch, stock, sector, types).select(output_schema(columns).names)
+
+
+def _filter_live(batch, stock, sector, types):
+    mask = None
+    conditions = []
+    if stock:
+        conditions.append(pc.equal(batch.column('股票代码'), stock))
+    if types:
+        conditions.append(pc.is_in(batch.column('类型'), value_set=pa.array(list(types))))
+    if sector:
+        conditions.append(pc.or_(pc.equal(batch.column('板块代码'), sector), pc.equal(batch.column('板块名称'), sector)))
+    for condition in conditions:
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return batch if mask is None else batch.filter(mask)
+
+
+def stream_export(static_dir, start, end=None, fmt="arrow", columns=None, stock=None, sector=None, types=None,
+                  current_date=None, concept_df=None):
+    """
+    导出日期区间（含两端）内补充过板块信息的异动数据，返回 (字节块生成器, Content-Type, 文件名)。
+
+    历史分区逐批扫描、逐批编码，API进程中同一时间只有一个批次；区间包含尚未写入分区的当天时一并导出，
+    当天数据需要整天读入，超过 history_store.LIVE_DAY_MAX_ROWS 行时抛出 ValueError。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}，可选 {', '.join(EXPORT_FORMATS)}")
+    end = end or start
+    if not (len(start) == len(end) == 8 and start.isdigit() and end.isdigit()):
+        raise ValueError("日期格式应为YYYYMMDD")
+    if start > end:
+        raise ValueError("开始日期晚于结束日期")
+    live_batches = ()
+    if current_date and start <= current_date <= end and not has_partition(get_history_dir(static_dir), current_date):
+        live_batches = live_day_batches(static_dir, current_date, concept_df, batch_size=EXPORT_BATCH_SIZE)
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"changes_{start}.{extension}" if start == end else f"changes_{start}_{end}.{extension}"
+    batches = _batches(static_dir, start, end, stock, sector, types, columns, live_batches)
+    return _serialize(batches, output_schema(columns), fmt), media_type, filename
@@ -0,0 +1,281 @@
+import os
+import itertools
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+from multiprocessing import Process
+
+from shared_snapshot import VersionedSnapshot
+
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_ACTIVE_STATES = (QUEUED, RUNNING)
+HEAVY_NICE = 10  # 重任务子进程的nice值，避免与实时异动处理争抢CPU
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _run_job(target, nice, log_q, level, progress_data, params):
+    """子进程入口：降低调度优先级后运行任务函数"""
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+    target(log_q, level, progress_data=progress_data, **params)
+
+
+class JobType:
+    """一类后台任务：子进程入口函数、是否为重任务以及成功后在主进程中执行的回调"""
+
+    def __init__(self, name, target, heavy=False, on_success=None):
+        self.name = name
+        self.target = target
+        self.heavy = heavy
+        self.on_success = on_success
+        self.progress_data = None  # 同类任务单飞，同一时间只有一个任务写入，可以复用
+
+
+class Job:
+    def __init__(self, job_id, job_type: JobType, params):
+        self.id = job_id
+        self.type = job_type
+        self.params = params
+        self.state = QUEUED
+        self.created = _now()
+        self.started = None
+        self.finished = None
+        self.proc = None
+        self.exitcode = None
+        self.message = ''
+        self.progress = {}
+        self.cancelling = False  # 已请求终止；进程退出后由 cancel() 或调度线程记为已取消
+        self.done = threading.Event()
+
+    def to_dict(self):
+        progress = self.progress
+        if self.state == RUNNING and self.type.progress_data is not None:
+            _, progress = self.type.progress_data.read()
+        return {
+            "id": self.id,
+            "type": self.type.name,
+            "state": self.state,
+            "params": self.params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "pid": self.proc.pid if self.proc is not None else None,
+            "exitcode": self.exitcode,
+            "message": self.message,
+            "progress": progress or {},
+        }
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class JobManager:
+    """
+    后台任务管理器：先进先出队列，同一类任务单飞，并限制并发数量。
+
+    每个任务在独立子进程中运行，重任务（如概念爬取）同一时间最多运行 max_heavy 个，且以较低优先级运行；
+    任务进度通过每类任务一个的共享快照发布，已结束的任务保留在有限长度的历史记录中。
+    """
+
+    def __init__(self, max_heavy=1, max_light=2, history_size=50):
+        self.max_heavy = max_heavy
+        self.max_light = max_light
+        self._types = {}
+        self._queue = deque()
+        self._running = {}
+        self._jobs = {}
+        self._history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._log_q = None
+        self._log_level = logging.INFO
+        self._scheduler = None
+
+    def register(self, name, target, heavy=False, on_success=None):
+        """注册任务类型；target(log_q, level, progress_data=..., **params) 在子进程中执行"""
+        self._types[name] = JobType(name, target, heavy, on_success)
+
+    def start(self, log_q, log_level):
+        with self._cond:
+            self._log_q = log_q
+            self._log_level = log_level
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._schedule_loop, name="job-scheduler", daemon=True)
+                self._scheduler.start()
+
+    def set_log_level(self, log_level):
+        """之后启动的任务进程使用新的日志级别配置"""
+        with self._cond:
+            self._log_level = log_level
+
+    def submit(self, name, **params):
+        """提交任务，同类任务已在排队或运行时返回已有任务；返回 (job, created)"""
+        job_type = self._types[name]
+        with self._cond:
+            for job in itertools.chain(self._running.values(), self._queue):
+                if job.type is job_type:
+                    return job, False
+            job = Job(f"{name}-{next(self._ids)}", job_type, params)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._cond.notify_all()
+        logging.info(f"[job_manager] 任务 {job.id} 已加入队列")
+        return job, True
+
+    def cancel(self, job_id):
+        """取消排队中的任务或终止运行中的任务，返回是否成功"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in _ACTIVE_STATES:
+                return False
+            if job.state == QUEUED:
+                self._queue.remove(job)
+                self._finish(job, CANCELLED, "排队中被取消")
+                return True
+            # 先在锁内标记，调度线程在终止期间回收进程时同样记为已取消，而不是退出码非0的失败
+            job.cancelling = True
+            proc = job.proc
+        logging.info(f"[job_manager] 终止任务 {job_id}, PID: {proc.pid}")
+        proc.terminate()
+        proc.join(5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+        # 由调度线程回收并记录结果，成功回调也只在那里执行；调度线程没有及时回收时在这里记录
+        with self._cond:
+            self._cond.notify_all()
+        if not job.wait(2):
+            with self._cond:
+                if job.state == RUNNING:
+                    self._running.pop(job.id, None)
+                    self._finish_exited(job)
+        # 终止前任务已经正常结束时不算取消
+        return job.state == CANCELLED
+
+    def shutdown(self):
+        """API进程退出时终止运行中的任务并删除各类任务的进度共享内存"""
+        with self._cond:
+            running = list(self._running)
+        for job_id in running:
+            self.cancel(job_id)
+        for job_type in self._types.values():
+            if job_type.progress_data is not None:
+                job_type.progress_data.release()
+                job_type.progress_data = None
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self, name):
+        """某类任务最近一次提交的任务"""
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if job.type.name == name]
+        return jobs[-1] if jobs else None
+
+    def list(self):
+        """运行中、排队中和历史任务，最新的在前"""
+        with self._cond:
+            jobs = list(self._running.values()) + list(self._queue) + list(reversed(self._history))
+        return [job.to_dict() for job in jobs]
+
+    # --- 调度 ---
+
+    def _slots_free(self, job_type):
+        running = [job for job in self._running.values() if job.type.heavy == job_type.heavy]
+        return len(running) < (self.max_heavy if job_type.heavy else self.max_light)
+
+    def _launch(self, job):
+        job_type = job.type
+        if job_type.progress_data is None:
+            job_type.progress_data = VersionedSnapshot.create(capacity=4096)
+        job_type.progress_data.publish({})
+        job.proc = Process(
+            target=_run_job,
+            args=(job_type.target, HEAVY_NICE if job_type.heavy else 0, self._log_q, self._log_level,
+                  job_type.progress_data, job.params),
+            daemon=True,
+        )
+        job.proc.start()
+        job.state = RUNNING
+        job.started = _now()
+        self._running[job.id] = job
+        logging.info(f"[job_manager] 任务 {job.id} 开始运行, PID: {job.proc.pid}")
+
+    def _finish(self, job, state, message='', exitcode=None):
+        if job.type.progress_data is not None and job.state == RUNNING:
+            _, job.progress = job.type.progress_data.read()
+        job.state = state
+        job.exitcode = exitcode
+        job.message = message
+        job.finished = _now()
+        self._history.append(job)
+        # 历史记录之外的已结束任务不再保留
+        for job_id in [jid for jid, j in self._jobs.items() if j.state not in _ACTIVE_STATES and j not in self._history]:
+            del self._jobs[job_id]
+        job.done.set()
+        logging.info(f"[job_manager] 任务 {job.id} 结束: {state} {message}")
+
+    def _reap(self):
+        """回收已退出的子进程，返回成功结束的任务"""
+        succeeded = []
+        for job in list(self._running.values()):
+            if job.proc.exitcode is None:
+                continue
+            job.proc.join()
+            del self._running[job.id]
+            if self._finish_exited(job):
+                succeeded.append(job)
+        return succeeded
+
+    def _finish_exited(self, job):
+        """按退出码和是否已请求取消记录已退出任务的结果，返回是否成功结束"""
+        exitcode = job.proc.exitcode
+        if exitcode == 0:
+            self._finish(job, SUCCEEDED, exitcode=0)
+            return True
+        if job.cancelling:
+            self._finish(job, CANCELLED, "运行中被取消", exitcode)
+        else:
+            self._finish(job, FAILED, f"退出码 {exitcode}", exitcode)
+        return False
+
+    def _schedule_loop(self):
+        while True:
+            with self._cond:
+                succeeded = self._reap()
+                for job in list(self._queue):
+                    if self._slots_free(job.type):
+                        self._queue.remove(job)
+                        try:
+                            self._launch(job)
+                        except Exception as e:
+                            logging.error(f"[job_manager] 启动任务 {job.id} 失败: {e}", exc_info=True)
+                            self._finish(job, FAILED, str(e))
+                self._cond.wait(0.5)
+            for job in succeeded:
+                if job.type.on_success is not None:
+                    threading.Thread(target=self._run_callback, args=(job,), daemon=True).start()
+
+    @staticmethod
+    def _run_callback(job):
+        try:
+            job.type.on_success(job)
+        except Exception as e:
+            logging.error(f"[job_manager] 任务 {job.id} 完成回调失败: {e}", exc_info=True)
+
+
+job_manager = JobManager()
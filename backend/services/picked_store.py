@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import logging
+import pandas as pd
+
+
+PICKED_COLUMNS = ['股票代码', '股票名称', '板块代码', '板块名称']
+
+# 数据库列名与对外字段名的对应关系
+_DB_COLUMNS = ['code', 'name', 'sector_code', 'sector_name']
+
+# meta表中记录已完成的迁移，导入失败时没有该记录，下次打开时重试
+CSV_MIGRATION = "picked_csv"
+
+
+class PickedStore:
+    """
+    精选股票存储：内存中按股票代码和板块建立索引，持久化到 WAL 模式的 SQLite。
+
+    每次变更都在一个事务内只写受影响的行，提交成功后再更新内存索引，
+    因此不会再整文件重写 picked.csv，读取方也不会看到写了一半的数据。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._rows = {}          # 股票代码 -> 记录
+        self._seq = {}           # 股票代码 -> seq，越大越新
+        self._by_sector_name = {}  # 板块名称 -> {股票代码}
+        self._by_sector_code = {}  # 板块代码 -> {股票代码}
+        self._next_seq = 1
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS picked ("
+            "code TEXT PRIMARY KEY, name TEXT, sector_code TEXT, sector_name TEXT, seq INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._load()
+
+    # --- 内部方法 ---
+
+    def _load(self):
+        cursor = self._conn.execute(f"SELECT {', '.join(_DB_COLUMNS)}, seq FROM picked ORDER BY seq")
+        for row in cursor:
+            self._index(dict(zip(PICKED_COLUMNS, row[:4])), row[4])
+        logging.debug(f"[picked_store] 从 {self.db_path} 加载 {len(self._rows)} 条精选记录")
+
+    def _index(self, record, seq):
+        code = record['股票代码']
+        self._rows[code] = record
+        self._seq[code] = seq
+        self._by_sector_name.setdefault(record['板块名称'], set()).add(code)
+        self._by_sector_code.setdefault(record['板块代码'], set()).add(code)
+        self._next_seq = max(self._next_seq, seq + 1)
+
+    def _unindex(self, code):
+        record = self._rows.pop(code)
+        self._seq.pop(code, None)
+        for index, key in ((self._by_sector_name, record['板块名称']), (self._by_sector_code, record['板块代码'])):
+            codes = index.get(key)
+            if codes is not None:
+                codes.discard(code)
+                if not codes:
+                    del index[key]
+        return record
+
+    @staticmethod
+    def _normalize(record):
+        normalized = {col: '' if record.get(col) is None else str(record.get(col)) for col in PICKED_COLUMNS}
+        if not normalized['股票名称']:
+            normalized['股票名称'] = normalized['股票代码']
+        return normalized
+
+    def _db_upsert(self, record, seq):
+        self._conn.execute(
+            "INSERT INTO picked (code, name, sector_code, sector_name, seq) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(code) DO UPDATE SET name=excluded.name, sector_code=excluded.sector_code, "
+            "sector_name=excluded.sector_name, seq=excluded.seq",
+            [record[col] for col in PICKED_COLUMNS] + [seq],
+        )
+
+    def _db_delete(self, codes):
+        self._conn.executemany("DELETE FROM picked WHERE code = ?", [(code,) for code in codes])
+
+    # --- 查询 ---
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, code):
+        return code in self._rows
+
+    def get(self, code):
+        return self._rows.get(code)
+
+    def codes_in_sector_name(self, sector_name):
+        return set(self._by_sector_name.get(sector_name, ()))
+
+    def codes_in_sector_code(self, sector_code):
+        return set(self._by_sector_code.get(sector_code, ()))
+
+    def records(self):
+        """所有记录的副本，最新添加的在前"""
+        with self._lock:
+            codes = sorted(self._rows, key=self._seq.__getitem__, reverse=True)
+            return [dict(self._rows[code]) for code in codes]
+
+    def to_frame(self):
+        return pd.DataFrame(self.records(), columns=PICKED_COLUMNS)
+
+    # --- 变更 ---
+
+    def upsert(self, record):
+        """新增或覆盖一只股票，已存在时保留原有位置；返回是否为新增"""
+        record = self._normalize(record)
+        code = record['股票代码']
+        with self._lock:
+            created = code not in self._rows
+            seq = self._next_seq if created else self._seq[code]
+            self._db_upsert(record, seq)
+            if not created:
+                self._unindex(code)
+            self._index(record, seq)
+            return created
+
+    def update(self, code, record):
+        """更新已有股票，允许修改股票代码；股票不存在时返回False"""
+        record = self._normalize(record)
+        with self._lock:
+            if code not in self._rows:
+                return False
+            seq = self._seq[code]
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if record['股票代码'] != code:
+                    self._db_delete([code])
+                self._db_upsert(record, seq)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._unindex(code)
+            if record['股票代码'] in self._rows:
+                self._unindex(record['股票代码'])
+            self._index(record, seq)
+            return True
+
+    def delete(self, codes):
+        """删除一组股票代码，返回实际删除的数量"""
+        with self._lock:
+            codes = [code for code in codes if code in self._rows]
+            if not codes:
+                return 0
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._db_delete(codes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for code in codes:
+                self._unindex(code)
+            return len(codes)
+
+    def apply_batch(self, upserts=(), deletes=()):
+        """在一个事务内应用一批新增/覆盖和删除，返回 (新增数, 更新数, 删除数)"""
+        # 同一批次内重复的股票代码以最后一条为准
+        upserts = list({r['股票代码']: r for r in map(self._normalize, upserts)}.values())
+        with self._lock:
+            deletes = [code for code in dict.fromkeys(deletes) if code in self._rows]
+            planned = []
+            next_seq = self._next_seq
+            for record in upserts:
+                code = record['股票代码']
+                if code in self._seq:
+                    planned.append((record, self._seq[code], False))
+                else:
+                    planned.append((record, next_seq, True))
+                    next_seq += 1
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if deletes:
+                    self._db_delete(deletes)
+                for record, seq, _ in planned:
+                    self._db_upsert(record, seq)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            for code in deletes:
+                self._unindex(code)
+            created = updated = 0
+            for record, seq, is_new in planned:
+                code = record['股票代码']
+                if code in self._rows:
+                    self._unindex(code)
+                self._index(record, seq)
+                created += is_new
+                updated += not is_new
+            return created, updated, len(deletes)
+
+    def migrated(self, name):
+        """迁移 name 是否已经完成"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (name,)).fetchone() is not None
+
+    def import_frame(self, df, migration=None):
+        """
+        将旧的picked.csv内容导入，库中已有的股票保留库中的记录；
+        给出 migration 时在同一事务中记录该迁移已完成。
+        """
+        with self._lock:
+            records = [self._normalize(r) for r in df.to_dict('records') if r.get('股票代码')]
+            records = [r for r in records if r['股票代码'] not in self._rows]
+            # CSV中最新添加的在最前面，导入时按从旧到新分配seq
+            records.reverse()
+            seqs = range(self._next_seq, self._next_seq + len(records))
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record, seq in zip(records, seqs):
+                    self._db_upsert(record, seq)
+                if migration:
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (migration,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for record, seq in zip(records, seqs):
+                if record['股票代码'] in self._rows:
+                    self._unindex(record['股票代码'])
+                self._index(record, seq)
+            return len(records)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_picked_store(static_dir):
+    """打开static目录下的picked.db，picked.csv 还没有成功迁移过时导入其中的数据"""
+    db_path = os.path.join(static_dir, "picked.db")
+    csv_path = os.path.join(static_dir, "picked.csv")
+    store = PickedStore(db_path)
+    if os.path.exists(csv_path) and not store.migrated(CSV_MIGRATION):
+        try:
+            try:
+                df = pd.read_csv(csv_path, dtype={'股票代码': str, '板块代码': str}).fillna('')
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=PICKED_COLUMNS)
+            count = store.import_frame(df, migration=CSV_MIGRATION)
+            logging.info(f"[picked_store] 已从 {csv_path} 迁移 {count} 条精选记录到 {db_path}")
+        except Exception as e:
+            logging.error(f"[picked_store] 迁移picked.csv失败: {e}", exc_info=True)
+    return store
@@ -0,0 +1,82 @@
+import time
+import threading
+import logging
+from datetime import datetime
+
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Readiness:
+    """
+    分阶段启动的状态记录：每个阶段的状态、开始/结束时间和耗时。
+
+    required 阶段全部完成（或跳过）后服务即视为就绪，其余阶段（回补、刷新）在后台继续运行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = time.monotonic()
+
+    def add(self, name, required=True):
+        with self._lock:
+            self._stages.setdefault(name, {
+                "name": name, "state": PENDING, "required": required,
+                "started": None, "finished": None, "duration_ms": None, "message": '',
+                "_t0": None,
+            })
+
+    def _update(self, name, state, message=''):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                return
+            now = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+            if state == RUNNING:
+                stage["started"] = now
+                stage["_t0"] = time.monotonic()
+            else:
+                stage["finished"] = now
+                if stage["_t0"] is not None:
+                    stage["duration_ms"] = round((time.monotonic() - stage["_t0"]) * 1000, 1)
+            stage["state"] = state
+            stage["message"] = message
+        if state == FAILED:
+            logging.error(f"[readiness] 启动阶段 {name} 失败: {message}")
+        else:
+            logging.debug(f"[readiness] 启动阶段 {name}: {state} {message}")
+
+    def begin(self, name, message=''):
+        self._update(name, RUNNING, message)
+
+    def done(self, name, message=''):
+        self._update(name, DONE, message)
+
+    def fail(self, name, message=''):
+        self._update(name, FAILED, message)
+
+    def skip(self, name, message=''):
+        self._update(name, SKIPPED, message)
+
+    def state(self, name):
+        with self._lock:
+            stage = self._stages.get(name)
+            return stage["state"] if stage else None
+
+    def snapshot(self):
+        with self._lock:
+            stages = [{k: v for k, v in stage.items() if not k.startswith('_')} for stage in self._stages.values()]
+        ready = all(s["state"] in (DONE, SKIPPED) for s in stages if s["required"])
+        return {
+            "ready": ready,
+            "uptime_seconds": round(time.monotonic() - self._started, 1),
+            "stages": stages,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,119 @@
+import json
+import time
+import struct
+import threading
+import logging
+from multiprocessing import shared_memory
+
+
+# 共享内存布局: [sequence:u64][length:u64][payload]
+# sequence 是顺序锁计数：写入前加1变为奇数，写完再加1变回偶数，已发布的版本号为 sequence // 2。
+# 计数通过按本机字节序cast的memoryview读写，对齐的8字节一次完成；struct按字节写入，读取方可能看到写了一半的计数
+_HEADER = struct.Struct('<QQ')
+_LENGTH = struct.Struct('<Q')
+DEFAULT_CAPACITY = 1 << 20  # 1MB
+READ_RETRY_SLEEP = 0.0005  # 读到写入中的数据时，重试前等待的秒数
+
+
+class VersionedSnapshot:
+    """
+    基于共享内存的版本化只读快照，单写多读。
+
+    写入方按顺序锁的方式更新：计数变为奇数、写入数据、计数变为偶数；读取方在拷贝数据前后各读一次计数，
+    两次相同且为偶数才接受，否则重试，不会读到写了一半的数据。
+    读取方只需读取8字节版本号即可判断数据是否变化，版本未变时无需任何拷贝或IPC。
+    对象可以直接作为 Process 参数传递，子进程中会按名称重新挂载同一块共享内存。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._seq = shm.buf[:8].cast('Q')
+        self.capacity = capacity
+        self.owner = owner
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, capacity: int = DEFAULT_CAPACITY) -> "VersionedSnapshot":
+        """创建新的共享内存快照（由写入方进程调用）"""
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity)
+        _HEADER.pack_into(shm.buf, 0, 0, 0)
+        logging.debug(f"[shared_snapshot] 创建共享内存快照: name={shm.name}, capacity={capacity}")
+        return cls(shm, capacity, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "VersionedSnapshot":
+        """按名称挂载已存在的共享内存快照（由读取方进程调用）"""
+        shm = shared_memory.SharedMemory(name=name)
+        capacity = shm.size - _HEADER.size
+        return cls(shm, capacity, owner=False)
+
+    def __reduce__(self):
+        return (VersionedSnapshot.attach, (self.name,))
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _sequence(self) -> int:
+        return self._seq[0]
+
+    @property
+    def version(self) -> int:
+        """当前已发布的版本号，0表示尚未发布过；写入过程中仍是上一个版本"""
+        return self._sequence() // 2
+
+    def publish(self, obj) -> int:
+        """发布新快照，返回新版本号"""
+        payload = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.capacity:
+            raise ValueError(f"快照大小 {len(payload)} 超过共享内存容量 {self.capacity}")
+
+        with self._lock:
+            sequence = self._sequence()
+            self._seq[0] = sequence + 1
+            _LENGTH.pack_into(self._buf, 8, len(payload))
+            self._buf[_HEADER.size:_HEADER.size + len(payload)] = payload
+            self._seq[0] = sequence + 2
+        return (sequence + 2) // 2
+
+    def read(self, retries: int = 100):
+        """读取当前快照，返回 (version, obj)；尚未发布时返回 (0, None)"""
+        for attempt in range(retries):
+            if attempt:
+                time.sleep(READ_RETRY_SLEEP)
+            s1 = self._sequence()
+            if s1 == 0:
+                return 0, None
+            if s1 & 1:
+                continue
+            length = _LENGTH.unpack_from(self._buf, 8)[0]
+            payload = bytes(self._buf[_HEADER.size:_HEADER.size + min(length, self.capacity)])
+            if self._sequence() != s1:
+                continue
+            try:
+                return s1 // 2, json.loads(payload.decode('utf-8'))
+            except ValueError:
+                # 计数检查之外的兜底：解码失败同样视为读到了不完整的数据
+                continue
+        raise RuntimeError("读取共享快照失败：写入过于频繁")
+
+    def close(self):
+        self._seq.release()
+        self._buf = None
+        self._shm.close()
+
+    def __del__(self):
+        # 计数视图引用着共享内存，先于 SharedMemory 的析构释放，否则其 close() 报 BufferError
+        seq = getattr(self, "_seq", None)
+        if seq is not None:
+            seq.release()
+
+    def unlink(self):
+        if self.owner:
+            self._shm.unlink()
+
+    def release(self):
+        """写入方退出时调用：关闭并删除共享内存，已挂载的进程仍可继续读取到各自关闭为止"""
+        self.close()
+        self.unlink()
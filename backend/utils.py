@@ -5,6 +5,9 @@ import pandas as pd
 from datetime import datetime
 import akshare as ak
 import logging
+import threading
+import itertools
+import time
 
 def is_trading_time():
     """判断当前是否为交易日且在交易时间内"""
@@ -77,6 +80,98 @@ def get_latest_trade_date():
         logging.debug(f"[worker_queue] 获取最新交易日失败: {e}，使用当前日期")
         return datetime.now().strftime("%Y%m%d")
 
+# GB2312一级汉字按拼音排序，每个声母区间的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+_GB2312_LEVEL1_END = 0xD7F9
+# 按编码区间只能得到一个读音，股票和板块名称中常见的多音字列出全部读音的首字母，第一个为默认读音
+_HETERONYM_INITIALS = {
+    '行': 'hx',  # 银行、行业 / 出行
+    '重': 'zc',  # 重工、重汽 / 重庆
+    '藏': 'zc',  # 西藏 / 收藏
+    '调': 'td',  # 空调 / 调味
+    '长': 'cz',  # 长城、长江 / 成长
+    '乐': 'ly',  # 快乐 / 音乐
+    '厦': 'xs',  # 厦门 / 大厦
+    '朝': 'cz',  # 朝阳 / 朝鲜
+}
+MAX_INITIALS_VARIANTS = 8  # 一个名称最多生成的首字母组合数
+
+
+def _char_initials(ch):
+    """单个字符可能的拼音首字母，第一个为默认读音；忽略的字符返回空字符串"""
+    if ch.isascii():
+        return ch.lower() if ch.isalnum() else ''
+    if ch in _HETERONYM_INITIALS:
+        return _HETERONYM_INITIALS[ch]
+    try:
+        encoded = ch.encode('gb2312')
+    except UnicodeEncodeError:
+        return ''
+    if len(encoded) != 2:
+        return ''
+    code = (encoded[0] << 8) | encoded[1]
+    if code < _GB2312_INITIALS[0][0] or code > _GB2312_LEVEL1_END:
+        return ''
+    initial = _GB2312_INITIALS[0][1]
+    for start, letter in _GB2312_INITIALS:
+        if code < start:
+            break
+        initial = letter
+    return initial
+
+
+def pinyin_initials(text: str) -> str:
+    """获取中文字符串的拼音首字母（小写），多音字取默认读音
+
+    基于GB2312一级汉字的拼音排序，常见多音字的读音见 _HETERONYM_INITIALS，
+    二级汉字和无法编码的字符会被忽略，字母和数字原样保留。
+
+    >>> pinyin_initials('平安银行'), pinyin_initials('招商银行'), pinyin_initials('三一重工')
+    ('payh', 'zsyh', 'syzg')
+    """
+    return ''.join(options[0] for options in map(_char_initials, text or '') if options)
+
+
+def pinyin_initials_variants(text: str) -> list:
+    """多音字按每个读音展开的全部首字母组合，默认读音的组合在最前，最多 MAX_INITIALS_VARIANTS 个
+
+    >>> pinyin_initials_variants('重庆银行')
+    ['zqyh', 'zqyx', 'cqyh', 'cqyx']
+    """
+    choices = [options for options in map(_char_initials, text or '') if options]
+    return [''.join(combo) for combo in itertools.islice(itertools.product(*choices), MAX_INITIALS_VARIANTS)]
+
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器：平均每秒rate次，最多允许capacity次突发"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 def get_data_dir():
     """获取用户数据目录"""
     if sys.platform == "darwin":  # macOS
@@ -1,134 +1,458 @@
+import numpy as np
 import pandas as pd
 import time
-import os
+import threading
 import logging
 import logging.handlers
+import queue
 from multiprocessing import Queue
 from datetime import datetime
 
-from fluctuation import getChanges
+import metrics
+import memory_stats
+from config import setup_child_logging, EVENT_RETENTION_ROWS
+from log_control import apply_levels, SAMPLE_EVERY
+from fluctuation import fetch_changes
+from freshness import FreshnessTracker, frame_meta, record_publish
 from utils import setup_static_directory, uplimit10jqka, get_latest_trade_date, is_trading_time
-from data_processor import apply_sorting
-from services.pick_service import set_shared_picked_data, get_shared_picked_manager
+from data_processor import apply_sorting, first_concept_cache_bytes
+from security_master import get_security_master
+from concept_store import ConceptGenerationFollower
+from change_journal import ChangeJournal, get_journal_dir, EVENT_COLUMNS, KEY_COLUMNS
+from worker_state import get_state_path, read_state, write_state
+from history_store import get_history_dir, write_partition, read_day_sources, attach_sectors
+from replay import DayReplay, FAILED as REPLAY_FAILED
+from profiling import TickProfiler
+from services.pick_service import set_shared_picked_data, get_shared_picked_df
 
 
-def _setup_child_logging(q: Queue, level):
-    """在子进程中配置logging，将日志记录发送到队列。"""
-    if q is None:
-        # Fallback for safety, though it shouldn't happen in normal operation
-        logging.basicConfig(level=logging.DEBUG)
-        logging.warning("Log queue not provided to child process.")
-        return
+logger = logging.getLogger(__name__)
 
-    # 创建一个handler，它将日志写入队列
-    queue_handler = logging.handlers.QueueHandler(q)
-    
-    # 获取根logger，并设置其level
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    
-    # 清除所有现有的handlers，只使用QueueHandler
-    logger.handlers = [queue_handler]
+STANDARD_COLUMNS = [
+    '股票代码', '时间', '名称', '相关信息', '类型', '板块代码', '板块名称', '四舍五入取整', '上下午', '时间排序', '标识'
+]
+SNAPSHOT_INTERVAL = 60  # 热重启快照的写入间隔（秒），只在推送序号变化时写入
+METRICS_INTERVAL = 1.0  # 向API进程发布指标快照的最小间隔（秒）
+RETENTION_LOW_WATERMARK = 0.9  # 超出保留行数时一次淘汰到上限的90%，避免每个tick都淘汰几行
+
+
+def read_changes_file(path):
+    """读取 changes_YYYYMMDD.csv，缺少的列补空；已有的板块信息保留，apply_sorting 按当前概念数据更新"""
+    df = pd.read_csv(path, dtype={'股票代码': str, '板块代码': str})
+    df = df.fillna('').infer_objects(copy=False)
+    return df.reindex(columns=list(dict.fromkeys(STANDARD_COLUMNS + list(df.columns))), fill_value='')
+
+
+def _restore(static_dir, date_str):
+    """
+    恢复当天的worker状态，返回 (journal, master_df, uplimit_cache, sequence, evicted)。
+
+    异动日志是事件的完整记录；热重启快照保存了补充过板块/涨停信息的数据和涨停缓存，
+    有快照时直接使用，只把日志序号在快照之后的事件追加进来，不需要重新补充全部数据；
+    快照前按保留策略淘汰的事件不会被重新加入。
+    """
+    journal = ChangeJournal(get_journal_dir(static_dir), date_str)
+    try:
+        events = journal.recover()
+    except Exception as e:
+        logger.error(f"[worker_queue] 恢复 {date_str} 的异动日志失败: {e}", exc_info=True)
+        events = pd.DataFrame(columns=EVENT_COLUMNS)
+
+    start = time.perf_counter()
+    state = read_state(get_state_path(static_dir, date_str), date_str)
+    if state is None:
+        return journal, events.reindex(columns=STANDARD_COLUMNS, fill_value=''), {}, 0, 0
+
+    snapshot_df = state["master_df"]
+    newer = journal.events_after(events, state["journal_sequence"])
+    master_df = snapshot_df
+    if not newer.empty:
+        master_df = pd.concat([snapshot_df, newer.reindex(columns=snapshot_df.columns, fill_value='')], ignore_index=True)
+        master_df.drop_duplicates(subset=KEY_COLUMNS, keep='last', inplace=True, ignore_index=True)
+    logger.info(f"[worker_queue] 已从 {state['created']} 的快照恢复 {len(snapshot_df)} 条记录"
+                 f"（概念第{state['concept_generation']}代，序号 {state['sequence']}，日志序号 {state['journal_sequence']}），"
+                 f"日志追加 {len(newer)} 条，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+    return journal, master_df, state["uplimit_cache"], state["sequence"], state["evicted"]
+
+
+class _StateWriter:
+    """在后台线程中写热重启快照，同一时间只有一次写入；写入的DataFrame之后不会再被原地修改"""
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self._thread = None
+
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def write(self, date_str, *args, wait=False):
+        if self.busy():
+            if not wait:
+                return False
+            self._thread.join()
+        self._thread = threading.Thread(target=self._write, args=(date_str,) + args, daemon=True)
+        self._thread.start()
+        if wait:
+            self._thread.join()
+        return True
+
+    def _write(self, date_str, *args):
+        path = get_state_path(self.static_dir, date_str)
+        try:
+            start = time.perf_counter()
+            size = write_state(path, date_str, *args)
+            logger.debug("[worker_queue] 已写入快照 %s，%d 字节，耗时 %.1fms", path, size, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            logger.error(f"[worker_queue] 写入快照失败: {e}", exc_info=True)
+
+
+def merge_events(master_df, df):
+    """新到达的事件合并进当天数据，同一股票同一类型保留最新的一条，去掉涨跌幅取整为0的记录"""
+    if not df.empty:
+        master_df = pd.concat([master_df, df], ignore_index=True)
+        master_df.drop_duplicates(subset=['类型', '股票代码'], keep='last', inplace=True, ignore_index=True)
+    if master_df.empty:
+        return master_df
+    return master_df[master_df['四舍五入取整'] != 0]
+
+
+def retain_recent(master_df, max_rows=EVENT_RETENTION_ROWS):
+    """超过 max_rows 行时按时间淘汰最早的事件，一次淘汰到 max_rows 的 RETENTION_LOW_WATERMARK，返回 (保留的数据, 淘汰的行数)"""
+    if not max_rows or len(master_df) <= max_rows:
+        return master_df, 0
+    keep = int(max_rows * RETENTION_LOW_WATERMARK)
+    newest = np.sort(master_df['时间'].astype(str).to_numpy().argsort(kind='stable')[len(master_df) - keep:])
+    return master_df.iloc[newest].reset_index(drop=True), len(master_df) - keep
+
+
+def write_day_history(static_dir, date_str, master_df, concept_df=None, partial=False):
+    """
+    换日时把前一天的数据写入历史分区。partial 为True时内存中只有保留的部分事件，
+    与当天的异动日志和回补文件合并，同一股票同一类型以内存中已补充板块信息的数据为准。
+    """
+    try:
+        df = master_df
+        if partial:
+            day_df = read_day_sources(static_dir, date_str)
+            if day_df is not None:
+                df = attach_sectors(pd.concat([day_df, master_df], ignore_index=True), concept_df)
+        write_partition(get_history_dir(static_dir), date_str, df)
+    except Exception as e:
+        logger.error(f"[worker_queue] 写入 {date_str} 历史分区失败: {e}", exc_info=True)
+
+
+def enrich_and_publish(master_df, concept_df, uplimit_cache, data_q, freshness_meta=None):
+    """
+    推送路径：补充板块和涨停信息、排序后推送到数据队列，返回处理后的DataFrame；实时数据和回放共用。
+    freshness_meta 为本次新事件的新鲜度信息，记录推送时间后随数据帧一起交给API进程。
+    """
+    with metrics.stage("enrich"):
+        master_df = apply_sorting(master_df, concept_df, uplimit_cache)
+    with metrics.stage("serialize"):
+        payload = {
+            "columns": list(master_df.columns),
+            "values": master_df.values.tolist()
+        }
+    if freshness_meta:
+        record_publish(freshness_meta, time.time())
+        payload["freshness"] = freshness_meta
+    with metrics.stage("ipc"):
+        data_q.put(payload)
+    metrics.inc(metrics.ROWS_TOTAL, len(master_df), stage="ipc")
+    logger.debug("[worker_queue] 已将 %d 条格式化数据推送到数据队列", len(master_df), extra={SAMPLE_EVERY: 30})
+    return master_df
+
+
+def _drain(control_q):
+    """取出控制队列中当前所有的消息，不阻塞"""
+    messages = []
+    while control_q is not None:
+        try:
+            messages.append(control_q.get_nowait())
+        except queue.Empty:
+            break
+    return messages
+
+
+def _wait_for_control(control_q, timeout):
+    """代替tick之间的sleep：等待期间收到控制消息时立即返回，使关闭等消息不必等到下一个tick"""
+    if control_q is None:
+        time.sleep(timeout)
+        return []
+    try:
+        first = control_q.get(timeout=timeout)
+    except queue.Empty:
+        return []
+    return [first] + _drain(control_q)
 
 
-def worker(log_q: Queue, log_level, data_q: Queue, interval=5, initial_concept_df=None, initial_changes_df=None, batch_interval=300, shared_picked_data=None):
+def worker(log_q: Queue, log_level, data_q: Queue, interval=5, concept_store_dir=None, batch_interval=300, shared_picked_data=None, concept_generation_data=None, control_q: Queue = None, replay_status_data=None, metrics_data=None):
     """
-    这个worker进程现在接收两个队列：
+    这个worker进程接收三个队列：
     - log_q: 用于发送日志记录到主进程。
     - data_q: 用于发送处理好的数据到主进程。
+    - control_q: 主进程发来的控制消息，每个tick开始时处理，如 {"type": "merge_changes", "path": ...}
+      将后台回补完成的changes文件合并进当前数据；{"type": "shutdown"} 保存快照后退出；
+      {"type": "replay_start", "date": ..., "speed": ...} / {"type": "replay_stop"} 开始/停止回放；
+      {"type": "log_levels", "levels": {...}} 调整日志级别；
+      {"type": "profile", "mode": "sample"|"cprofile", "duration": ..., "path": ...} 性能分析，到期后写入 path。
+    - replay_status_data: 回放状态的共享快照，由API进程读取。
+    - metrics_data: 本进程指标的共享快照，每 METRICS_INTERVAL 秒发布一次，由API进程合并到 /api/metrics；
+      每 MEMORY_INTERVAL 秒统计的各组件内存占用也在其中。
+
+    回放期间推送的是回放的数据，实时数据照常获取和写入日志，回放结束后恢复推送实时数据。
+
+    新增或变化的事件每个tick追加到当天的异动日志（后台线程写入），每 batch_interval 秒压实一次；
+    进程重启时从日志恢复当天数据；有热重启快照时直接使用快照中已补充板块和涨停信息的数据。
+    内存中最多保留 EVENT_RETENTION_ROWS 条当天事件，更早的事件只在日志中，压实和写入历史分区时合并回来。
     """
     # 第一件事：设置此子进程的日志记录
-    _setup_child_logging(log_q, log_level)
+    setup_child_logging(log_q, log_level)
 
-    logging.debug("[worker_queue] 启动，日志已重定向到队列。")
+    logger.debug("[worker_queue] 启动，日志已重定向到队列。")
     
     static_dir = setup_static_directory()
     current_date = get_latest_trade_date()
-    changes_path = os.path.join(static_dir, f"changes_{current_date}.csv")
 
-    standard_columns = [
-        '股票代码', '时间', '名称', '相关信息', '类型', '板块代码', '板块名称', '四舍五入取整', '上下午', '时间排序', '标识'
-    ]
+    # 以内存映射方式打开概念列式存储，与API进程共享同一份页缓存；
+    # 概念数据刷新后API进程发布新的代编号，worker在后台映射新一代并在tick之间切换
+    concept_follower = None
+    concept_df = None
+    if concept_store_dir is not None:
+        concept_follower = ConceptGenerationFollower(concept_generation_data, concept_store_dir)
+        try:
+            concept_df = concept_follower.load_initial()
+        except Exception as e:
+            logger.error(f"[worker_queue] 打开概念数据失败: {e}", exc_info=True)
 
-    master_df = initial_changes_df if initial_changes_df is not None else pd.DataFrame(columns=standard_columns)
-    last_write = time.time()
+    # 当天按保留策略淘汰过的事件数，大于0时压实和写入历史分区需要合并磁盘上的数据
+    journal, master_df, uplimit_cache, sequence, evicted_today = _restore(static_dir, current_date)
+    state_writer = _StateWriter(static_dir)
+    last_compact = last_snapshot = time.time()
+    snapshot_sequence = sequence
     last_date = current_date
-    uplimit_cache = {}
 
     if shared_picked_data is not None:
         set_shared_picked_data(shared_picked_data)
-        logging.debug(f"[worker_queue] set_shared_picked_data: id={id(shared_picked_data)}, keys={list(shared_picked_data.keys()) if shared_picked_data else 'None'}")
-        
+
         # 验证共享内存是否正确传递并可访问
-        from services.pick_service import get_shared_picked_df
         test_df = get_shared_picked_df()
-        logging.debug(f"[worker_queue] 共享内存验证: picked_df行数={len(test_df)}, 列={list(test_df.columns)}")
-        if not test_df.empty:
-            logging.debug(f"[worker_queue] 共享内存验证成功: 前3行数据=\n{test_df.head(3)}")
-        else:
-            logging.warning("[worker_queue] 共享内存验证失败: picked_df为空，这可能导致apply_sorting无法正确处理精选股票")
+        logger.debug(f"[worker_queue] 共享内存验证: version={shared_picked_data.version}, picked_df行数={len(test_df)}, 列={list(test_df.columns)}")
+        if test_df.empty:
+            logger.warning("[worker_queue] 共享内存验证失败: picked_df为空，这可能导致apply_sorting无法正确处理精选股票")
 
+    def save_state(wait=False):
+        picked_version = shared_picked_data.version if shared_picked_data is not None else 0
+        generation = concept_follower.generation if concept_follower is not None else 0
+        return state_writer.write(current_date, master_df, uplimit_cache, sequence, generation, picked_version,
+                                  journal.sequence, evicted_today, wait=wait)
 
+    if sequence and not master_df.empty:
+        # 快照中的数据已经补充过板块和涨停信息，不等第一个tick直接推送
+        data_q.put({"columns": list(master_df.columns), "values": master_df.values.tolist()})
+
+    replay = None
+    replay_df = None
+    last_fetch = 0.0
+    freshness = FreshnessTracker()
+    profiler = TickProfiler()
+    last_metrics = 0.0
+    tracer = memory_stats.TickPeakTracer()
+    last_memory = time.monotonic()
+
+    def record_memory():
+        components = {
+            "event_store": memory_stats.frame_bytes(master_df),
+            "replay": memory_stats.frame_bytes(replay_df) if replay is not None else 0,
+            "concept_df": memory_stats.frame_bytes(concept_df),
+            "first_concept_cache": first_concept_cache_bytes(),
+            "picked_df": memory_stats.frame_bytes(get_shared_picked_df()),
+            "uplimit_cache": memory_stats.estimate_bytes(uplimit_cache),
+            "journal_index": journal.index_bytes(),
+            "freshness_index": freshness.index_bytes(),
+        }
+        rows = {
+            "event_store": len(master_df),
+            "replay": len(replay_df) if replay is not None else 0,
+            "uplimit_cache": len(uplimit_cache),
+            "journal_index": journal.tracked_events,
+            "freshness_index": freshness.tracked_events,
+        }
+        usage = memory_stats.record_usage(components, rows, tracer.take())
+        logger.debug("[worker_queue] 内存统计: %s", usage)
+
+    def publish_replay_status():
+        if replay_status_data is not None and replay is not None:
+            replay_status_data.publish(replay.status())
+
+    pending_control = []
     while True:
+        profiler.poll()
+        tracer.begin()
         try:
             current_trade_day = get_latest_trade_date()
             if current_trade_day != last_date:
-                logging.info(f"[worker_queue] 检测到新的交易日: {last_date} -> {current_trade_day}")
+                logger.info(f"[worker_queue] 检测到新的交易日: {last_date} -> {current_trade_day}")
+                # 前一天的数据最后压实一次，写完后关闭日志；已补充板块信息的数据写入历史分区
+                if journal.uncompacted:
+                    journal.compact(master_df, partial=evicted_today > 0)
+                journal.close()
+                if not master_df.empty:
+                    threading.Thread(target=write_day_history,
+                                     args=(static_dir, last_date, master_df, concept_df, evicted_today > 0),
+                                     daemon=True).start()
                 last_date = current_trade_day
                 current_date = current_trade_day
-                changes_path = os.path.join(static_dir, f"changes_{current_date}.csv")
-                master_df = pd.DataFrame(columns=standard_columns)
-                last_write = time.time()
-                uplimit_cache = {}
-                logging.info(f"[worker_queue] 已重置数据缓存，新的存储路径: {changes_path}")
+                journal, master_df, uplimit_cache, sequence, evicted_today = _restore(static_dir, current_date)
+                last_compact = last_snapshot = time.time()
+                snapshot_sequence = sequence
+                freshness.reset()
+                logger.info(f"[worker_queue] 已重置数据缓存，新的日志: {journal.day_file}")
+
+            messages, pending_control = pending_control + _drain(control_q), []
+            for message in messages:
+                if message.get("type") == "shutdown":
+                    # 主进程关闭前：写完日志和快照后退出，重启时从这里继续
+                    journal.append_changes(master_df)
+                    journal.close()
+                    profiler.poll(force=True)
+                    save_state(wait=True)
+                    logger.info(f"[worker_queue] 已保存 {len(master_df)} 条记录的快照，worker退出")
+                    return
+                if message.get("type") == "replay_start":
+                    try:
+                        replay = DayReplay(static_dir, message["date"], message.get("speed", 1.0))
+                        replay_df = pd.DataFrame(columns=STANDARD_COLUMNS)
+                        logger.info(f"[worker_queue] 开始回放 {replay.date_str}，{len(replay.events)} 条事件，"
+                                     f"速度 {replay.speed}x")
+                    except Exception as e:
+                        logger.error(f"[worker_queue] 开始回放失败: {e}", exc_info=not isinstance(e, FileNotFoundError))
+                        if replay_status_data is not None:
+                            replay_status_data.publish({"state": REPLAY_FAILED, "date": message.get("date"),
+                                                        "message": str(e)})
+                        replay = None
+                    publish_replay_status()
+                    continue
+                if message.get("type") == "replay_stop":
+                    if replay is not None:
+                        replay.stop()
+                        publish_replay_status()
+                        logger.info(f"[worker_queue] 已停止回放 {replay.date_str}")
+                    replay = None
+                    continue
+                if message.get("type") == "log_levels":
+                    apply_levels(message["levels"])
+                    continue
+                if message.get("type") == "profile":
+                    profiler.start(message["mode"], message["duration"], message["path"])
+                    continue
+                if message.get("type") == "merge_changes":
+                    try:
+                        merged_df = read_changes_file(message["path"])
+                    except Exception as e:
+                        logger.error(f"[worker_queue] 读取changes文件失败: {e}", exc_info=True)
+                        continue
+                    # 实时数据比回补数据新，同一股票同一类型以实时数据为准
+                    master_df = pd.concat([merged_df, master_df], ignore_index=True)
+                    master_df.drop_duplicates(subset=['类型', '股票代码'], keep='last', inplace=True, ignore_index=True)
+                    logger.info(f"[worker_queue] 已合并 {len(merged_df)} 条记录: {message['path']}")
+                else:
+                    logger.warning(f"[worker_queue] 未知的控制消息: {message}")
+
+            if concept_follower is not None and concept_follower.poll():
+                concept_df = concept_follower.concept_df
 
             df = pd.DataFrame()
-            if is_trading_time():
-                logging.debug("[worker_queue] 交易时间内，开始获取数据...")
-                df = getChanges()
+            freshness_meta = None
+            # 回放全速运行时循环不等待，实时数据仍按 interval 获取
+            fetch_due = time.monotonic() - last_fetch >= interval
+            if fetch_due and is_trading_time():
+                last_fetch = time.monotonic()
+                logger.debug("[worker_queue] 交易时间内，开始获取数据...", extra={SAMPLE_EVERY: 30})
+                df, exchange_tm = fetch_changes()
+                ingested = time.time()
+                freshness_meta = frame_meta(freshness.source, freshness.observe_fetch(df, exchange_tm, ingested), ingested)
                 if not df.empty:
-                    logging.debug(f"[worker_queue] getChanges 返回 {len(df)} 条记录")
+                    logger.debug("[worker_queue] getChanges 返回 %d 条记录", len(df), extra={SAMPLE_EVERY: 30})
+                    try:
+                        get_security_master().observe_names(df['股票代码'], df['名称'])
+                    except Exception as e:
+                        logger.debug("[worker_queue] 更新证券主表名称失败: %s", e)
                 else:
-                    logging.debug("[worker_queue] getChanges 未返回新数据")
+                    logger.debug("[worker_queue] getChanges 未返回新数据", extra={SAMPLE_EVERY: 30})
                 
                 # 更新涨停数据缓存
-                uplimit_df = uplimit10jqka()
+                with metrics.stage("fetch", source="10jqka"):
+                    uplimit_df = uplimit10jqka()
                 if not uplimit_df.empty:
                     uplimit_cache = dict(zip(uplimit_df['name'].astype(str), uplimit_df['high_days']))
-                    logging.debug(f"[worker_queue] 涨停数据缓存更新，数量: {len(uplimit_cache)}")
+                    logger.debug("[worker_queue] 涨停数据缓存更新，数量: %d", len(uplimit_cache), extra={SAMPLE_EVERY: 30})
             else:
-                logging.debug("[worker_queue] 非交易时间，跳过数据获取")
+                logger.debug("[worker_queue] 非交易时间，跳过数据获取", extra={SAMPLE_EVERY: 30})
 
-            if not df.empty:
-                master_df = pd.concat([master_df, df], ignore_index=True)
-                master_df.drop_duplicates(subset=['类型', '股票代码'], keep='last', inplace=True, ignore_index=True)
+            with metrics.stage("store"):
+                master_df = merge_events(master_df, df)
 
             # 仅在有数据时进行处理和推送
-            if not master_df.empty:
-                master_df = master_df[master_df['四舍五入取整'] != 0]
-                
-                # 应用排序和板块信息
-                master_df = apply_sorting(master_df, initial_concept_df, uplimit_cache)
+            if not master_df.empty and fetch_due:
+                # 只有新增或变化的事件进入日志，由后台线程批量写入并fsync
+                with metrics.stage("journal"):
+                    journal.append_changes(master_df)
+                # 已写入日志的事件才会被淘汰
+                master_df, evicted = retain_recent(master_df, EVENT_RETENTION_ROWS)
+                if evicted:
+                    evicted_today += evicted
+                    metrics.inc(memory_stats.EVICTED_ROWS_TOTAL, evicted)
+                    logger.info(f"[worker_queue] 当天事件超过保留上限 {EVENT_RETENTION_ROWS}，已淘汰最早的 {evicted} 条，"
+                                f"当天累计淘汰 {evicted_today} 条")
+                now = time.time()
+                if journal.uncompacted and (now - last_compact) >= batch_interval:
+                    journal.compact(master_df, partial=evicted_today > 0)
+                    last_compact = now
 
-                full_data = {
-                    "columns": list(master_df.columns),
-                    "values": master_df.values.tolist()
-                }
-                data_q.put(full_data)
-                logging.debug(f"[worker_queue] 已将 {len(master_df)} 条格式化数据推送到数据队列")
+                if replay is None:
+                    master_df = enrich_and_publish(master_df, concept_df, uplimit_cache, data_q, freshness_meta)
+                    sequence += 1
 
-                now = time.time()
-                if (now - last_write) >= batch_interval:
-                    try:
-                        master_df.to_csv(changes_path, index=False)
-                        logging.info(f"[worker_queue] 批量写入 {len(master_df)} 条记录到 {changes_path}")
-                        last_write = now
-                    except Exception as e:
-                        logging.error(f"[worker_queue] 批量写入磁盘失败: {e}", exc_info=True)
-            else:
-                logging.debug("[worker_queue] master_df 为空，无需处理或推送")
+                if sequence != snapshot_sequence and (now - last_snapshot) >= SNAPSHOT_INTERVAL and save_state():
+                    snapshot_sequence, last_snapshot = sequence, now
+            elif master_df.empty:
+                logger.debug("[worker_queue] master_df 为空，无需处理或推送", extra={SAMPLE_EVERY: 30})
+
+            if replay is not None:
+                batch = replay.step()
+                if not batch.empty:
+                    started = time.perf_counter()
+                    replay_df = merge_events(replay_df, batch)
+                    if not replay_df.empty:
+                        replay_df = enrich_and_publish(replay_df, concept_df, replay.uplimit_cache, data_q)
+                        replay.record_publish(time.perf_counter() - started)
+                publish_replay_status()
+                if replay.done:
+                    logger.info(f"[worker_queue] 回放 {replay.date_str} 结束: {replay.status()}")
+                    replay = None
 
         except Exception as e:
-            logging.error(f"[worker_queue] worker主循环发生错误: {e}", exc_info=True)
-        
-        time.sleep(interval)
\ No newline at end of file
+            metrics.inc(metrics.ERRORS_TOTAL, stage="worker")
+            logger.error(f"[worker_queue] worker主循环发生错误: {e}", exc_info=True)
+        tracer.end()
+
+        if time.monotonic() - last_memory >= memory_stats.MEMORY_INTERVAL:
+            last_memory = time.monotonic()
+            try:
+                record_memory()
+            except Exception as e:
+                logger.debug("[worker_queue] 统计内存失败: %s", e)
+
+        if metrics_data is not None and time.monotonic() - last_metrics >= METRICS_INTERVAL:
+            last_metrics = time.monotonic()
+            try:
+                metrics_data.publish(metrics.snapshot())
+            except Exception as e:
+                logger.debug("[worker_queue] 发布指标快照失败: %s", e)
+
+        if replay is None:
+            wait = interval
+        else:
+            wait = min(interval, 1.0) if replay.speed > 0 else 0
+        pending_control = _wait_for_control(control_q, wait) if wait else _drain(control_q)
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+import pickle
+import logging
+from datetime import datetime
+
+
+# worker的热重启快照：补充过板块/涨停信息的当天数据、涨停缓存、推送序号、概念代编号、精选版本，
+# 以及写快照时的异动日志序号和当天已淘汰的事件数。
+# 每天一个文件 state/worker_state_YYYYMMDD.pkl，格式变化时提升 STATE_FORMAT_VERSION，旧快照直接忽略。
+STATE_DIRNAME = "state"
+STATE_FORMAT_VERSION = 2
+
+
+def get_state_path(static_dir, date_str):
+    return os.path.join(static_dir, STATE_DIRNAME, f"worker_state_{date_str}.pkl")
+
+
+def write_state(path, date_str, master_df, uplimit_cache, sequence, concept_generation=0, picked_version=0,
+                journal_sequence=0, evicted=0):
+    """原子写入快照，返回写入的字节数"""
+    state = {
+        "format_version": STATE_FORMAT_VERSION,
+        "date": date_str,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "sequence": sequence,
+        "concept_generation": concept_generation,
+        "picked_version": picked_version,
+        "journal_sequence": journal_sequence,
+        "evicted": evicted,
+        "uplimit_cache": dict(uplimit_cache),
+        "master_df": master_df,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def read_state(path, date_str):
+    """读取快照；文件不存在、格式版本或日期不符、内容损坏时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"[worker_state] 读取快照失败，忽略: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("format_version") != STATE_FORMAT_VERSION:
+        logging.info(f"[worker_state] 快照格式版本不符，忽略: {path}")
+        return None
+    if state.get("date") != date_str:
+        return None
+    return state
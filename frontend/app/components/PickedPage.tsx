@@ -20,6 +20,8 @@ export function PickedPage() {
     pickedStocks,
     loading: isLoading,
     addStock,
+    addStocks,
+    addSector,
     deleteStockByCode,
     updateStock,
   } = usePicked();
@@ -27,6 +29,7 @@ export function PickedPage() {
   const [sectors, setSectors] = useState<Sector[]>([]);
   const [stockSectors, setStockSectors] = useState<Sector[]>([]);
   const [searchQuery, setSearchQuery] = useState('');
+  const [selectedSectorCode, setSelectedSectorCode] = useState('');
   const [editingStock, setEditingStock] = useState<string | null>(null);
   const [editData, setEditData] = useState<PickedStock | null>(null);
   const [message, setMessage] = useState<{type: 'success' | 'error', text: string} | null>(null);
@@ -127,6 +130,20 @@ export function PickedPage() {
     setSearchResults([]);
   };
 
+  // 批量添加全部搜索结果
+  const handleAddAllResults = async () => {
+    await addStocks(searchResults);
+    setSearchQuery('');
+    setSearchResults([]);
+  };
+
+  // 添加整个板块的成分股
+  const handleAddSector = async () => {
+    if (!selectedSectorCode) return;
+    await addSector(selectedSectorCode);
+    setSelectedSectorCode('');
+  };
+
   // 更新股票信息
   const handleUpdateStock = async (stockCode: string, stockData: PickedStock) => {
     await updateStock(stockCode, stockData);
@@ -229,7 +246,39 @@ export function PickedPage() {
               />
             </div>
 
+            <div className="flex items-center mb-4 space-x-2">
+              <select
+                value={selectedSectorCode}
+                onChange={(e) => setSelectedSectorCode(e.target.value)}
+                className="flex-1 px-3 py-2 border border-gray-300 dark:border-gray-600 rounded-lg bg-white dark:bg-gray-700 text-gray-900 dark:text-white"
+              >
+                <option value="">选择板块</option>
+                {sectors.map((sector) => (
+                  <option key={sector.板块代码} value={sector.板块代码}>
+                    {sector.板块名称}
+                  </option>
+                ))}
+              </select>
+              <button
+                onClick={handleAddSector}
+                disabled={!selectedSectorCode}
+                className="px-3 py-2 bg-green-600 text-white text-sm rounded hover:bg-green-700 transition-colors disabled:opacity-50"
+              >
+                添加整个板块
+              </button>
+            </div>
+
             {/* 搜索结果 */}
+            {searchResults.length > 1 && (
+              <div className="flex justify-end mb-2">
+                <button
+                  onClick={handleAddAllResults}
+                  className="px-3 py-1 bg-green-600 text-white text-sm rounded hover:bg-green-700 transition-colors"
+                >
+                  全部添加 ({searchResults.length})
+                </button>
+              </div>
+            )}
             {searchResults.length > 0 && (
               <div className="max-h-60 overflow-y-auto border border-gray-200 dark:border-gray-600 rounded-lg">
                 {searchResults.map((stock) => (
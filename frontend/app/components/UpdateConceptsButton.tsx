@@ -1,7 +1,23 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Button } from '@/components/ui/button';
 import toast from 'react-hot-toast';
 
+interface JobProgress {
+  done?: number;
+  total?: number;
+  eta_seconds?: number | null;
+}
+
+interface JobInfo {
+  id: string;
+  state: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  message: string;
+  progress: JobProgress;
+}
+
+const API_BASE = 'http://localhost:61125';
+const POLL_INTERVAL = 2000;
+
 interface UpdateConceptsButtonProps {
   className?: string;
   variant?: 'default' | 'destructive' | 'outline' | 'secondary' | 'ghost' | 'link';
@@ -14,12 +30,45 @@ export const UpdateConceptsButton: React.FC<UpdateConceptsButtonProps> = ({
   size = 'sm'
 }) => {
   const [isLoadingConcepts, setIsLoadingConcepts] = useState(false);
+  const [job, setJob] = useState<JobInfo | null>(null);
+  const pollTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  useEffect(() => () => {
+    if (pollTimer.current) clearTimeout(pollTimer.current);
+  }, []);
+
+  // 轮询任务状态，直到任务结束
+  const pollJob = async (jobId: string) => {
+    try {
+      const response = await fetch(`${API_BASE}/api/jobs/${jobId}`);
+      const result = await response.json();
+      if (result.status !== 'success') {
+        setJob(null);
+        return;
+      }
+      const info: JobInfo = result.data;
+      setJob(info);
+      if (info.state === 'queued' || info.state === 'running') {
+        pollTimer.current = setTimeout(() => pollJob(jobId), POLL_INTERVAL);
+        return;
+      }
+      if (info.state === 'succeeded') {
+        toast.success('概念数据更新完成');
+      } else if (info.state === 'failed') {
+        toast.error(`概念数据更新失败: ${info.message}`);
+      }
+      setJob(null);
+    } catch (error) {
+      console.error('UpdateConceptsButton: 查询任务状态失败:', error);
+      pollTimer.current = setTimeout(() => pollJob(jobId), POLL_INTERVAL);
+    }
+  };
 
   const handleGetConcepts = async () => {
     console.log('UpdateConceptsButton: handleGetConcepts 被调用');
     
     // 二次确认对话框
-    const confirmed = window.confirm('更新概念会中断盘口异动监测，是否确认开始？');
+    const confirmed = window.confirm('更新概念将在后台进行，是否确认开始？');
     console.log('UpdateConceptsButton: 用户确认结果:', confirmed);
     
     if (!confirmed) {
@@ -32,7 +81,7 @@ export const UpdateConceptsButton: React.FC<UpdateConceptsButtonProps> = ({
     
     try {
       console.log('UpdateConceptsButton: 发送更新概念请求到后端...');
-      const response = await fetch('http://localhost:61125/api/queue_get_concepts', {
+      const response = await fetch(`${API_BASE}/api/queue_get_concepts`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -45,6 +94,9 @@ export const UpdateConceptsButton: React.FC<UpdateConceptsButtonProps> = ({
       if (response.ok) {
         console.log('UpdateConceptsButton: 更新概念任务启动成功');
         toast.success(result.message || 'getConcepts任务已启动');
+        if (result.job_id) {
+          pollJob(result.job_id);
+        }
       } else {
         console.log('UpdateConceptsButton: 更新概念任务启动失败:', result.message);
         toast.error(result.message || '启动getConcepts任务失败');
@@ -58,15 +110,26 @@ export const UpdateConceptsButton: React.FC<UpdateConceptsButtonProps> = ({
     }
   };
 
+  const progress = job?.progress;
+  let label = '更新概念';
+  if (isLoadingConcepts) {
+    label = '更新中...';
+  } else if (job?.state === 'queued') {
+    label = '排队中...';
+  } else if (job?.state === 'running') {
+    label = progress?.total ? `更新中 ${progress.done}/${progress.total}` : '更新中...';
+  }
+
   return (
     <Button
       onClick={handleGetConcepts}
-      disabled={isLoadingConcepts}
+      disabled={isLoadingConcepts || job !== null}
+      title={progress?.eta_seconds ? `预计剩余 ${Math.ceil(progress.eta_seconds)} 秒` : undefined}
       variant={variant}
       size={size}
       className={className}
     >
-      {isLoadingConcepts ? '更新中...' : '更新概念'}
+      {label}
     </Button>
   );
 };
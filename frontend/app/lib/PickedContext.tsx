@@ -14,6 +14,9 @@ interface PickedContextType {
   loading: boolean;
   refetch: () => Promise<void>;
   addStock: (stock: PickedStock) => Promise<void>;
+  addStocks: (stocks: PickedStock[]) => Promise<void>;
+  addSector: (sectorCode: string) => Promise<void>;
+  deleteStocks: (stockCodes: string[]) => Promise<void>;
   deleteStockByCode: (stockCode: string) => Promise<void>;
   deleteStockBySectorName: (sectorName: string) => Promise<void>;
   updateStock: (stockCode: string, stockData: PickedStock) => Promise<void>;
@@ -82,6 +85,36 @@ export const PickedProvider: React.FC<{ children: ReactNode }> = ({ children })
     }
   };
 
+  // 批量操作：整批只发一次请求，后端一次写入、一次同步
+  const postBatch = async (url: string, body: object, fallbackError: string) => {
+    try {
+      const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+      });
+      const result = await response.json();
+      if (result.status === 'success') {
+        toast.success(result.message || '操作成功');
+        await fetchPicked();
+      } else {
+        toast.error(result.message || fallbackError);
+      }
+    } catch (error) {
+      console.error('[PickedContext] 批量操作失败:', error);
+      toast.error('网络错误，请稍后重试');
+    }
+  };
+
+  const addStocks = (stocks: PickedStock[]) =>
+    postBatch('http://localhost:61125/api/picked/batch', { stocks }, '批量添加失败');
+
+  const addSector = (sectorCode: string) =>
+    postBatch('http://localhost:61125/api/picked/batch', { 板块代码: sectorCode }, '添加板块失败');
+
+  const deleteStocks = (stockCodes: string[]) =>
+    postBatch('http://localhost:61125/api/picked/batch/delete', { 股票代码: stockCodes }, '批量删除失败');
+
   const deleteStockByCode = async (stockCode: string) => {
     if (!window.confirm('确定要删除这只股票吗？')) return;
     try {
@@ -144,6 +177,9 @@ export const PickedProvider: React.FC<{ children: ReactNode }> = ({ children })
     loading,
     refetch: fetchPicked,
     addStock,
+    addStocks,
+    addSector,
+    deleteStocks,
     deleteStockByCode,
     deleteStockBySectorName,
     updateStock,